@@ -0,0 +1,21 @@
+"""
+Guard for admin-only endpoints.
+
+Requests must send the ADMIN_TOKEN value in the X-Admin-Token header. While
+ADMIN_TOKEN is unset the guarded endpoints are disabled (403), so customer
+data is never served by a deployment that did not configure a token.
+"""
+import os
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
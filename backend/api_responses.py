@@ -0,0 +1,35 @@
+import os
+from typing import Any, Optional
+
+import orjson
+from starlette.responses import Response
+
+from models import APIResponse
+
+# Opt-in: encode route results with orjson and skip the APIResponse round trip
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() == 'true'
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def api_response(
+    success: bool = True,
+    data: Optional[dict] = None,
+    message: Optional[str] = None,
+    total: Optional[int] = None
+):
+    """
+    Build the {success, data, message, total} envelope.
+
+    With FAST_JSON_RESPONSES the Mongo documents are serialized directly, so
+    FastAPI neither validates them against response_model nor runs
+    jsonable_encoder over them.
+    """
+    if FAST_JSON_RESPONSES:
+        return FastJSONResponse({"success": success, "data": data, "message": message, "total": total})
+    return APIResponse(success=success, data=data, message=message, total=total)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Cart storage benchmark: one cart_items document per line (CART_STORAGE=lines)
+versus one carts document per session (CART_STORAGE=document).
+
+For every cart size it times adding the lines, reading the cart, changing
+one quantity and clearing the cart through both stores, and reports the
+stored BSON bytes per cart. The --store mongod mode uses MONGO_URL and the
+BENCH_DB_NAME database (default stylehub_benchmark), which is dropped
+afterwards.
+
+    python benchmarks/cart_storage_benchmark.py --sizes 1,5,20,60 --iterations 50
+    python benchmarks/cart_storage_benchmark.py --store mongod --json cart_storage.json
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import bson
+
+from common import summarize, use_mongomock
+
+OPERATIONS = ("add", "read", "update", "clear")
+
+
+async def bench_store(store, collection, size: int, iterations: int) -> dict:
+    from models import CartItem
+
+    samples = {operation: [] for operation in OPERATIONS}
+    stored_bytes = []
+    for _ in range(iterations):
+        session_id = str(uuid.uuid4())
+        items = [
+            CartItem(session_id=session_id, product_id=f"product-{index}", selected_size="M", selected_color="Schwarz")
+            for index in range(size)
+        ]
+
+        for item in items:
+            start = time.perf_counter()
+            await store.add(item)
+            samples["add"].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        lines = await store.lines(session_id)
+        samples["read"].append((time.perf_counter() - start) * 1000)
+        assert len(lines) == size
+
+        start = time.perf_counter()
+        await store.set_quantity(session_id, lines[-1]["id"], 3)
+        samples["update"].append((time.perf_counter() - start) * 1000)
+
+        documents = await collection.find({"session_id": session_id}).to_list(length=None)
+        stored_bytes.append(sum(len(bson.encode(document)) for document in documents))
+
+        start = time.perf_counter()
+        await store.clear(session_id)
+        samples["clear"].append((time.perf_counter() - start) * 1000)
+
+    result = {operation: summarize(values) for operation, values in samples.items()}
+    result["bytes_per_cart"] = round(sum(stored_bytes) / len(stored_bytes))
+    return result
+
+
+async def run(sizes, iterations):
+    from cart_store import DocumentCartStore, LineCartStore
+    from database import cart_items_collection, carts_collection, client, db, ensure_indexes
+
+    await ensure_indexes()
+    stores = {
+        "lines": (LineCartStore(), cart_items_collection),
+        "document": (DocumentCartStore(), carts_collection),
+    }
+    results = []
+    try:
+        for size in sizes:
+            row = {"cart_size": size}
+            for name, (store, collection) in stores.items():
+                row[name] = await bench_store(store, collection, size, iterations)
+            results.append(row)
+            for operation in OPERATIONS:
+                print(
+                    f"cart_size={size:4d} {operation:6s}  "
+                    f"lines p50={row['lines'][operation]['p50_ms']:8.3f}ms p99={row['lines'][operation]['p99_ms']:8.3f}ms  "
+                    f"document p50={row['document'][operation]['p50_ms']:8.3f}ms p99={row['document'][operation]['p99_ms']:8.3f}ms"
+                )
+            print(f"cart_size={size:4d} bytes   lines={row['lines']['bytes_per_cart']}  document={row['document']['bytes_per_cart']}")
+    finally:
+        await client.drop_database(db.name)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--sizes', default='1,5,20,60', help='Comma separated cart sizes')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', dest='json_path', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.store == 'mongomock':
+        use_mongomock()
+
+    results = asyncio.run(run([int(size) for size in args.sizes.split(',')], args.iterations))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"benchmark": "cart_storage", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Deterministic synthetic product catalog for the benchmark scripts"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterator
+
+CATEGORIES = ['damen', 'herren', 'accessoires', 'schuhe']
+COLORS = ['Weiß', 'Schwarz', 'Navy', 'Grau', 'Blau', 'Braun', 'Grün', 'Rot', 'Beige', 'Gold']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
+ADJECTIVES = ['Elegantes', 'Klassisches', 'Sportliches', 'Leichtes', 'Warmes', 'Modernes', 'Luxus', 'Casual', 'Designer', 'Bequemes']
+NOUNS = [
+    'Sommerkleid', 'Hemd', 'Pullover', 'Wintermantel', 'Sneaker', 'Jeans', 'Handtasche', 'Sonnenbrille',
+    'Strickjacke', 'Lederjacke', 'Stiefel', 'Halstuch', 'Gürtel', 'Rock', 'Bluse', 'Anzug', 'Mütze', 'Shorts',
+]
+WORDS = [
+    'aus', 'hochwertiger', 'Baumwolle', 'atmungsaktivem', 'Stoff', 'perfekt', 'für', 'warme', 'kalte', 'Tage',
+    'mit', 'praktischen', 'Fächern', 'nachhaltiger', 'Produktion', 'weicher', 'Wolle', 'echtem', 'Leder',
+    'optimaler', 'Dämpfung', 'klassischen', 'Schnitt', 'UV-Schutz', 'polarisierten', 'Gläsern', 'Daunen-Füllung',
+]
+SEARCH_TERMS = ['kleid', 'Hemden', 'schwarz', 'weiss', 'leder jacke', 'mantel', 'sneak', 'herren', 'baumwolle', 'gürtel braun']
+SUGGESTION_PREFIXES = ['k', 'kl', 'sch', 'herr', 'leder', 'sommerk', 'gr', 'wei', 'designer h', 'xyz']
+
+
+def make_products(count: int, seed: int = 42) -> Iterator[dict]:
+    """Yield complete product documents, identical for the same count and seed"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for index in range(count):
+        price = round(rng.uniform(5, 300), 2)
+        on_sale = rng.random() < 0.2
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {index}",
+            "price": price,
+            "original_price": round(price * 1.25, 2) if on_sale else None,
+            "description": " ".join(rng.choice(WORDS) for _ in range(12)),
+            "image": f"https://images.example.com/products/{index}.jpg",
+            "category": rng.choice(CATEGORIES),
+            "is_on_sale": on_sale,
+            "sizes": rng.sample(SIZES, 4),
+            "colors": rng.sample(COLORS, 3),
+            "stock": rng.randint(0, 200),
+            "created_at": start + timedelta(minutes=index),
+            "updated_at": start + timedelta(minutes=index),
+        }
@@ -0,0 +1,61 @@
+"""Shared helpers for the StyleHub benchmark scripts"""
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+
+from dotenv import load_dotenv
+
+load_dotenv(BACKEND_DIR / '.env')
+
+# Benchmarks never touch the application database
+os.environ['DB_NAME'] = os.environ.get('BENCH_DB_NAME', 'stylehub_benchmark')
+
+
+def use_mongomock():
+    """Point every Motor client at an in-memory mongomock-motor stand-in (call before importing database)"""
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    class StandInClient(AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            # Pool, compression and read settings do not apply to the stand-in
+            super().__init__()
+
+    motor.motor_asyncio.AsyncIOMotorClient = StandInClient
+    # mongomock has no replica set, so checkout takes the non-transactional path
+    os.environ.setdefault('CHECKOUT_TRANSACTIONS', 'false')
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    return {
+        "count": len(samples_ms),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 4) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 4),
+        "p95_ms": round(percentile(samples_ms, 95), 4),
+        "p99_ms": round(percentile(samples_ms, 99), 4),
+    }
+
+
+async def time_async(fn, iterations: int) -> List[float]:
+    """Run an async callable repeatedly and return per-call latencies in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Cart enrichment benchmark: one find_one per cart line (N+1) versus a single
+batched $in lookup, reported as latency per cart size.
+
+The in-memory stand-in hides the network round trip that the batching saves,
+so compare with --store mongod, which uses MONGO_URL and the BENCH_DB_NAME
+database (default stylehub_benchmark) and drops it afterwards.
+
+    python benchmarks/enrichment_benchmark.py --sizes 1,5,10,30,60 --iterations 50
+    python benchmarks/enrichment_benchmark.py --store mongod --json enrichment.json
+"""
+import argparse
+import asyncio
+import json
+import uuid
+
+from common import summarize, time_async, use_mongomock
+
+
+def make_product(index: int) -> dict:
+    from models import Product
+
+    return Product(
+        name=f'Benchmark Produkt {index}',
+        price=10 + index % 90,
+        description='Synthetisches Produkt für Benchmarks',
+        image='https://example.com/image.jpg',
+        category='damen',
+        sizes=['S', 'M', 'L'],
+        colors=['Schwarz'],
+    ).dict()
+
+
+async def enrich_sequential(cart_items):
+    """The previous per-item lookup, kept here as the baseline"""
+    from database import products_collection
+
+    enriched_items = []
+    for item in cart_items:
+        product = await products_collection.find_one({"id": item["product_id"]})
+        if product:
+            del product["_id"]
+            item["product"] = product
+            enriched_items.append(item)
+    return enriched_items
+
+
+async def run(sizes, iterations):
+    from database import client, db
+
+    try:
+        return await bench(sizes, iterations)
+    finally:
+        await client.drop_database(db.name)
+
+
+async def bench(sizes, iterations):
+    from database import cart_items_collection, products_collection
+    from enrichment import enrich_cart_items
+    from models import CartItem
+
+    products = [make_product(i) for i in range(max(sizes))]
+    await products_collection.insert_many(products)
+
+    results = []
+    for size in sizes:
+        session_id = str(uuid.uuid4())
+        cart_items = [
+            CartItem(session_id=session_id, product_id=p["id"], selected_size='M', selected_color='Schwarz').dict()
+            for p in products[:size]
+        ]
+        await cart_items_collection.insert_many([dict(item) for item in cart_items])
+
+        async def sequential():
+            items = await cart_items_collection.find({"session_id": session_id}).to_list(length=None)
+            await enrich_sequential(items)
+
+        async def batched():
+            items = await cart_items_collection.find({"session_id": session_id}).to_list(length=None)
+            await enrich_cart_items(items)
+
+        row = {
+            "cart_size": size,
+            "sequential": summarize(await time_async(sequential, iterations)),
+            "batched": summarize(await time_async(batched, iterations)),
+        }
+        results.append(row)
+        print(
+            f"cart_size={size:4d}  "
+            f"sequential p50={row['sequential']['p50_ms']:8.3f}ms p99={row['sequential']['p99_ms']:8.3f}ms  "
+            f"batched p50={row['batched']['p50_ms']:8.3f}ms p99={row['batched']['p99_ms']:8.3f}ms"
+        )
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--sizes', default='1,5,10,30,60,100', help='Comma separated cart sizes')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--json', dest='json_path', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.store == 'mongomock':
+        use_mongomock()
+
+    results = asyncio.run(run([int(size) for size in args.sizes.split(',')], args.iterations))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({"benchmark": "cart_enrichment", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
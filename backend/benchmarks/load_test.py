@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Load test for the /api routes.
+
+Seeds a synthetic catalog, starts the app in-process and drives a weighted mix
+of browse, search, cart and checkout sessions from concurrent workers. Reports
+throughput and p50/p95/p99 latency per route, and writes them as JSON so runs
+can be compared across commits.
+
+The default store is mongomock-motor, so no database is needed; --store mongod
+runs against MONGO_URL in the BENCH_DB_NAME database, which is dropped afterwards.
+
+    python benchmarks/load_test.py --products 5000 --concurrency 32 --duration 20 --json load.json
+    python benchmarks/load_test.py --store mongod --mix browse=50,search=20,cart=20,checkout=10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import subprocess
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import common
+from common import summarize, use_mongomock
+from catalog import CATEGORIES, SEARCH_TERMS, SUGGESTION_PREFIXES, make_products
+
+DEFAULT_MIX = "browse=60,search=25,cart=10,checkout=5"
+
+
+class Recorder:
+    """Latency samples and status codes per route"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    async def request(self, client, route: str, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.samples[route].append((time.perf_counter() - start) * 1000)
+        self.statuses[route][str(response.status_code)] += 1
+        return response
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.samples):
+            summary = summarize(self.samples[route])
+            summary["throughput_rps"] = round(len(self.samples[route]) / elapsed, 2)
+            summary["status"] = dict(self.statuses[route])
+            summary["errors"] = sum(count for status, count in self.statuses[route].items() if status.startswith("5"))
+            routes[route] = summary
+        return routes
+
+
+async def browse(client, recorder, rng, product_ids):
+    await recorder.request(client, "GET /api/categories", "GET", "/api/categories/")
+    response = await recorder.request(
+        client, "GET /api/products", "GET", "/api/products/",
+        params={"category": rng.choice(CATEGORIES), "limit": 20}
+    )
+    products = response.json().get("data", {}).get("products") or []
+    product_id = rng.choice(products)["id"] if products else rng.choice(product_ids)
+    await recorder.request(client, "GET /api/products/{id}", "GET", f"/api/products/{product_id}")
+
+
+async def search(client, recorder, rng, product_ids):
+    prefix = rng.choice(SUGGESTION_PREFIXES)
+    await recorder.request(client, "GET /api/search/suggestions", "GET", "/api/search/suggestions", params={"q": prefix})
+    await recorder.request(client, "GET /api/search", "GET", "/api/search/", params={"q": rng.choice(SEARCH_TERMS)})
+
+
+async def add_random_item(client, recorder, rng, product_ids, session_id):
+    return await recorder.request(client, "POST /api/cart", "POST", "/api/cart/", json={
+        "session_id": session_id,
+        "product_id": rng.choice(product_ids),
+        "selected_size": "M",
+        "selected_color": "Schwarz",
+        "quantity": rng.randint(1, 2)
+    })
+
+
+async def cart(client, recorder, rng, product_ids):
+    session_id = str(uuid.uuid4())
+    response = await add_random_item(client, recorder, rng, product_ids, session_id)
+    await add_random_item(client, recorder, rng, product_ids, session_id)
+    await recorder.request(client, "GET /api/cart/{session_id}", "GET", f"/api/cart/{session_id}")
+
+    item_id = response.json().get("data", {}).get("cart_item", {}).get("id")
+    if item_id:
+        await recorder.request(
+            client, "PUT /api/cart/{session_id}/item/{item_id}", "PUT",
+            f"/api/cart/{session_id}/item/{item_id}", json={"quantity": 3}
+        )
+        await recorder.request(
+            client, "DELETE /api/cart/{session_id}/item/{item_id}", "DELETE",
+            f"/api/cart/{session_id}/item/{item_id}"
+        )
+    await recorder.request(client, "DELETE /api/cart/{session_id}", "DELETE", f"/api/cart/{session_id}")
+
+
+async def checkout(client, recorder, rng, product_ids):
+    session_id = str(uuid.uuid4())
+    for _ in range(rng.randint(1, 4)):
+        await add_random_item(client, recorder, rng, product_ids, session_id)
+    response = await recorder.request(client, "POST /api/orders", "POST", "/api/orders/", json={
+        "session_id": session_id,
+        "customer_info": {"name": "Load Test", "email": "load@example.com", "address": "Teststraße 1"}
+    })
+    if response.status_code == 200:
+        order_id = response.json()["data"]["order"]["id"]
+        await recorder.request(client, "GET /api/orders/{order_id}", "GET", f"/api/orders/{order_id}")
+    await recorder.request(client, "GET /api/orders/session/{session_id}", "GET", f"/api/orders/session/{session_id}")
+
+
+SCENARIOS = {"browse": browse, "search": search, "cart": cart, "checkout": checkout}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(','):
+        name, weight = part.split('=')
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight)
+    return weights
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=common.BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import server
+    from database import client, db, products_collection
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    products = list(make_products(args.products, seed=args.seed))
+    for start in range(0, len(products), 1000):
+        await products_collection.insert_many([dict(product) for product in products[start:start + 1000]])
+    product_ids = [product["id"] for product in products]
+
+    mix = parse_mix(args.mix)
+    names, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as http:
+            deadline = time.perf_counter() + args.duration
+
+            async def worker(number: int):
+                rng = random.Random(args.seed + number)
+                while time.perf_counter() < deadline:
+                    scenario = rng.choices(names, weights)[0]
+                    await SCENARIOS[scenario](http, recorder, rng, product_ids)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(number) for number in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        await client.drop_database(db.name)
+        await server.app.router.shutdown()
+
+    routes = recorder.report(elapsed)
+    total_requests = sum(route["count"] for route in routes.values())
+    return {
+        "benchmark": "load_test",
+        "commit": git_commit(),
+        "config": {
+            "store": args.store,
+            "products": args.products,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "routes": routes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--products', type=int, default=5000, help='Synthetic catalog size')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds to run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights, e.g. browse=60,search=25,cart=10,checkout=5')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.store == 'mongomock':
+        use_mongomock()
+
+    results = asyncio.run(run(args))
+
+    print(f"{results['requests']} requests in {results['elapsed_seconds']}s, {results['throughput_rps']} req/s")
+    for route, summary in results["routes"].items():
+        print(
+            f"{route:48s} n={summary['count']:6d}  {summary['throughput_rps']:8.2f}/s  "
+            f"p50={summary['p50_ms']:8.2f}ms  p95={summary['p95_ms']:8.2f}ms  p99={summary['p99_ms']:8.2f}ms  "
+            f"errors={summary['errors']}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
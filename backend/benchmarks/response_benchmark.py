@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark for GET /api/products?limit=100.
+
+Measures CPU time per request through the whole app with the default
+APIResponse path and with FAST_JSON_RESPONSES, and the envelope encoding
+alone for the same 100 documents. Requests ask for an uncompressed body
+(--encoding identity) by default, so every one runs the route and the
+serializer; with br, zstd or gzip, catalog responses are served from the
+compressed snapshot cache after the first request.
+
+    python benchmarks/response_benchmark.py --iterations 300
+    python benchmarks/response_benchmark.py --encoding br
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from catalog import make_products
+from common import summarize, use_mongomock
+
+
+def encode_default(products):
+    """What FastAPI does for response_model=APIResponse: build, validate, encode, dump"""
+    from fastapi.encoders import jsonable_encoder
+    from models import APIResponse
+
+    response = APIResponse(success=True, data={"products": products}, total=len(products))
+    validated = APIResponse.model_validate(response.model_dump())
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode_fast(products):
+    from api_responses import FastJSONResponse
+
+    return FastJSONResponse({"success": True, "data": {"products": products}, "message": None, "total": len(products)}).body
+
+
+def cpu_samples(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.process_time()
+        fn()
+        samples.append((time.process_time() - start) * 1000)
+    return samples
+
+
+async def request_samples(http, iterations, encoding):
+    samples = []
+    for _ in range(iterations):
+        start = time.process_time()
+        response = await http.get("/api/products/", params={"limit": 100}, headers={"Accept-Encoding": encoding})
+        response.raise_for_status()
+        samples.append((time.process_time() - start) * 1000)
+    return samples
+
+
+async def run(args):
+    import httpx
+
+    import api_responses
+    import server
+    from database import client, db, products_collection
+
+    logging.getLogger().setLevel(logging.WARNING)
+    products = list(make_products(args.products))
+    await products_collection.insert_many([dict(product) for product in products])
+
+    results = {"benchmark": "response_serialization", "iterations": args.iterations, "encoding": args.encoding}
+
+    page = products[:100]
+    for name, encode in (("default", encode_default), ("fast", encode_fast)):
+        results[f"encode_{name}"] = summarize(cpu_samples(lambda: encode(page), args.iterations))
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            for name, fast in (("default", False), ("fast", True)):
+                api_responses.FAST_JSON_RESPONSES = fast
+                await request_samples(http, 10, args.encoding)
+                results[f"request_{name}"] = summarize(await request_samples(http, args.iterations, args.encoding))
+    finally:
+        await client.drop_database(db.name)
+        await server.app.router.shutdown()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--iterations', type=int, default=300)
+    parser.add_argument('--encoding', choices=['identity', 'gzip', 'br', 'zstd'], default='identity',
+                        help='Accept-Encoding of the requests; anything but identity measures the snapshot cache')
+    parser.add_argument('--json', dest='json_path', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.store == 'mongomock':
+        use_mongomock()
+
+    results = asyncio.run(run(args))
+    for key in ("encode_default", "encode_fast", "request_default", "request_fast"):
+        summary = results[key]
+        print(f"{key:16s} cpu mean={summary['mean_ms']:8.3f}ms  p50={summary['p50_ms']:8.3f}ms  p99={summary['p99_ms']:8.3f}ms")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Search and suggestion index benchmark on a synthetic in-memory catalog.
+
+Builds the in-process search and suggestion indexes from generated products
+(no Mongo needed) and reports build time and per-query p50/p99 latency.
+
+    python benchmarks/search_benchmark.py --products 100000 --iterations 200
+"""
+import argparse
+import json
+import time
+
+import common  # noqa: F401  (must be imported before database)
+from catalog import SEARCH_TERMS as QUERIES, SUGGESTION_PREFIXES as PREFIXES, make_products
+from common import summarize
+
+from search_index import SearchIndex
+from suggestion_index import SuggestionIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', dest='json_path', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    products = list(make_products(args.products))
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for product in products:
+        index.add(product)
+    index.search(QUERIES[0])
+    build_seconds = time.perf_counter() - start
+    print(f"Search index built: {len(index)} products in {build_seconds:.2f}s")
+
+    suggestions = SuggestionIndex()
+    start = time.perf_counter()
+    for product in products:
+        suggestions._keys.extend(suggestions._add_entries(product))
+    suggestions._keys.sort()
+    suggestion_build_seconds = time.perf_counter() - start
+    print(f"Suggestion index built: {len(suggestions)} products in {suggestion_build_seconds:.2f}s")
+
+    results = {"benchmark": "search_index", "products": args.products, "build_seconds": round(build_seconds, 3), "queries": {},
+               "suggestion_build_seconds": round(suggestion_build_seconds, 3), "suggestions": {}}
+    for query in QUERIES:
+        samples = []
+        matches = 0
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            _, matches, _ = index.search(query, category='damen', max_price=150, limit=20)
+            samples.append((time.perf_counter() - start) * 1000)
+        summary = summarize(samples)
+        summary["matches"] = matches
+        results["queries"][query] = summary
+        print(f"{query:15s} matches={matches:6d}  p50={summary['p50_ms']:8.3f}ms  p99={summary['p99_ms']:8.3f}ms")
+
+    for prefix in PREFIXES:
+        samples = []
+        for _ in range(args.iterations):
+            start = time.perf_counter()
+            suggested = suggestions.suggest(prefix, limit=5)
+            samples.append((time.perf_counter() - start) * 1000)
+        summary = summarize(samples)
+        results["suggestions"][prefix] = summary
+        print(f"suggest {prefix!r:12s} results={len(suggested):2d}  p50={summary['p50_ms']:8.3f}ms  p99={summary['p99_ms']:8.3f}ms")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""
+Cache namespaces with a per-process or a shared backend, and invalidation
+messages between workers.
+
+Every cache is a namespace created with cache_namespace(). With
+CACHE_BACKEND=local (the default) each namespace is an in-process LRU
+(cache.TTLCache). With CACHE_BACKEND=redis, namespaces created with
+shared=True keep their entries on the Redis-protocol server at CACHE_URL,
+so all workers see one copy. Derived or per-process data (counts, facets)
+stays local in both modes.
+
+Keys are "{CACHE_PREFIX}:{namespace}:{key}". The namespaces in use are:
+
+    product:{product_id}      catalog_cache.get_product(s)
+    categories:all            catalog_cache.get_categories
+    cart:{session_id}         cart_summary.get_cart_summary
+    cartlock:{session_id}     cart_summary.cart_lock (shared summaries only)
+    count:{hashed filter}     catalog_cache.count_products (local)
+    facet:{hashed filter}     product_facets.faceted_page (local)
+
+With the redis backend, every worker publishes catalog invalidations on
+"{CACHE_PREFIX}:invalidate". The other workers apply them to their local
+caches and in-process indexes right away; otherwise they catch up when they
+next read the shared catalog version (catalog_cache.current_catalog_version). fake_redis.py is a small in-memory server
+for trying this locally.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import bson
+import orjson
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'local').lower()
+CACHE_URL = os.environ.get('CACHE_URL', 'redis://localhost:6379/0')
+CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'stylehub')
+CACHE_TIMEOUT = float(os.environ.get('CACHE_TIMEOUT', '0.5'))
+
+INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:invalidate"
+# Identifies this worker's own invalidation messages
+WORKER_ID = uuid.uuid4().hex
+
+_SCAN_COUNT = 500
+
+
+class RedisError(Exception):
+    pass
+
+
+# Failures of the shared backend; cache reads then miss and fall through to Mongo
+CACHE_ERRORS = (OSError, ConnectionError, RedisError, asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+def hashed_key(value: Union[str, bytes]) -> str:
+    """Short, stable key part for long values such as serialized query filters"""
+    data = value.encode() if isinstance(value, str) else value
+    return hashlib.blake2b(data, digest_size=12).hexdigest()
+
+
+def encode_command(args: Iterable[Any]) -> bytes:
+    parts = []
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"*%d\r\n" % len(parts) + b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """One RESP2 reply; error replies are returned as RedisError instances"""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by the cache server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return RedisError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(rest)
+        return None if length < 0 else [await read_reply(reader) for _ in range(length)]
+    raise RedisError(f"Unexpected reply {line!r}")
+
+
+class RedisClient:
+    """
+    Minimal RESP2 client on one pipelined connection.
+
+    Commands are written as soon as they are issued and their replies are
+    matched in order by a reader task, so concurrent requests share the
+    connection without waiting for each other.
+    """
+
+    def __init__(self, url: str = CACHE_URL, timeout: float = CACHE_TIMEOUT):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.database = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: deque = deque()
+        self._connect_lock = asyncio.Lock()
+
+    async def open_connection(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """A new authenticated connection on the configured database"""
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        setup = ([("AUTH", self.password)] if self.password else []) + ([("SELECT", self.database)] if self.database else [])
+        for command in setup:
+            writer.write(encode_command(command))
+            reply = await asyncio.wait_for(read_reply(reader), self.timeout)
+            if isinstance(reply, RedisError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def _ensure_connected(self) -> None:
+        if self._writer is not None:
+            return
+        async with self._connect_lock:
+            if self._writer is None:
+                self._reader, self._writer = await self.open_connection()
+                asyncio.get_running_loop().create_task(self._read_replies(self._reader))
+
+    async def _read_replies(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except Exception as e:
+            if reader is self._reader:
+                self._disconnect(ConnectionError(f"Cache server connection lost: {e}"))
+
+    def _disconnect(self, error: Exception) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def execute(self, *args):
+        await self._ensure_connected()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._writer.write(encode_command(args))
+        try:
+            reply = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # Replies are matched by position, so a late one would be given to the next caller
+            self._disconnect(ConnectionError("Cache server timed out"))
+            raise
+        if isinstance(reply, RedisError):
+            raise reply
+        return reply
+
+    def close(self) -> None:
+        self._disconnect(ConnectionError("Cache client closed"))
+
+
+_client: Optional[RedisClient] = None
+
+
+def redis_client() -> RedisClient:
+    global _client
+    if _client is None:
+        _client = RedisClient()
+    return _client
+
+
+def _encode(value: Any) -> bytes:
+    # BSON keeps datetimes, which JSON would turn into strings
+    return bson.encode({"v": value})
+
+
+def _decode(data: bytes) -> Any:
+    return bson.decode(data)["v"]
+
+
+class LocalNamespace:
+    """In-process LRU namespace; the async methods complete without I/O"""
+
+    shared = False
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: Hashable) -> Any:
+        return self.cache.get(key)
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        found = {}
+        for key in keys:
+            value = self.cache.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self.cache.set(key, value, ttl)
+
+    async def set_many(self, values: Dict[Hashable, Any]) -> None:
+        for key, value in values.items():
+            self.cache.set(key, value)
+
+    async def add(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> Optional[bool]:
+        """Set key only if it is absent; whether it was set"""
+        if self.cache.get(key) is not None:
+            return False
+        self.cache.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: Hashable) -> None:
+        self.cache.delete(key)
+
+    async def clear(self) -> None:
+        self.cache.clear()
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        return self.cache.items()
+
+    def stats(self) -> dict:
+        return {"backend": "local", **self.cache.stats()}
+
+
+class SharedNamespace:
+    """Namespace stored on the Redis-protocol server; failures count as misses"""
+
+    shared = True
+
+    def __init__(self, name: str, ttl: float, client: Optional[RedisClient] = None):
+        self.name = name
+        self.ttl = ttl
+        self.client = client or redis_client()
+        self.prefix = f"{CACHE_PREFIX}:{name}:"
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def key(self, key: Hashable) -> str:
+        return f"{self.prefix}{key}"
+
+    def _failed(self, operation: str, error: Exception) -> None:
+        self.errors += 1
+        logger.warning(f"Shared cache {operation} on {self.name} failed: {error!r}")
+
+    async def get(self, key: Hashable) -> Any:
+        try:
+            data = await self.client.execute("GET", self.key(key))
+        except CACHE_ERRORS as e:
+            self._failed("get", e)
+            data = None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _decode(data)
+
+    async def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        try:
+            values = await self.client.execute("MGET", *(self.key(key) for key in keys))
+        except CACHE_ERRORS as e:
+            self._failed("get", e)
+            values = [None] * len(keys)
+        found = {key: _decode(data) for key, data in zip(keys, values) if data is not None}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            await self.client.execute("SET", self.key(key), _encode(value), "PX", int((self.ttl if ttl is None else ttl) * 1000))
+        except CACHE_ERRORS as e:
+            self._failed("set", e)
+
+    async def add(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> Optional[bool]:
+        """Set key only if it is absent (SET NX); whether it was set, or None when the server failed"""
+        try:
+            reply = await self.client.execute(
+                "SET", self.key(key), _encode(value), "NX", "PX", int((self.ttl if ttl is None else ttl) * 1000)
+            )
+        except CACHE_ERRORS as e:
+            self._failed("add", e)
+            return None
+        return reply is not None
+
+    async def set_many(self, values: Dict[Hashable, Any]) -> None:
+        # Pipelined on the one connection, so this costs about one round trip
+        await asyncio.gather(*(self.set(key, value) for key, value in values.items()))
+
+    async def delete(self, key: Hashable) -> None:
+        try:
+            await self.client.execute("DEL", self.key(key))
+        except CACHE_ERRORS as e:
+            self._failed("delete", e)
+
+    async def clear(self) -> None:
+        try:
+            cursor = b"0"
+            while True:
+                cursor, keys = await self.client.execute("SCAN", cursor, "MATCH", f"{self.prefix}*", "COUNT", _SCAN_COUNT)
+                if keys:
+                    await self.client.execute("DEL", *keys)
+                if cursor in (b"0", "0"):
+                    break
+        except CACHE_ERRORS as e:
+            self._failed("clear", e)
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses, "errors": self.errors,
+                "evictions": None, "size": None, "ttl": self.ttl}
+
+
+CacheNamespace = Union[LocalNamespace, SharedNamespace]
+
+
+def cache_namespace(name: str, maxsize: int, ttl: float, shared: bool = False) -> CacheNamespace:
+    """A cache namespace; shared ones live on the Redis-protocol server when CACHE_BACKEND=redis"""
+    if shared and CACHE_BACKEND == "redis":
+        return SharedNamespace(name, ttl)
+    return LocalNamespace(name, maxsize, ttl)
+
+
+async def publish_invalidation(event: str, key: Union[None, str, List[str]] = None, version: Optional[int] = None) -> None:
+    """Tell the other workers about a catalog change and the catalog version it produced (no-op with the local backend)"""
+    if CACHE_BACKEND != "redis":
+        return
+    message = orjson.dumps({"origin": WORKER_ID, "event": event, "key": key, "version": version})
+    try:
+        await redis_client().execute("PUBLISH", INVALIDATION_CHANNEL, message)
+    except CACHE_ERRORS as e:
+        logger.error(f"Could not publish cache invalidation {event} {key}: {e!r}")
+
+
+async def listen_for_invalidations(handler: Callable[[str, Any, Optional[int]], Awaitable[None]]) -> None:
+    """
+    Run handler(event, key, version) for every invalidation published by another worker.
+
+    After a reconnect, messages may have been missed, so the handler gets a
+    ("resync", None) event first.
+    """
+    client = redis_client()
+    subscribed_before = False
+    delay = 0.5
+    while True:
+        writer = None
+        try:
+            reader, writer = await client.open_connection()
+            writer.write(encode_command(("SUBSCRIBE", INVALIDATION_CHANNEL)))
+            await read_reply(reader)
+            logger.info(f"Listening for cache invalidations on {INVALIDATION_CHANNEL}")
+            if subscribed_before:
+                await handler("resync", None, None)
+            subscribed_before, delay = True, 0.5
+
+            while True:
+                reply = await read_reply(reader)
+                if not isinstance(reply, list) or reply[0] != b"message":
+                    continue
+                message = orjson.loads(reply[2])
+                if message["origin"] == WORKER_ID:
+                    continue
+                try:
+                    await handler(message["event"], message.get("key"), message.get("version"))
+                except Exception as e:
+                    logger.error(f"Cache invalidation {message['event']} {message.get('key')} failed: {e!r}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Cache invalidation subscription lost, retrying in {delay}s: {e!r}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+        finally:
+            if writer is not None:
+                writer.close()
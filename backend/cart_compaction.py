@@ -0,0 +1,120 @@
+"""
+One-off compaction of cart lines.
+
+Carts written before the unique line index existed can hold several lines
+for the same (session, product, size, color). Compaction merges each such
+group into its oldest line, summing the quantities, and reports the rows
+and BSON bytes it removed. Once no duplicates are left the unique index can
+be created, which compaction retries after every run that merged lines.
+With the index in place duplicates cannot occur and compaction does nothing.
+Abandoned lines themselves are removed by the added_at TTL index.
+
+Run it once from the CLI (python cli.py compact-carts); the background task
+is off unless CART_COMPACTION_INTERVAL is set.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import List
+
+import bson
+from pydantic import BaseModel
+from pymongo import DeleteMany, UpdateOne
+
+from cart_summary import cart_lock, cart_summaries
+from database import cart_items_collection, ensure_indexes
+
+logger = logging.getLogger(__name__)
+
+# Seconds between compaction runs; 0 (the default) disables the background task
+CART_COMPACTION_INTERVAL = float(os.environ.get('CART_COMPACTION_INTERVAL', '0'))
+
+LINE_KEY = ("session_id", "product_id", "selected_size", "selected_color")
+
+
+class CompactionReport(BaseModel):
+    groups: int = 0  # Line keys that had more than one row
+    rows_removed: int = 0
+    bytes_reclaimed: int = 0
+    sessions: int = 0
+    elapsed_seconds: float = 0.0
+    unique_index: bool = False  # The unique line index exists, so nothing was scanned
+
+
+async def _merge(lines: List[dict], report: CompactionReport, dry_run: bool) -> None:
+    lines.sort(key=lambda line: (line.get("added_at") or datetime.max, line["id"]))
+    keeper, duplicates = lines[0], lines[1:]
+    report.groups += 1
+    report.rows_removed += len(duplicates)
+    report.bytes_reclaimed += sum(len(bson.encode(line)) for line in duplicates)
+    if dry_run:
+        return
+
+    await cart_items_collection.bulk_write([
+        UpdateOne({"_id": keeper["_id"]}, {"$set": {"quantity": sum(line.get("quantity", 0) for line in lines)}}),
+        DeleteMany({"_id": {"$in": [line["_id"] for line in duplicates]}}),
+    ], ordered=True)
+
+
+async def has_unique_line_index() -> bool:
+    """Whether cart_items has a unique index on LINE_KEY, which rules out duplicate lines"""
+    indexes = await cart_items_collection.index_information()
+    return any(
+        index.get("unique") and tuple(field for field, _ in index["key"]) == LINE_KEY
+        for index in indexes.values()
+    )
+
+
+async def compact_cart_items(dry_run: bool = False) -> CompactionReport:
+    """Merge duplicate cart lines; with dry_run only report what would be removed"""
+    started = time.perf_counter()
+    report = CompactionReport()
+    if await has_unique_line_index():
+        report.unique_index = True
+        return report
+
+    sessions = set()
+    groups = cart_items_collection.aggregate([
+        {"$group": {"_id": {field: f"${field}" for field in LINE_KEY}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    async for group in groups:
+        session_id = group["_id"]["session_id"]
+        # The session lock keeps this worker's cart writes and summaries out of the merge
+        async with cart_lock(session_id):
+            lines = await cart_items_collection.find({"_id": {"$in": group["ids"]}}).to_list(length=None)
+            if len(lines) > 1:
+                await _merge(lines, report, dry_run)
+                await cart_summaries.delete(session_id)
+                sessions.add(session_id)
+
+    if report.groups and not dry_run:
+        # The unique line index fails to build while duplicates exist
+        await ensure_indexes()
+
+    report.sessions = len(sessions)
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    return report
+
+
+async def run_cart_compaction(interval: float = CART_COMPACTION_INTERVAL):
+    """Compact cart lines every interval seconds until the unique line index exists"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            report = await compact_cart_items()
+            if report.unique_index:
+                logger.info("Unique cart line index exists, stopping cart compaction")
+                return
+            if report.groups:
+                logger.info(
+                    f"Cart compaction merged {report.groups} duplicate lines in {report.sessions} sessions: "
+                    f"{report.rows_removed} rows, {report.bytes_reclaimed} bytes reclaimed in {report.elapsed_seconds}s"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Cart compaction failed: {e}")
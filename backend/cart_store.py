@@ -0,0 +1,159 @@
+"""
+Cart storage behind one interface, chosen with CART_STORAGE.
+
+"lines" (the default) keeps one cart_items document per line. "document"
+keeps one carts document per session with the lines embedded, bounded by
+MAX_CART_LINES, so reading, changing and clearing a cart each touch a
+single document. migrations/cart_documents.py moves existing carts from
+the line layout to the document layout.
+
+Lines are returned in the same shape by both stores, including session_id.
+The methods that checkout calls take an optional session for transactions.
+"""
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import cart_items_collection, carts_collection
+from models import CartItem
+
+CART_STORAGE = os.environ.get('CART_STORAGE', 'lines').lower()
+MAX_CART_LINES = int(os.environ.get('MAX_CART_LINES', '100'))
+
+LINE_KEY = ("product_id", "selected_size", "selected_color")
+
+
+class CartFull(Exception):
+    pass
+
+
+class LineCartStore:
+    """One cart_items document per line, merged on the unique (session, product, size, color) index"""
+
+    async def lines(self, session_id: str, session=None) -> List[dict]:
+        cursor = cart_items_collection.find({"session_id": session_id}, {"_id": 0}, session=session)
+        return await cursor.to_list(length=None)
+
+    async def add(self, item: CartItem) -> dict:
+        """Insert the line or add to the quantity of the same line; returns the stored line"""
+        line_key = {"session_id": item.session_id, **{field: getattr(item, field) for field in LINE_KEY}}
+        update = {
+            "$inc": {"quantity": item.quantity},
+            "$setOnInsert": {"id": item.id, "added_at": item.added_at}
+        }
+        try:
+            return await cart_items_collection.find_one_and_update(
+                line_key, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent upsert created the line first; this time we match it
+            return await cart_items_collection.find_one_and_update(
+                line_key, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
+            )
+
+    async def set_quantity(self, session_id: str, item_id: str, quantity: int) -> Optional[dict]:
+        return await cart_items_collection.find_one_and_update(
+            {"id": item_id, "session_id": session_id},
+            {"$set": {"quantity": quantity}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def remove(self, session_id: str, item_id: str) -> bool:
+        result = await cart_items_collection.delete_one({"id": item_id, "session_id": session_id})
+        return result.deleted_count == 1
+
+    async def clear(self, session_id: str, session=None) -> int:
+        result = await cart_items_collection.delete_many({"session_id": session_id}, session=session)
+        return result.deleted_count
+
+
+def _with_session(session_id: str, line: dict) -> dict:
+    return {**line, "session_id": session_id}
+
+
+def _find_line(cart: Optional[dict], **match) -> Optional[dict]:
+    # The $elemMatch projection narrows lines to the match already; this also covers servers that ignore it
+    for line in (cart or {}).get("lines", []):
+        if all(line.get(field) == value for field, value in match.items()):
+            return _with_session(cart["session_id"], line)
+    return None
+
+
+class DocumentCartStore:
+    """One carts document per session holding its lines; every change is a single-document update"""
+
+    async def lines(self, session_id: str, session=None) -> List[dict]:
+        cart = await carts_collection.find_one({"session_id": session_id}, {"_id": 0, "lines": 1}, session=session)
+        return [_with_session(session_id, line) for line in (cart or {}).get("lines", [])]
+
+    async def _increment(self, session_id: str, key: dict, quantity: int) -> Optional[dict]:
+        cart = await carts_collection.find_one_and_update(
+            {"session_id": session_id, "lines": {"$elemMatch": key}},
+            {"$inc": {"lines.$.quantity": quantity}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"_id": 0, "session_id": 1, "lines": {"$elemMatch": key}},
+            return_document=ReturnDocument.AFTER
+        )
+        return _find_line(cart, **key)
+
+    async def _push(self, item: CartItem, key: dict) -> dict:
+        line = item.dict(exclude={"session_id"})
+        await carts_collection.update_one(
+            # Only while the line is missing and the cart has room; otherwise the upsert hits the unique session_id
+            {
+                "session_id": item.session_id,
+                "lines": {"$not": {"$elemMatch": key}},
+                f"lines.{MAX_CART_LINES - 1}": {"$exists": False},
+            },
+            {
+                "$push": {"lines": line},
+                "$set": {"updated_at": datetime.utcnow()},
+                "$setOnInsert": {"created_at": item.added_at},
+            },
+            upsert=True
+        )
+        # Without a DuplicateKeyError the new line was pushed as is
+        return _with_session(item.session_id, line)
+
+    async def add(self, item: CartItem) -> dict:
+        key = {field: getattr(item, field) for field in LINE_KEY}
+        for _ in range(2):
+            line = await self._increment(item.session_id, key, item.quantity)
+            if line is not None:
+                return line
+            try:
+                return await self._push(item, key)
+            except DuplicateKeyError:
+                # The cart exists and either gained this line concurrently or is full
+                continue
+        raise CartFull(f"A cart holds at most {MAX_CART_LINES} lines")
+
+    async def set_quantity(self, session_id: str, item_id: str, quantity: int) -> Optional[dict]:
+        cart = await carts_collection.find_one_and_update(
+            {"session_id": session_id, "lines.id": item_id},
+            {"$set": {"lines.$.quantity": quantity, "updated_at": datetime.utcnow()}},
+            projection={"_id": 0, "session_id": 1, "lines": {"$elemMatch": {"id": item_id}}},
+            return_document=ReturnDocument.AFTER
+        )
+        return _find_line(cart, id=item_id)
+
+    async def remove(self, session_id: str, item_id: str) -> bool:
+        result = await carts_collection.update_one(
+            {"session_id": session_id, "lines.id": item_id},
+            {"$pull": {"lines": {"id": item_id}}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        return result.modified_count == 1
+
+    async def clear(self, session_id: str, session=None) -> int:
+        cart = await carts_collection.find_one_and_delete(
+            {"session_id": session_id}, projection={"_id": 0, "lines.id": 1}, session=session
+        )
+        return len((cart or {}).get("lines", []))
+
+
+STORES = {"lines": LineCartStore, "document": DocumentCartStore}
+
+cart_store = STORES[CART_STORAGE]()
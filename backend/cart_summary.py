@@ -0,0 +1,221 @@
+"""
+Per-session cart summaries (enriched lines, subtotal, shipping, total) kept in
+the "cart" cache namespace.
+
+Cart mutations update a cached summary in place of the next read rebuilding
+it, so the read after a mutation is a single cache lookup, and product writes
+drop every summary that contains the product. Reads and mutations of one
+session are serialized by cart_lock(), so a summary is never built from or
+patched onto a cart that changes underneath it.
+
+With CACHE_BACKEND=redis all workers share the summaries, and cart_lock()
+also takes a lease on the session in the shared cache (SET NX with a
+CART_LOCK_TTL expiry). Only the holder of the lease patches or stores a
+summary; a worker that cannot get it within CART_LOCK_WAIT deletes the
+summary instead. With the local backend every worker would keep its own copy,
+so caching is off unless CART_SUMMARY_CACHE=true (only safe with a single
+worker or sticky sessions).
+
+Summaries expire no later than the first of their lines is removed by the
+cart TTL index, so an expired cart is not served from the cache.
+"""
+import asyncio
+import os
+import uuid
+import weakref
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from cache_backend import CACHE_BACKEND, cache_namespace
+from catalog_cache import add_product_listener
+from cart_store import cart_store
+from database import CART_RETENTION_DAYS
+from enrichment import enrich_cart_items
+
+CART_SUMMARY_CACHE = os.environ.get('CART_SUMMARY_CACHE', 'true' if CACHE_BACKEND == 'redis' else 'false').lower() == 'true'
+CART_SUMMARY_SIZE = int(os.environ.get('CART_SUMMARY_SIZE', '10000'))
+CART_SUMMARY_TTL = float(os.environ.get('CART_SUMMARY_TTL', '60'))
+# Seconds a worker holds a session's shared lease at most, and waits for it
+CART_LOCK_TTL = float(os.environ.get('CART_LOCK_TTL', '5'))
+CART_LOCK_WAIT = float(os.environ.get('CART_LOCK_WAIT', '1'))
+
+FREE_SHIPPING_THRESHOLD = 50
+SHIPPING_COST = 4.99
+
+cart_summaries = cache_namespace("cart", maxsize=CART_SUMMARY_SIZE, ttl=CART_SUMMARY_TTL, shared=True)
+cart_leases = cache_namespace("cartlock", maxsize=CART_SUMMARY_SIZE, ttl=CART_LOCK_TTL, shared=True)
+
+_session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+# Shared leases this process holds: session_id -> lease token
+_leases: Dict[str, str] = {}
+
+# Bumped by product writes so a summary built from older product data is not stored
+_product_epoch = 0
+
+
+def _local_lock(session_id: str) -> asyncio.Lock:
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _session_locks[session_id] = lock
+    return lock
+
+
+async def _acquire_lease(session_id: str) -> None:
+    token = uuid.uuid4().hex
+    deadline = asyncio.get_running_loop().time() + CART_LOCK_WAIT
+    while True:
+        acquired = await cart_leases.add(session_id, token)
+        if acquired:
+            _leases[session_id] = token
+            return
+        if acquired is None or asyncio.get_running_loop().time() >= deadline:
+            # Unreachable server or a busy session; summaries are deleted instead of patched
+            return
+        await asyncio.sleep(0.005)
+
+
+async def _release_lease(session_id: str) -> None:
+    token = _leases.pop(session_id)
+    # An expired lease may already belong to another worker
+    if await cart_leases.get(session_id) == token:
+        await cart_leases.delete(session_id)
+
+
+class _CartLock:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lock = _local_lock(session_id)
+
+    async def __aenter__(self) -> None:
+        await self.lock.acquire()
+        if cart_summaries.shared:
+            try:
+                await _acquire_lease(self.session_id)
+            except BaseException:
+                self.lock.release()
+                raise
+
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            if self.session_id in _leases:
+                await _release_lease(self.session_id)
+        finally:
+            self.lock.release()
+
+
+def cart_lock(session_id: str) -> _CartLock:
+    """
+    Async context manager serializing cart reads and writes of one session:
+    in this process, and across workers while summaries are shared
+    """
+    return _CartLock(session_id)
+
+
+def _may_store(session_id: str) -> bool:
+    """Whether the caller, holding cart_lock(session_id), may write the session's summary"""
+    return not cart_summaries.shared or session_id in _leases
+
+
+def _summary_ttl(cart_items: List[dict]) -> float:
+    """CART_SUMMARY_TTL, cut short to when the oldest line can expire through the cart TTL indexes"""
+    added = [item["added_at"] for item in cart_items if isinstance(item.get("added_at"), datetime)]
+    if not added:
+        return CART_SUMMARY_TTL
+    expires_in = (min(added) + timedelta(days=CART_RETENTION_DAYS) - datetime.utcnow()).total_seconds()
+    return min(CART_SUMMARY_TTL, expires_in)
+
+
+async def _store(session_id: str, summary: dict) -> None:
+    ttl = _summary_ttl(summary["cart_items"])
+    if ttl > 0:
+        await cart_summaries.set(session_id, summary, ttl)
+    else:
+        await cart_summaries.delete(session_id)
+
+
+def summarize(cart_items: List[dict]) -> dict:
+    subtotal = sum(item["product"]["price"] * item["quantity"] for item in cart_items)
+    shipping = 0 if subtotal > FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+    return {
+        "cart_items": cart_items,
+        "subtotal": round(subtotal, 2),
+        "shipping": shipping,
+        "total": round(subtotal + shipping, 2)
+    }
+
+
+async def get_cart_summary(session_id: str) -> dict:
+    """Cached summary, or one built from the cart lines and the catalog cache"""
+    summary = await cart_summaries.get(session_id)
+    if summary is not None:
+        return summary
+
+    async with cart_lock(session_id):
+        summary = await cart_summaries.get(session_id)
+        if summary is not None:
+            return summary
+
+        epoch = _product_epoch
+        cart_items = await cart_store.lines(session_id)
+        summary = summarize(await enrich_cart_items(cart_items))
+        if CART_SUMMARY_CACHE and epoch == _product_epoch and _may_store(session_id):
+            await _store(session_id, summary)
+        return summary
+
+
+async def _update(session_id: str, change: Callable[[List[dict]], List[dict]]) -> None:
+    """Patch the cached summary after a mutation made under cart_lock(session_id)"""
+    if not _may_store(session_id):
+        # Another worker may be changing the same cart, so the next read rebuilds it
+        await cart_summaries.delete(session_id)
+        return
+    # Summaries are shared with responses in flight, so changes build new lists and lines
+    summary = await cart_summaries.get(session_id)
+    if summary is not None:
+        await _store(session_id, summarize(change(summary["cart_items"])))
+
+
+async def line_saved(session_id: str, cart_item: dict, product: dict) -> None:
+    """A line was added or its quantity changed; cart_item is the stored line"""
+    line = {**cart_item, "product": product}
+
+    def change(lines):
+        if any(existing["id"] == line["id"] for existing in lines):
+            return [line if existing["id"] == line["id"] else existing for existing in lines]
+        return lines + [line]
+
+    await _update(session_id, change)
+
+
+async def line_quantity_changed(session_id: str, item_id: str, quantity: int) -> None:
+    await _update(session_id, lambda lines: [
+        {**line, "quantity": quantity} if line["id"] == item_id else line for line in lines
+    ])
+
+
+async def line_removed(session_id: str, item_id: str) -> None:
+    await _update(session_id, lambda lines: [line for line in lines if line["id"] != item_id])
+
+
+async def cart_cleared(session_id: str) -> None:
+    if cart_summaries.shared:
+        # Storing an empty summary could overwrite one a concurrent add on another worker just built
+        await cart_summaries.delete(session_id)
+    elif CART_SUMMARY_CACHE:
+        await cart_summaries.set(session_id, summarize([]))
+
+
+async def on_product_changed(product_id: Optional[str], product: Optional[dict]) -> None:
+    global _product_epoch
+    _product_epoch += 1
+    if product_id is None or cart_summaries.shared:
+        # Shared summaries cannot be searched for the product
+        await cart_summaries.clear()
+        return
+    for session_id, summary in cart_summaries.items():
+        if any(line["product_id"] == product_id for line in summary["cart_items"]):
+            await cart_summaries.delete(session_id)
+
+
+add_product_listener(on_product_changed)
@@ -0,0 +1,315 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Union
+
+from bson import json_util
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, PyMongoError
+
+from cache_backend import cache_namespace, hashed_key, publish_invalidation
+from database import db, catalog_meta_collection, products_collection, categories_collection
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '300'))
+PRODUCT_CACHE_SIZE = int(os.environ.get('PRODUCT_CACHE_SIZE', '10000'))
+COUNT_CACHE_TTL = float(os.environ.get('COUNT_CACHE_TTL', '60'))
+# How stale this process's view of the shared catalog version may get
+CATALOG_VERSION_POLL = float(os.environ.get('CATALOG_VERSION_POLL', '1'))
+
+product_cache = cache_namespace("product", maxsize=PRODUCT_CACHE_SIZE, ttl=CATALOG_CACHE_TTL, shared=True)
+category_cache = cache_namespace("categories", maxsize=1, ttl=CATALOG_CACHE_TTL, shared=True)
+# Per filter results; cheap to rebuild and dropped on every product write, so they stay in process
+count_cache = cache_namespace("count", maxsize=1024, ttl=COUNT_CACHE_TTL)
+facet_cache = cache_namespace("facet", maxsize=256, ttl=COUNT_CACHE_TTL)
+
+_CATEGORIES_KEY = "all"
+
+# Counters in catalog_meta that all workers and the CLI agree on; HTTP ETags
+# are derived from them. "version" counts catalog writes, "stock" the stock
+# changes of orders, which only affect the product documents themselves.
+# _seen_versions holds the latest of each whose changes this process has
+# applied to its caches and indexes.
+_VERSION_ID = "catalog"
+_seen_versions: Dict[str, Optional[int]] = {"version": None, "stock": None}
+_version_checked_at = 0.0
+_version_refresh: Optional[asyncio.Future] = None
+
+# Called as listener(product_id, product) after a product write; product is None
+# for a deletion and product_id is None when it is unknown which products changed.
+# Listeners may be coroutine functions.
+ProductListener = Callable[[Optional[str], Optional[dict]], Union[None, Awaitable[None]]]
+_product_listeners: List[ProductListener] = []
+
+
+async def get_product(product_id: str) -> Optional[dict]:
+    """Get a single product by id, reading through the cache"""
+    product = await product_cache.get(product_id)
+    if product is None:
+        product = await products_collection.find_one({"id": product_id}, {"_id": 0})
+        if product is None:
+            return None
+        await product_cache.set(product_id, product)
+    return dict(product)
+
+
+async def get_products(product_ids: Iterable[str]) -> Dict[str, dict]:
+    """Get products keyed by id, fetching all cache misses with a single $in query"""
+    product_ids = list(dict.fromkeys(product_ids))
+    products = {product_id: dict(product) for product_id, product in (await product_cache.get_many(product_ids)).items()}
+    missing = [product_id for product_id in product_ids if product_id not in products]
+
+    if missing:
+        cursor = products_collection.find({"id": {"$in": missing}}, {"_id": 0})
+        fetched = {product["id"]: product for product in await cursor.to_list(length=len(missing))}
+        await product_cache.set_many(fetched)
+        products.update((product_id, dict(product)) for product_id, product in fetched.items())
+
+    return products
+
+
+async def get_categories() -> List[dict]:
+    """Get all categories, reading through the cache"""
+    categories = await category_cache.get(_CATEGORIES_KEY)
+    if categories is None:
+        cursor = categories_collection.find({}, {"_id": 0})
+        categories = await cursor.to_list(length=None)
+        await category_cache.set(_CATEGORIES_KEY, categories)
+    return [dict(category) for category in categories]
+
+
+async def count_products(query: dict, mode: str = "exact") -> Optional[int]:
+    """
+    Count products matching query.
+
+    "exact" always runs count_documents, "estimated" uses collection metadata for
+    an empty filter and a cached count per filter otherwise, "none" skips counting.
+    """
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return await products_collection.count_documents(query)
+    if not query:
+        return await products_collection.estimated_document_count()
+
+    key = hashed_key(json_util.dumps(query, sort_keys=True))
+    total = await count_cache.get(key)
+    if total is None:
+        total = await products_collection.count_documents(query)
+        await count_cache.set(key, total)
+    return total
+
+
+def catalog_version() -> int:
+    """The catalog version as last seen by this process"""
+    return _seen_versions["version"] or 0
+
+
+def stock_version() -> int:
+    """The stock version as last seen by this process"""
+    return _seen_versions["stock"] or 0
+
+
+async def refresh_versions() -> None:
+    """
+    Read the shared versions from Mongo, at most every CATALOG_VERSION_POLL seconds.
+
+    A version written by another process means this process's caches and
+    indexes may be stale, so they are dropped before the new version is
+    adopted and a response can be tagged with it.
+    """
+    global _version_refresh
+    if time.monotonic() - _version_checked_at < CATALOG_VERSION_POLL:
+        return
+    if _version_refresh is None or _version_refresh.done():
+        _version_refresh = asyncio.ensure_future(_refresh_versions())
+    # Shielded so a cancelled request does not cancel the refresh other requests wait for
+    await asyncio.shield(_version_refresh)
+
+
+async def current_catalog_version() -> int:
+    await refresh_versions()
+    return catalog_version()
+
+
+async def _refresh_versions() -> None:
+    global _version_checked_at
+    checked_at = time.monotonic()
+    try:
+        meta = await catalog_meta_collection.find_one({"_id": _VERSION_ID}) or {}
+    except PyMongoError as e:
+        logger.error(f"Could not read the catalog version: {e}")
+        return
+    # Changes this process did not apply itself (another worker without
+    # pub/sub or change streams, or a CLI import)
+    changed = [
+        field for field, seen in _seen_versions.items()
+        if seen is not None and meta.get(field, 0) > seen
+    ]
+    if "version" in changed:
+        await _apply_catalog_resync()
+    elif "stock" in changed and not product_cache.shared:
+        await product_cache.clear()
+    for field, seen in _seen_versions.items():
+        _seen_versions[field] = max(meta.get(field, 0), seen or 0)
+    _version_checked_at = checked_at
+
+
+def _adopt_version(field: str, version: Optional[int]) -> None:
+    """Record that the change which produced this version has been applied here"""
+    global _version_checked_at
+    seen = _seen_versions[field]
+    if version is None or seen is None:
+        return
+    if version == seen + 1:
+        _seen_versions[field] = version
+    elif version > seen:
+        # Some change in between was not seen; the next read resyncs
+        _version_checked_at = 0.0
+
+
+async def _bump_version(field: str) -> Optional[int]:
+    try:
+        meta = await catalog_meta_collection.find_one_and_update(
+            {"_id": _VERSION_ID}, {"$inc": {field: 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except PyMongoError as e:
+        logger.error(f"Could not bump the {field} version: {e}")
+        return None
+    _adopt_version(field, meta[field])
+    return meta[field]
+
+
+async def _drop_product(product_id: Optional[str]) -> None:
+    if product_id is None:
+        await product_cache.clear()
+    else:
+        await product_cache.delete(product_id)
+    await count_cache.clear()
+    await facet_cache.clear()
+
+
+async def _apply_product_change(product_id: Optional[str], product: Optional[dict]) -> None:
+    await _drop_product(product_id)
+    await _notify_product_listeners(product_id, product)
+
+
+async def _apply_catalog_resync() -> None:
+    """Drop everything this process derived from the catalog"""
+    await category_cache.clear()
+    await _apply_product_change(None, None)
+
+
+def add_product_listener(listener: ProductListener) -> None:
+    """Register a callback for product writes, used by derived in-process indexes"""
+    _product_listeners.append(listener)
+
+
+async def _notify_product_listeners(product_id: Optional[str], product: Optional[dict]) -> None:
+    for listener in _product_listeners:
+        try:
+            result = listener(product_id, product)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error(f"Product change listener failed for {product_id}: {e}")
+
+
+async def product_changed(product_id: Optional[str], product: Optional[dict] = None) -> None:
+    """After a product write: invalidate cached data and notify listeners here, then bump the version for every worker"""
+    await _apply_product_change(product_id, product)
+    version = await _bump_version("version")
+    await publish_invalidation("product_changed", product_id, version)
+
+
+async def stock_changed(product_ids: Iterable[str]) -> None:
+    """
+    After orders changed the stock of these products: drop them from the
+    product cache in every worker. Listings, counts, facets and the catalog
+    version do not depend on stock and are left alone.
+    """
+    product_ids = list(product_ids)
+    await asyncio.gather(*(product_cache.delete(product_id) for product_id in product_ids))
+    version = await _bump_version("stock")
+    await publish_invalidation("stock_changed", product_ids, version)
+
+
+async def invalidate_categories() -> None:
+    """After a categories write: drop the cached list in every worker"""
+    await category_cache.clear()
+    version = await _bump_version("version")
+    await publish_invalidation("categories_invalidated", None, version)
+
+
+async def apply_remote_invalidation(event: str, product_id: Union[None, str, List[str]], version: Optional[int] = None) -> None:
+    """Handle an invalidation published by another worker, which already dropped the shared entries"""
+    if event == "resync":
+        await _apply_catalog_resync()
+        return
+    if event == "stock_changed":
+        # product_id is the list of products whose stock changed
+        if not product_cache.shared:
+            for changed_id in product_id:
+                await product_cache.delete(changed_id)
+        _adopt_version("stock", version)
+        return
+    if event == "categories_invalidated":
+        if not category_cache.shared:
+            await category_cache.clear()
+    elif event == "product_changed":
+        if not product_cache.shared:
+            await (product_cache.clear() if product_id is None else product_cache.delete(product_id))
+        await count_cache.clear()
+        await facet_cache.clear()
+        # Listeners keep in-process indexes and need the current document, or None after a deletion
+        product = await products_collection.find_one({"id": product_id}, {"_id": 0}) if product_id else None
+        await _notify_product_listeners(product_id, product)
+    _adopt_version("version", version)
+
+
+def cache_stats() -> dict:
+    return {
+        "products": product_cache.stats(),
+        "categories": category_cache.stats(),
+        "counts": count_cache.stats(),
+        "facets": facet_cache.stats(),
+    }
+
+
+async def watch_catalog_changes():
+    """Apply catalog changes made by other workers as they happen (needs a replica set)"""
+    watched = [products_collection.name, categories_collection.name, catalog_meta_collection.name]
+    pipeline = [{"$match": {"ns.coll": {"$in": watched}}}]
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                logger.info("Watching catalog changes for cache invalidation")
+                async for change in stream:
+                    # Every worker sees the change itself, so nothing is published
+                    collection = change["ns"]["coll"]
+                    if collection == catalog_meta_collection.name:
+                        # The writer bumps a version after its write, so this follows the change it counts
+                        meta = change.get("fullDocument") or {}
+                        for field in _seen_versions:
+                            _adopt_version(field, meta.get(field))
+                    elif collection == categories_collection.name:
+                        await category_cache.clear()
+                    elif change.get("fullDocument"):
+                        product = change["fullDocument"]
+                        del product["_id"]
+                        await _apply_product_change(product["id"], product)
+                    else:
+                        # Delete events only carry the ObjectId, so everything is stale
+                        await _apply_product_change(None, None)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            logger.error(f"Catalog change stream unavailable, relying on the version poll: {e}")
+            return
+        except PyMongoError as e:
+            logger.error(f"Catalog change stream interrupted, reconnecting: {e}")
+            await _apply_catalog_resync()
+            await asyncio.sleep(1)
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from cart_summary import cart_cleared, cart_lock
+from catalog_cache import stock_changed
+from cart_store import cart_store
+from database import client, orders_collection, products_collection
+from models import Order, OrderCreate, OrderLine
+from order_lines import compact_line
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_MAX_ATTEMPTS = int(os.environ.get('CHECKOUT_MAX_ATTEMPTS', '5'))
+CHECKOUT_RETRY_BASE_DELAY = float(os.environ.get('CHECKOUT_RETRY_BASE_DELAY', '0.05'))
+# "auto" detects replica sets; "true" / "false" force the transactional or the compensating path
+CHECKOUT_TRANSACTIONS = os.environ.get('CHECKOUT_TRANSACTIONS', 'auto').lower()
+
+_transactions_supported: Optional[bool] = None
+
+
+class EmptyCart(Exception):
+    pass
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids: List[str]):
+        super().__init__(f"Insufficient stock for products: {', '.join(product_ids)}")
+        self.product_ids = product_ids
+
+
+async def transactions_supported() -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster"""
+    global _transactions_supported
+    if _transactions_supported is None and CHECKOUT_TRANSACTIONS != "auto":
+        _transactions_supported = CHECKOUT_TRANSACTIONS == "true"
+    if _transactions_supported is None:
+        hello = await client.admin.command("hello")
+        _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        if not _transactions_supported:
+            logger.warning("MongoDB runs standalone, checkout falls back to compensating stock updates")
+    return _transactions_supported
+
+
+def _required_stock(lines: List[OrderLine]) -> Dict[str, int]:
+    required: Dict[str, int] = {}
+    for line in lines:
+        required[line.product_id] = required.get(line.product_id, 0) + line.quantity
+    return required
+
+
+# Product fields an order line is priced from
+_ORDER_PRODUCT_FIELDS = {"_id": 0, "id": 1, "name": 1, "price": 1}
+
+
+async def _backoff(attempt: int) -> None:
+    delay = CHECKOUT_RETRY_BASE_DELAY * (2 ** (attempt - 1))
+    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+async def _cart_lines(order_data: OrderCreate, session=None) -> List[dict]:
+    cart_items = await cart_store.lines(order_data.session_id, session=session)
+    if not cart_items:
+        raise EmptyCart()
+    return cart_items
+
+
+def _build_order(order_data: OrderCreate, cart_items: List[dict], products: Dict[str, dict]) -> Order:
+    """
+    Price the cart from product documents read by the checkout itself, never
+    from the catalog cache; lines of products that no longer exist are dropped.
+    """
+    enriched_items = [
+        {**item, "product": products[item["product_id"]]} for item in cart_items if item["product_id"] in products
+    ]
+    if not enriched_items:
+        raise EmptyCart()
+
+    # Lines keep only a name and price snapshot, product details are rehydrated on read
+    lines = [compact_line(item) for item in enriched_items]
+    subtotal = sum(line.price_at_time * line.quantity for line in lines)
+
+    shipping_cost = 0 if subtotal > 50 else 4.99
+    return Order(
+        session_id=order_data.session_id,
+        items=lines,
+        total_amount=round(subtotal + shipping_cost, 2),
+        shipping_cost=shipping_cost,
+        customer_info=order_data.customer_info
+    )
+
+
+async def _short_products(required: Dict[str, int], session=None) -> List[str]:
+    cursor = products_collection.find({"id": {"$in": list(required)}}, {"_id": 0, "id": 1, "stock": 1}, session=session)
+    stock = {product["id"]: product.get("stock", 0) for product in await cursor.to_list(length=None)}
+    return [product_id for product_id, quantity in required.items() if stock.get(product_id, 0) < quantity]
+
+
+async def _checkout_in_transaction(order_data: OrderCreate, session) -> Order:
+    cart_items = await _cart_lines(order_data, session)
+    # Read in the transaction's snapshot, so prices and the stock reserved below come from the same documents
+    cursor = products_collection.find(
+        {"id": {"$in": [item["product_id"] for item in cart_items]}}, _ORDER_PRODUCT_FIELDS, session=session
+    )
+    products = {product["id"]: product for product in await cursor.to_list(length=None)}
+    order = _build_order(order_data, cart_items, products)
+    required = _required_stock(order.items)
+
+    # Reserve stock for every product in one round trip; a line only matches while enough is left
+    result = await products_collection.bulk_write(
+        [
+            UpdateOne({"id": product_id, "stock": {"$gte": quantity}}, {"$inc": {"stock": -quantity}})
+            for product_id, quantity in required.items()
+        ],
+        ordered=False,
+        session=session
+    )
+    if result.matched_count != len(required):
+        raise OutOfStock(await _short_products(required, session))
+
+    await orders_collection.insert_one(order.dict(), session=session)
+    await cart_store.clear(order_data.session_id, session=session)
+    return order
+
+
+async def _checkout_with_transaction(order_data: OrderCreate) -> Order:
+    async with await client.start_session() as session:
+        for attempt in range(1, CHECKOUT_MAX_ATTEMPTS + 1):
+            session.start_transaction(read_concern=ReadConcern("snapshot"), write_concern=WriteConcern("majority"))
+            try:
+                order = await _checkout_in_transaction(order_data, session)
+            except PyMongoError as e:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                if e.has_error_label("TransientTransactionError") and attempt < CHECKOUT_MAX_ATTEMPTS:
+                    logger.warning(f"Retrying checkout for session {order_data.session_id} after transient error: {e}")
+                    await _backoff(attempt)
+                    continue
+                raise
+            except BaseException:
+                if session.in_transaction:
+                    await session.abort_transaction()
+                raise
+
+            for commit_attempt in range(1, CHECKOUT_MAX_ATTEMPTS + 1):
+                try:
+                    await session.commit_transaction()
+                    return order
+                except PyMongoError as e:
+                    if e.has_error_label("UnknownTransactionCommitResult") and commit_attempt < CHECKOUT_MAX_ATTEMPTS:
+                        await _backoff(commit_attempt)
+                        continue
+                    if e.has_error_label("TransientTransactionError") and attempt < CHECKOUT_MAX_ATTEMPTS:
+                        break
+                    raise
+            await _backoff(attempt)
+
+    raise RuntimeError("Checkout transaction did not commit")
+
+
+async def _checkout_without_transaction(order_data: OrderCreate) -> Order:
+    """
+    Standalone servers: reserve stock per product and give it back if the checkout cannot finish.
+
+    Each reservation returns the product's name and price, so the order is
+    priced from the same documents the stock was taken from.
+    """
+    cart_items = await _cart_lines(order_data)
+    required: Dict[str, int] = {}
+    for item in cart_items:
+        required[item["product_id"]] = required.get(item["product_id"], 0) + item["quantity"]
+
+    reserved: Dict[str, int] = {}
+    products: Dict[str, dict] = {}
+    try:
+        for product_id, quantity in required.items():
+            product = await products_collection.find_one_and_update(
+                {"id": product_id, "stock": {"$gte": quantity}},
+                {"$inc": {"stock": -quantity}},
+                projection=_ORDER_PRODUCT_FIELDS
+            )
+            if product is None:
+                if await products_collection.find_one({"id": product_id}, {"_id": 1}) is None:
+                    # Deleted since it was added; the line is dropped
+                    continue
+                raise OutOfStock([product_id])
+            reserved[product_id] = quantity
+            products[product_id] = product
+
+        order = _build_order(order_data, cart_items, products)
+        await orders_collection.insert_one(order.dict())
+    except BaseException:
+        if reserved:
+            await products_collection.bulk_write(
+                [UpdateOne({"id": product_id}, {"$inc": {"stock": quantity}}) for product_id, quantity in reserved.items()],
+                ordered=False
+            )
+        raise
+
+    await cart_store.clear(order_data.session_id)
+    return order
+
+
+async def place_order(order_data: OrderCreate) -> Order:
+    """
+    Turn a session's cart into an order.
+
+    Reading the cart, reserving stock, inserting the order and clearing the cart
+    run as one transaction, retried on transient errors. Raises EmptyCart or
+    OutOfStock, in which case nothing is written.
+    """
+    async with cart_lock(order_data.session_id):
+        if await transactions_supported():
+            order = await _checkout_with_transaction(order_data)
+        else:
+            order = await _checkout_without_transaction(order_data)
+        await cart_cleared(order_data.session_id)
+
+    await stock_changed(_required_stock(order.items))
+    return order
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+StyleHub admin commands.
+
+    python cli.py import-products products.ndjson
+    python cli.py import-products products.csv --key name --url http://localhost:8001
+    python cli.py audit-queries
+    python cli.py compact-carts --dry-run
+"""
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import typer
+
+from product_import import IMPORT_CHUNK_SIZE
+
+app = typer.Typer(help="StyleHub admin commands")
+
+READ_SIZE = 1 << 16
+
+
+@app.callback()
+def main():
+    """StyleHub admin commands"""
+
+
+async def _read_file(path: Path) -> AsyncIterator[bytes]:
+    with path.open("rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+def _import_direct(path: Path, import_format: str, key: str, chunk_size: int) -> dict:
+    from catalog_cache import product_changed
+    from database import client
+    from product_import import ImportReport, import_products, parse_rows, read_lines
+
+    async def run():
+        report = ImportReport()
+        try:
+            rows = parse_rows(read_lines(_read_file(path)), import_format)
+            await import_products(rows, key=key, chunk_size=chunk_size, report=report)
+        except UnicodeDecodeError:
+            report.add_error(report.received + 1, "not UTF-8, the rest of the file was not imported")
+        finally:
+            # Bumps the shared catalog version, so running workers drop their caches
+            # and rebuild their indexes (right away over CACHE_BACKEND=redis pub/sub),
+            # also for the chunks written before a failure
+            if report.written:
+                await product_changed(None)
+        return report
+
+    try:
+        return asyncio.run(run()).dict()
+    finally:
+        client.close()
+
+
+def _import_via_api(path: Path, import_format: str, key: str, chunk_size: int, url: str, admin_token: str) -> dict:
+    import httpx
+
+    def body():
+        with path.open("rb") as f:
+            while chunk := f.read(READ_SIZE):
+                yield chunk
+
+    response = httpx.post(
+        f"{url.rstrip('/')}/api/products/import",
+        params={"format": import_format, "key": key, "chunk_size": chunk_size},
+        headers={"X-Admin-Token": admin_token},
+        content=body(),
+        timeout=None
+    )
+    response.raise_for_status()
+    return response.json()["data"]["report"]
+
+
+@app.command("import-products")
+def import_products(
+    path: Path = typer.Argument(..., exists=True, dir_okay=False, help="NDJSON or CSV file"),
+    import_format: Optional[str] = typer.Option(None, "--format", help="ndjson or csv, defaults to the file extension"),
+    key: str = typer.Option("id", help="Match existing products by id or name"),
+    chunk_size: int = typer.Option(IMPORT_CHUNK_SIZE, help="Rows per bulk write"),
+    url: Optional[str] = typer.Option(None, help="Send the file to a running API instead of writing to MongoDB directly"),
+    admin_token: str = typer.Option("", envvar="ADMIN_TOKEN", help="X-Admin-Token for --url"),
+    show_errors: int = typer.Option(20, help="Number of row errors to print"),
+):
+    """Bulk upsert products from a file."""
+    import_format = import_format or ("csv" if path.suffix.lower() == ".csv" else "ndjson")
+    if import_format not in ("ndjson", "csv") or key not in ("id", "name"):
+        raise typer.BadParameter("--format must be ndjson or csv and --key id or name")
+
+    if url:
+        report = _import_via_api(path, import_format, key, chunk_size, url, admin_token)
+    else:
+        report = _import_direct(path, import_format, key, chunk_size)
+        typer.echo("Running API servers pick up the import within CATALOG_VERSION_POLL seconds")
+
+    typer.echo(
+        f"{report['received']} rows in {report['elapsed_seconds']}s ({report['rows_per_second']} rows/s): "
+        f"{report['inserted']} inserted, {report['updated']} updated, "
+        f"{report['duplicates']} duplicates, {report['failed']} failed"
+    )
+    for error in report["errors"][:show_errors]:
+        typer.echo(f"  row {error['row']}: {error['error']}")
+    if report["failed"]:
+        raise typer.Exit(code=1)
+
+
+@app.command("audit-queries")
+def audit_queries():
+    """Explain the hot request-path queries and flag collection scans."""
+    from database import client, db
+    from query_observer import audit_queries as run_audit
+
+    try:
+        results = asyncio.run(run_audit(db))
+    finally:
+        client.close()
+
+    for result in results:
+        plan = result["plan"]
+        typer.echo(
+            f"{'COLLSCAN' if plan['collscan'] else 'ok      '} {result['name']} on {result['collection']}: "
+            f"{' <- '.join(plan['stages'])} via {', '.join(plan['indexes']) or 'no index'}, "
+            f"{plan['docs_examined']} docs / {plan['keys_examined']} keys examined for {plan['returned']} returned"
+        )
+    if any(result["plan"]["collscan"] for result in results):
+        raise typer.Exit(code=1)
+
+
+@app.command("compact-carts")
+def compact_carts(
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be merged"),
+):
+    """Merge duplicate cart lines left over from concurrent add-to-cart calls."""
+    from database import client
+    from cart_compaction import compact_cart_items
+
+    try:
+        report = asyncio.run(compact_cart_items(dry_run=dry_run))
+    finally:
+        client.close()
+
+    if report.unique_index:
+        typer.echo("The unique cart line index exists, so there are no duplicate lines to merge")
+        return
+    typer.echo(
+        f"{'Would merge' if dry_run else 'Merged'} {report.groups} duplicate lines in {report.sessions} sessions: "
+        f"{report.rows_removed} rows, {report.bytes_reclaimed} bytes in {report.elapsed_seconds}s"
+    )
+
+
+if __name__ == "__main__":
+    app()
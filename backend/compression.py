@@ -0,0 +1,213 @@
+import gzip
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from cache import TTLCache
+from http_cache import catalog_etag, etag_matches
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip only
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSED_SNAPSHOT_SIZE = int(os.environ.get('COMPRESSED_SNAPSHOT_SIZE', '64'))
+# Larger bodies are compressed per request and not kept, which bounds the snapshots to SIZE * MAX_BODY bytes
+COMPRESSED_SNAPSHOT_MAX_BODY = int(os.environ.get('COMPRESSED_SNAPSHOT_MAX_BODY', str(256 * 1024)))
+COMPRESSED_SNAPSHOT_TTL = float(os.environ.get('CATALOG_CACHE_TTL', '300'))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# The hot listing pages (exact paths, any query string); product details and search are compressed per request
+SNAPSHOT_PATHS = ("/api/products", "/api/categories", "/api/storefront")
+
+# Per-request bodies favour speed; snapshots are compressed once and served many times
+LEVELS = {
+    "br": {"dynamic": 4, "snapshot": 9},
+    "zstd": {"dynamic": 3, "snapshot": 12},
+    "gzip": {"dynamic": 6, "snapshot": 9},
+}
+
+# (etag, encoding) -> (status, headers, body) of a compressed catalog response
+compressed_snapshots = TTLCache(maxsize=COMPRESSED_SNAPSHOT_SIZE, ttl=COMPRESSED_SNAPSHOT_TTL)
+
+
+def available_encodings() -> tuple:
+    """Encodings in order of preference, limited to the installed codecs"""
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate(accept_encoding: str, encodings: tuple) -> Optional[str]:
+    """Pick the preferred encoding the client accepts, or None for identity"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                continue
+        accepted[name.strip()] = quality
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(encoding: str, body: bytes, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class StreamCompressor:
+    """Incremental compressor for streamed bodies; every chunk is flushed so clients see it promptly"""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + (self._compressor.finish() if last else self._compressor.flush())
+        if self.encoding == "zstd":
+            flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if last else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _compressible(start: dict, headers: MutableHeaders) -> bool:
+    return (
+        start["status"] not in (204, 304)
+        and "content-encoding" not in headers
+        and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+    )
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str, minimum_size: int, snapshot: bool):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.snapshot = snapshot
+        self.start = None
+        self.stream: Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether compressing pays off
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(scope=start)
+            if not _compressible(start, headers):
+                self.passthrough = True
+            else:
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    self.passthrough = True
+
+            if self.passthrough:
+                await self.send(start)
+                await self.send(message)
+                return
+
+            headers["Content-Encoding"] = self.encoding
+            if not more_body:
+                etag = headers.get("etag")
+                keep = self.snapshot and etag and start["status"] == 200 and len(body) <= COMPRESSED_SNAPSHOT_MAX_BODY
+                level = LEVELS[self.encoding]["snapshot" if keep else "dynamic"]
+                body = compress(self.encoding, body, level)
+                headers["Content-Length"] = str(len(body))
+                if keep:
+                    compressed_snapshots.set((etag, self.encoding), (start["status"], list(start["headers"]), body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            del headers["Content-Length"]
+            self.stream = StreamCompressor(self.encoding, LEVELS[self.encoding]["dynamic"])
+            await self.send(start)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        await self.send({
+            "type": "http.response.body",
+            "body": self.stream.chunk(body, last=not more_body),
+            "more_body": more_body,
+        })
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with br, zstd or gzip, whichever the client accepts and
+    is installed, once the body reaches minimum_size. Streamed bodies are
+    compressed chunk by chunk.
+
+    GETs of the snapshot paths keep their compressed bytes (up to
+    COMPRESSED_SNAPSHOT_MAX_BODY) keyed by ETag and encoding. While the catalog
+    version is unchanged the next request for the same URL is answered from
+    that snapshot without running the route or the compressor.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, snapshot_paths: tuple = SNAPSHOT_PATHS):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.snapshot_paths = snapshot_paths
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        snapshot = scope["method"] == "GET" and scope["path"].rstrip("/") in self.snapshot_paths
+        if snapshot:
+            etag = await catalog_etag(scope["path"], scope["query_string"])
+            if_none_match = request_headers.get("if-none-match")
+            cached = compressed_snapshots.get((etag, encoding))
+            if cached is not None and not (if_none_match and etag_matches(if_none_match, etag)):
+                status, headers, body = cached
+                await send({"type": "http.response.start", "status": status, "headers": list(headers)})
+                await send({"type": "http.response.body", "body": body})
+                return
+
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size, snapshot))
@@ -1,23 +1,95 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
 import os
+from datetime import datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 from models import Product, Category
+from monitoring import command_metrics, pool_metrics
+from query_observer import slow_query_observer
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+def client_options() -> dict:
+    """Connection pool and read settings from the environment; unset values keep the driver defaults"""
+    settings = {
+        "maxPoolSize": ("MONGO_MAX_POOL_SIZE", int),
+        "minPoolSize": ("MONGO_MIN_POOL_SIZE", int),
+        "maxIdleTimeMS": ("MONGO_MAX_IDLE_TIME_MS", int),
+        "waitQueueTimeoutMS": ("MONGO_WAIT_QUEUE_TIMEOUT_MS", int),
+        "compressors": ("MONGO_COMPRESSORS", str),
+        "readPreference": ("MONGO_READ_PREFERENCE", str),
+        "readConcernLevel": ("MONGO_READ_CONCERN", str),
+    }
+    options = {}
+    for option, (variable, convert) in settings.items():
+        value = os.environ.get(variable)
+        if value:
+            options[option] = convert(value)
+    return options
+
+def create_client() -> AsyncIOMotorClient:
+    """The single Motor client (and connection pool) shared by every module"""
+    return AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        event_listeners=[pool_metrics, command_metrics, slow_query_observer],
+        **client_options()
+    )
+
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = create_client()
 db = client[os.environ['DB_NAME']]
 
 # Collections
 products_collection = db.products
 categories_collection = db.categories
 cart_items_collection = db.cart_items
+carts_collection = db.carts
 orders_collection = db.orders
+catalog_meta_collection = db.catalog_meta
+
+# Cart lines are dropped by a TTL index this long after they were added (whole
+# carts, in the one-document-per-session layout, this long after their last change)
+CART_RETENTION_DAYS = float(os.environ.get('CART_RETENTION_DAYS', '30'))
+
+# Declared index set, keyed by collection name
+INDEXES = {
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("is_on_sale", ASCENDING)], name="category_is_on_sale"),
+        IndexModel([("price", ASCENDING)], name="price"),
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "categories": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "cart_items": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [
+                ("session_id", ASCENDING),
+                ("product_id", ASCENDING),
+                ("selected_size", ASCENDING),
+                ("selected_color", ASCENDING),
+            ],
+            name="session_line_unique",
+            unique=True,
+        ),
+        IndexModel([("added_at", ASCENDING)], name="added_at_ttl", expireAfterSeconds=int(CART_RETENTION_DAYS * 86400)),
+    ],
+    "carts": [
+        IndexModel([("session_id", ASCENDING)], name="session_id_unique", unique=True),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=int(CART_RETENTION_DAYS * 86400)),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("session_id", ASCENDING), ("created_at", DESCENDING)], name="session_created_at"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+}
 
 async def init_categories():
     """Initialize categories if they don't exist"""
@@ -33,6 +105,9 @@ async def init_categories():
         
         categories_data = [cat.dict() for cat in categories]
         await categories_collection.insert_many(categories_data)
+        # Workers that started first may have cached the empty list
+        from catalog_cache import invalidate_categories
+        await invalidate_categories()
         print(f"✅ {len(categories)} Kategorien erstellt")
 
 async def init_products():
@@ -138,8 +213,71 @@ async def init_products():
         await products_collection.insert_many(products_data)
         print(f"✅ {len(sample_products)} Produkte erstellt")
 
+async def ensure_indexes():
+    """Create the declared index set on every collection"""
+    for collection_name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                try:
+                    await db[collection_name].create_indexes([index])
+                except OperationFailure as e:
+                    if e.code != 85 or "expireAfterSeconds" not in index.document:
+                        raise
+                    # Only the retention changed; collMod updates the TTL in place instead of a rebuild
+                    await db.command({"collMod": collection_name, "index": {
+                        "name": index.document["name"], "expireAfterSeconds": index.document["expireAfterSeconds"]
+                    }})
+            except OperationFailure as e:
+                print(f"❌ Index {index.document['name']} für {collection_name} konnte nicht erstellt werden: {e}")
+
+# $indexStats counts from the last restart or index build; shorter windows say nothing about real traffic
+INDEX_USAGE_MIN_DAYS = float(os.environ.get('INDEX_USAGE_MIN_DAYS', '7'))
+
+def unused_indexes(stats: list, now: datetime) -> list:
+    """Indexes without accesses in $indexStats output whose counters span INDEX_USAGE_MIN_DAYS"""
+    counted_since = now - timedelta(days=INDEX_USAGE_MIN_DAYS)
+    return sorted(
+        stat["name"] for stat in stats
+        if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0
+        and isinstance(stat["accesses"].get("since"), datetime) and stat["accesses"]["since"] <= counted_since
+    )
+
+async def verify_indexes():
+    """Compare existing indexes with the declared set and report missing or unused ones"""
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        declared = {index.document["name"]: dict(index.document["key"]) for index in indexes}
+        existing = {
+            name: dict(info["key"])
+            for name, info in (await collection.index_information()).items()
+        }
+
+        missing = [name for name, keys in declared.items() if existing.get(name) != keys]
+        undeclared = [name for name in existing if name != "_id_" and name not in declared]
+
+        try:
+            stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+            unused = unused_indexes(stats, datetime.utcnow())
+        except Exception:
+            # $indexStats needs extra privileges and is not available everywhere
+            unused = []
+
+        report[collection_name] = {"missing": missing, "undeclared": undeclared, "unused": unused}
+
+        if missing:
+            print(f"⚠️ Fehlende Indizes in {collection_name}: {', '.join(missing)}")
+        if undeclared:
+            print(f"⚠️ Nicht deklarierte Indizes in {collection_name}: {', '.join(undeclared)}")
+        if unused:
+            print(f"ℹ️ Unbenutzte Indizes in {collection_name} seit mindestens {INDEX_USAGE_MIN_DAYS:g} Tagen: {', '.join(unused)}")
+
+    return report
+
 async def initialize_database():
     """Initialize all collections with sample data"""
+    await ensure_indexes()
+    await verify_indexes()
     await init_categories()
     await init_products()
     print("✅ Datenbank initialisiert")
\ No newline at end of file
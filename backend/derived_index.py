@@ -0,0 +1,74 @@
+"""
+Base class for the in-process structures derived from the products collection
+(search index, suggestion index, storefront).
+
+Each one is built from a full scan of the collection and then kept current by
+the product write listeners of catalog_cache. The scan may read a product
+before a concurrent write to it, so changes that arrive during the scan are
+buffered and replayed on the new contents before they are swapped in; a
+change to unknown products starts the scan over. Full invalidations share one
+rebuild task, so a burst of them does not start overlapping scans.
+"""
+import asyncio
+from typing import List, Optional, Tuple
+
+
+class DerivedIndex:
+    """
+    Subclasses implement _load() (scan Mongo into a new, unswapped instance),
+    _apply() (one product write or deletion) and _swap() (take over the
+    contents of a loaded instance).
+    """
+
+    def __init__(self):
+        self._build_lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # Product changes that arrive while rebuild() scans Mongo
+        self._pending: Optional[List[Tuple[Optional[str], Optional[dict]]]] = None
+        self.ready = False
+
+    async def _load(self) -> "DerivedIndex":
+        raise NotImplementedError
+
+    def _apply(self, product_id: str, product: Optional[dict]) -> None:
+        raise NotImplementedError
+
+    def _swap(self, fresh: "DerivedIndex") -> None:
+        raise NotImplementedError
+
+    async def rebuild(self) -> None:
+        """Load every product from Mongo and replace the contents"""
+        async with self._build_lock:
+            while True:
+                self._pending = []
+                try:
+                    fresh = await self._load()
+                finally:
+                    pending, self._pending = self._pending, None
+                if all(product_id is not None for product_id, _ in pending):
+                    break
+            for product_id, product in pending:
+                fresh._apply(product_id, product)
+            self._swap(fresh)
+            self.ready = True
+
+    async def ensure_built(self) -> None:
+        if not self.ready:
+            # Shielded so a cancelled request does not cancel the build other requests wait for
+            await asyncio.shield(self._schedule_rebuild())
+
+    def _schedule_rebuild(self) -> asyncio.Task:
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.get_running_loop().create_task(self.rebuild())
+        return self._rebuild_task
+
+    def on_product_changed(self, product_id: Optional[str], product: Optional[dict]) -> None:
+        if self._pending is not None:
+            self._pending.append((product_id, product))
+        if product_id is None:
+            self.ready = False
+            # A running scan starts over by itself
+            if self._pending is None:
+                self._schedule_rebuild()
+        elif self.ready:
+            self._apply(product_id, product)
@@ -0,0 +1,20 @@
+from typing import List
+
+from catalog_cache import get_products
+
+
+async def enrich_cart_items(cart_items: List[dict]) -> List[dict]:
+    """Attach product details to cart items, skipping items whose product no longer exists"""
+    products = await get_products(item["product_id"] for item in cart_items)
+
+    enriched_items = []
+    for item in cart_items:
+        if "_id" in item:
+            del item["_id"]
+
+        product = products.get(item["product_id"])
+        if product:
+            item["product"] = product
+            enriched_items.append(item)
+
+    return enriched_items
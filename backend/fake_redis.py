@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+In-memory server speaking the subset of the Redis protocol that
+cache_backend uses: GET, MGET, SET (EX/PX/NX), DEL, UNLINK, EXISTS, SCAN,
+DBSIZE, FLUSHDB, PING, AUTH, SELECT, PUBLISH and SUBSCRIBE. It lets the
+shared cache and the invalidation messages between workers be tried without
+a Redis installation.
+
+    python fake_redis.py --port 6380
+    CACHE_BACKEND=redis CACHE_URL=redis://localhost:6380/0 uvicorn server:app --workers 4
+"""
+import argparse
+import asyncio
+import fnmatch
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from cache_backend import read_reply
+
+logger = logging.getLogger(__name__)
+
+OK = "OK"
+
+
+def encode_reply(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return b"-ERR %s\r\n" % str(value).encode()
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode()
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(encode_reply(item) for item in value)
+
+
+class FakeRedisServer:
+    def __init__(self):
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = defaultdict(set)
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start listening; returns the bound port (useful with port 0)"""
+        self.server = await asyncio.start_server(self._serve, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _live_keys(self) -> List[bytes]:
+        return [key for key in list(self.data) if self._live(key) is not None]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriptions: Set[bytes] = set()
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                name, args = command[0].upper(), command[1:]
+                if name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels[channel].add(writer)
+                        subscriptions.add(channel)
+                        writer.write(encode_reply([b"subscribe", channel, len(subscriptions)]))
+                    continue
+                try:
+                    reply = self.execute(name, args)
+                except Exception as e:
+                    reply = e
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        finally:
+            for channel in subscriptions:
+                self.channels[channel].discard(writer)
+            writer.close()
+
+    def execute(self, name: bytes, args: List[bytes]):
+        if name in (b"PING",):
+            return "PONG"
+        if name in (b"AUTH", b"SELECT"):
+            return OK
+        if name == b"GET":
+            return self._live(args[0])
+        if name == b"MGET":
+            return [self._live(key) for key in args]
+        if name == b"SET":
+            expires_at = None
+            options = [arg.upper() for arg in args[2:]]
+            if b"NX" in options and self._live(args[0]) is not None:
+                return None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            elif b"EX" in options:
+                expires_at = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+            self.data[args[0]] = (args[1], expires_at)
+            return OK
+        if name in (b"DEL", b"UNLINK"):
+            return sum(1 for key in args if self._live(key) is not None and self.data.pop(key, None) is not None)
+        if name == b"EXISTS":
+            return sum(1 for key in args if self._live(key) is not None)
+        if name == b"SCAN":
+            # Everything in one page, which is a valid SCAN result
+            pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+            return [b"0", [key for key in self._live_keys() if fnmatch.fnmatchcase(key.decode(), pattern)]]
+        if name == b"DBSIZE":
+            return len(self._live_keys())
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return OK
+        if name == b"PUBLISH":
+            channel, message = args
+            subscribers = list(self.channels.get(channel, ()))
+            for subscriber in subscribers:
+                subscriber.write(encode_reply([b"message", channel, message]))
+            return len(subscribers)
+        raise ValueError(f"unknown command '{name.decode()}'")
+
+
+async def serve(host: str, port: int) -> None:
+    server = FakeRedisServer()
+    bound = await server.start(host, port)
+    logger.info(f"Fake Redis listening on {host}:{bound}")
+    await server.server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
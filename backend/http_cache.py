@@ -0,0 +1,75 @@
+import hashlib
+import os
+from typing import Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from catalog_cache import catalog_version, refresh_versions, stock_version
+
+CATALOG_PATHS: Tuple[str, ...] = ("/api/products", "/api/categories", "/api/search", "/api/storefront")
+# Responses that carry the stock field, so their tags also change when orders change stock
+STOCK_PATHS: Tuple[str, ...] = ("/api/products",)
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', '0'))
+
+async def catalog_etag(path: str, query_string: bytes) -> str:
+    """
+    Weak ETag for one catalog URL at the current catalog (and stock) version.
+
+    The versions are shared by all workers (see catalog_cache), so every worker
+    gives the same URL the same tag until the catalog changes anywhere.
+    """
+    await refresh_versions()
+    version = str(catalog_version())
+    if path.startswith(STOCK_PATHS):
+        version += f".{stock_version()}"
+    digest = hashlib.blake2b(path.encode() + b"?" + query_string, digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against etag"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+class CatalogCacheMiddleware:
+    """
+    Conditional GETs for the catalog routes.
+
+    A request whose If-None-Match still matches the catalog version is answered
+    with 304 before the route runs. Successful responses get the ETag and a
+    Cache-Control header. The tag is taken before the route reads the catalog,
+    so a write during the request can only make it stale, never too new.
+    """
+
+    def __init__(self, app, paths: Tuple[str, ...] = CATALOG_PATHS, max_age: int = HTTP_CACHE_MAX_AGE):
+        self.app = app
+        self.paths = paths
+        self.cache_control = f"public, max-age={max_age}, must-revalidate"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        etag = await catalog_etag(scope["path"], scope["query_string"])
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag.encode()), (b"cache-control", self.cache_control.encode())],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def send_with_validators(message):
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                headers = MutableHeaders(scope=message)
+                headers["ETag"] = etag
+                headers["Cache-Control"] = self.cache_control
+            await send(message)
+
+        await self.app(scope, receive, send_with_validators)
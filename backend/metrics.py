@@ -0,0 +1,278 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import Match
+
+from monitoring import RequestMongoStats, command_metrics, current_request_mongo, pool_metrics
+from query_observer import slow_query_observer
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MONGO_CALL_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Opt-in: requests slower than this are logged with where they spent their time
+SLOW_REQUEST_PROFILE_MS = float(os.environ.get('SLOW_REQUEST_PROFILE_MS', '0'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', '5'))
+SLOW_PROFILES_KEPT = 50
+PROFILE_TOP_STACKS = 15
+
+BACKEND_DIR = str(Path(__file__).resolve().parent)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class RequestMetrics:
+    """Per-route HTTP metrics; only touched from the event loop thread"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: Counter = Counter()
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.mongo_calls: Dict[Tuple[str, str], Histogram] = {}
+        self.mongo_seconds: Counter = Counter()
+
+    def observe(self, method: str, route: str, status: int, seconds: float, mongo: RequestMongoStats) -> None:
+        key = (method, route)
+        self.requests[(method, route, str(status))] += 1
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.mongo_calls[key] = Histogram(MONGO_CALL_BUCKETS)
+        self.latency[key].observe(seconds)
+        self.mongo_calls[key].observe(mongo.calls)
+        self.mongo_seconds[key] += mongo.seconds
+
+
+request_metrics = RequestMetrics()
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{name}="{_label(value)}"' for name, value in labels.items())
+
+
+def _metric(name: str, kind: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def render_metrics(caches: Optional[Dict[str, dict]] = None) -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = _metric("stylehub_http_requests_in_flight", "gauge", "Requests currently being served")
+    lines.append(f"stylehub_http_requests_in_flight {request_metrics.in_flight}")
+
+    lines += _metric("stylehub_http_requests_total", "counter", "Requests by route and status")
+    for (method, route, status), count in sorted(request_metrics.requests.items()):
+        lines.append(f"stylehub_http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+
+    lines += _metric("stylehub_http_request_duration_seconds", "histogram", "Request latency by route")
+    for (method, route), histogram in sorted(request_metrics.latency.items()):
+        lines += histogram.lines("stylehub_http_request_duration_seconds", _labels(method=method, route=route))
+
+    lines += _metric("stylehub_http_request_mongo_calls", "histogram", "Mongo commands per request by route")
+    for (method, route), histogram in sorted(request_metrics.mongo_calls.items()):
+        lines += histogram.lines("stylehub_http_request_mongo_calls", _labels(method=method, route=route))
+
+    lines += _metric("stylehub_http_request_mongo_seconds_total", "counter", "Time spent in Mongo commands by route")
+    for (method, route), seconds in sorted(request_metrics.mongo_seconds.items()):
+        lines.append(f"stylehub_http_request_mongo_seconds_total{{{_labels(method=method, route=route)}}} {seconds}")
+
+    commands = command_metrics.snapshot()
+    for field, name, help_text in (
+        ("count", "stylehub_mongo_commands_total", "Mongo commands by name"),
+        ("failures", "stylehub_mongo_command_failures_total", "Failed Mongo commands by name"),
+        ("seconds", "stylehub_mongo_command_seconds_total", "Time spent in Mongo commands by name"),
+    ):
+        lines += _metric(name, "counter", help_text)
+        for command, values in sorted(commands.items()):
+            lines.append(f"{name}{{{_labels(command=command)}}} {values[field]}")
+
+    slow = slow_query_observer.snapshot()
+    for name, kind, help_text, value in (
+        ("stylehub_mongo_slow_queries_total", "counter", "Mongo commands over SLOW_QUERY_MS by route and shape",
+         lambda query: query["count"]),
+        ("stylehub_mongo_slow_query_collscan", "gauge", "1 if the last explain of a slow query shape was a COLLSCAN",
+         lambda query: int(bool(query["plan"] and query["plan"]["collscan"]))),
+    ):
+        lines += _metric(name, kind, help_text)
+        for query in slow:
+            labels = _labels(route=query["route"], collection=query["collection"], command=query["command"], shape=query["shape"])
+            lines.append(f"{name}{{{labels}}} {value(query)}")
+
+    pool = pool_metrics.snapshot()
+    lines += _metric("stylehub_mongo_pool_connections", "gauge", "Pool connections by state")
+    for address, counts in sorted(pool["pools"].items()):
+        for state in ("open", "checked_out"):
+            lines.append(f"stylehub_mongo_pool_connections{{{_labels(address=address, state=state)}}} {counts[state]}")
+    for field, name in (
+        ("checkouts", "stylehub_mongo_pool_checkouts_total"),
+        ("checkout_failures", "stylehub_mongo_pool_checkout_failures_total"),
+        ("checkout_timeouts", "stylehub_mongo_pool_checkout_timeouts_total"),
+    ):
+        lines += _metric(name, "counter", f"Connection pool {field.replace('_', ' ')}")
+        lines.append(f"{name} {pool[field]}")
+
+    if caches:
+        for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+            name = f"stylehub_cache_{field}" + ("_total" if kind == "counter" else "")
+            lines += _metric(name, kind, f"Cache {field}")
+            for cache, stats in sorted(caches.items()):
+                # Shared namespaces have no local evictions or size
+                if stats.get(field) is None:
+                    continue
+                lines.append(f"{name}{{{_labels(cache=cache)}}} {stats[field]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def await_stack(coroutine) -> List[str]:
+    """Where a suspended coroutine is waiting: its await chain, outermost first"""
+    frames = []
+    while coroutine is not None:
+        frame = getattr(coroutine, "cr_frame", None) or getattr(coroutine, "ag_frame", None) or getattr(coroutine, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coroutine = getattr(coroutine, "cr_await", None) or getattr(coroutine, "gi_yieldfrom", None)
+
+    # Application frames except the ASGI middleware, plus the innermost frame,
+    # which shows what is being awaited
+    return [
+        f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+        for position, frame in enumerate(frames)
+        if position == len(frames) - 1
+        or (frame.f_code.co_filename.startswith(BACKEND_DIR) and frame.f_code.co_name != "__call__")
+    ]
+
+
+class SlowRequestProfiler:
+    """
+    Sampling profiler for slow requests.
+
+    A background task samples the await chain of every in-flight request each
+    interval. Requests that end above the threshold keep their samples as a
+    profile, which is logged and listed at /api/metrics/slow-requests; the
+    samples of all other requests are dropped.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_PROFILE_MS, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.active: Dict[asyncio.Task, Counter] = {}
+        self.profiles = deque(maxlen=SLOW_PROFILES_KEPT)
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            for task, samples in list(self.active.items()):
+                stack = await_stack(task.get_coro())
+                if stack:
+                    samples[";".join(stack)] += 1
+
+    def begin(self, task: Optional[asyncio.Task]) -> None:
+        if task is not None:
+            self.active[task] = Counter()
+
+    def end(self, task: Optional[asyncio.Task], method: str, path: str, seconds: float, mongo: RequestMongoStats) -> None:
+        samples = self.active.pop(task, None)
+        if samples is None or seconds < self.threshold:
+            return
+
+        top = samples.most_common(PROFILE_TOP_STACKS)
+        self.profiles.append({
+            "method": method,
+            "path": path,
+            "duration_ms": round(seconds * 1000, 3),
+            "mongo_calls": mongo.calls,
+            "mongo_ms": round(mongo.seconds * 1000, 3),
+            "samples": sum(samples.values()),
+            "stacks": [{"stack": stack, "samples": count} for stack, count in top],
+        })
+        logger.warning(
+            f"Slow request {method} {path}: {seconds * 1000:.1f}ms, {mongo.calls} Mongo calls "
+            f"({mongo.seconds * 1000:.1f}ms), {sum(samples.values())} samples"
+            + "".join(f"\n  {count:5d} {stack}" for stack, count in top)
+        )
+
+
+slow_request_profiler = SlowRequestProfiler()
+
+
+class MetricsMiddleware:
+    """Per-route count, latency, in-flight and Mongo usage for every HTTP request"""
+
+    def __init__(self, app, routes: list, profiler: SlowRequestProfiler = slow_request_profiler):
+        self.app = app
+        self.routes = routes
+        self.profiler = profiler
+
+    def route_template(self, scope) -> str:
+        # Templates, not raw paths, keep the label set bounded
+        partial = None
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        mongo = RequestMongoStats(self.route_template(scope))
+        token = current_request_mongo.set(mongo)
+        task = asyncio.current_task() if self.profiler.enabled else None
+        self.profiler.begin(task)
+        request_metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_metrics.in_flight -= 1
+            current_request_mongo.reset(token)
+            request_metrics.observe(scope["method"], mongo.route, status, elapsed, mongo)
+            self.profiler.end(task, scope["method"], scope["path"], elapsed, mongo)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Move carts from one cart_items document per line to one carts document per
+session (CART_STORAGE=document).
+
+Lines of the same (product, size, color) are merged and carts are cut to
+their MAX_CART_LINES oldest lines. Sessions that already have a carts
+document are left alone, so the migration can be interrupted and run again.
+With --delete-lines the migrated line documents are removed afterwards. Run
+it with the API stopped or still on CART_STORAGE=lines, then switch over.
+Uses MONGO_URL and DB_NAME from backend/.env.
+
+    python migrations/cart_documents.py --dry-run
+    python migrations/cart_documents.py --batch-size 500 --delete-lines
+"""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from pymongo import UpdateOne
+
+from cart_store import LINE_KEY, MAX_CART_LINES
+from database import cart_items_collection, carts_collection, client
+
+
+def cart_document(session_id: str, lines: list, stats: dict) -> dict:
+    """The carts document for a session's line documents, oldest first"""
+    merged = {}
+    for line in lines:
+        key = tuple(line.get(field) for field in LINE_KEY)
+        if key in merged:
+            merged[key]["quantity"] += line.get("quantity", 0)
+            stats["merged_lines"] += 1
+        else:
+            merged[key] = {field: value for field, value in line.items() if field not in ("_id", "session_id")}
+
+    kept = list(merged.values())[:MAX_CART_LINES]
+    stats["truncated_lines"] += len(merged) - len(kept)
+    # updated_at drives the carts TTL index, so it is always a date
+    added = [line["added_at"] for line in kept if isinstance(line.get("added_at"), datetime)]
+    now = datetime.utcnow()
+    return {
+        "session_id": session_id,
+        "lines": kept,
+        "created_at": min(added, default=now),
+        "updated_at": max(added, default=now),
+    }
+
+
+async def migrate(batch_size: int, dry_run: bool, delete_lines: bool) -> dict:
+    stats = {
+        "sessions": 0, "lines": 0, "carts_written": 0, "already_migrated": 0,
+        "merged_lines": 0, "truncated_lines": 0, "bytes_before": 0, "bytes_after": 0,
+    }
+    batch, sessions = [], []
+
+    async def flush():
+        if batch and not dry_run:
+            result = await carts_collection.bulk_write(batch, ordered=False)
+            written = [sessions[index] for index in result.upserted_ids]
+            stats["carts_written"] += len(written)
+            stats["already_migrated"] += len(batch) - len(written)
+            if delete_lines and written:
+                await cart_items_collection.delete_many({"session_id": {"$in": written}})
+        batch.clear()
+        sessions.clear()
+
+    groups = cart_items_collection.aggregate([
+        {"$sort": {"session_id": 1, "added_at": 1}},
+        {"$group": {"_id": "$session_id", "lines": {"$push": "$$ROOT"}}},
+    ], allowDiskUse=True, batchSize=batch_size)
+
+    async for group in groups:
+        cart = cart_document(group["_id"], group["lines"], stats)
+        stats["sessions"] += 1
+        stats["lines"] += len(group["lines"])
+        stats["bytes_before"] += sum(len(bson.encode(line)) for line in group["lines"])
+        stats["bytes_after"] += len(bson.encode(cart))
+        batch.append(UpdateOne({"session_id": cart["session_id"]}, {"$setOnInsert": cart}, upsert=True))
+        sessions.append(cart["session_id"])
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    parser.add_argument('--delete-lines', action='store_true', help='Remove the line documents of migrated carts')
+    args = parser.parse_args()
+
+    try:
+        stats = asyncio.run(migrate(args.batch_size, args.dry_run, args.delete_lines))
+    finally:
+        client.close()
+
+    verb = "Would migrate" if args.dry_run else "Migrated"
+    print(
+        f"{verb} {stats['sessions']} carts with {stats['lines']} lines "
+        f"({stats['merged_lines']} merged, {stats['truncated_lines']} over MAX_CART_LINES dropped): "
+        f"{stats['bytes_before'] / 1024:.1f} KiB -> {stats['bytes_after'] / 1024:.1f} KiB"
+    )
+    if not args.dry_run:
+        print(f"{stats['carts_written']} carts written, {stats['already_migrated']} already had a carts document")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Rewrite order lines that embed a full product document into compact lines
+(product_id, name, price_at_time, selected_size, selected_color, quantity).
+
+Orders already in the compact form are not matched, so the migration can be
+interrupted and run again. Uses MONGO_URL and DB_NAME from backend/.env.
+
+    python migrations/compact_order_lines.py --dry-run
+    python migrations/compact_order_lines.py --batch-size 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from pymongo import UpdateOne
+
+from database import client, orders_collection
+from order_lines import compact_line
+
+LEGACY_ORDERS = {"items.product": {"$exists": True}}
+
+
+def compact_items(items: list) -> list:
+    return [compact_line(item).dict() if "product" in item else item for item in items]
+
+
+async def migrate(batch_size: int, dry_run: bool) -> dict:
+    stats = {"orders": 0, "bytes_before": 0, "bytes_after": 0}
+    batch = []
+
+    async def flush():
+        if batch and not dry_run:
+            await orders_collection.bulk_write(batch, ordered=False)
+        batch.clear()
+
+    async for order in orders_collection.find(LEGACY_ORDERS, {"_id": 1, "items": 1}, batch_size=batch_size):
+        items = compact_items(order["items"])
+        stats["orders"] += 1
+        stats["bytes_before"] += len(bson.encode({"items": order["items"]}))
+        stats["bytes_after"] += len(bson.encode({"items": items}))
+        batch.append(UpdateOne({"_id": order["_id"]}, {"$set": {"items": items}}))
+        if len(batch) >= batch_size:
+            await flush()
+    await flush()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+    args = parser.parse_args()
+
+    try:
+        stats = asyncio.run(migrate(args.batch_size, args.dry_run))
+    finally:
+        client.close()
+
+    verb = "Would compact" if args.dry_run else "Compacted"
+    print(
+        f"{verb} {stats['orders']} orders: items {stats['bytes_before'] / 1024:.1f} KiB -> "
+        f"{stats['bytes_after'] / 1024:.1f} KiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
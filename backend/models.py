@@ -61,10 +61,18 @@ class CustomerInfo(BaseModel):
     address: str
     phone: Optional[str] = None
 
+class OrderLine(BaseModel):
+    product_id: str
+    name: str  # Product name at the time of the order
+    price_at_time: float
+    selected_size: str
+    selected_color: str
+    quantity: int
+
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     session_id: str
-    items: List[dict]  # Will contain cart items with product details
+    items: List[OrderLine]
     total_amount: float
     shipping_cost: float
     customer_info: CustomerInfo
@@ -0,0 +1,146 @@
+import contextvars
+import threading
+import time
+from typing import Optional
+
+from pymongo import monitoring
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool utilization, fed by PyMongo's pool events from the driver threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.pools = {}
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _pool(self, address):
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {"open": 0, "checked_out": 0, "max_checked_out": 0}
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._pool(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        waited = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] += 1
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._pool(event.address)["checked_out"] -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pools": {address: dict(pool) for address, pool in self.pools.items()},
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "wait_ms_avg": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class RequestMongoStats:
+    """Mongo calls made while serving one HTTP request, and the route template serving it"""
+
+    __slots__ = ("route", "calls", "seconds")
+
+    def __init__(self, route: str = ""):
+        self.route = route
+        self.calls = 0
+        self.seconds = 0.0
+
+
+# Set by the metrics middleware. Motor copies the context into its executor
+# threads, so command events for a request's queries see the request's stats.
+current_request_mongo: contextvars.ContextVar[Optional[RequestMongoStats]] = contextvars.ContextVar(
+    "current_request_mongo", default=None
+)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Count and time of every Mongo command, per command name and per request"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = {}
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool):
+        seconds = event.duration_micros / 1_000_000
+        request = current_request_mongo.get()
+        with self._lock:
+            command = self.commands.get(event.command_name)
+            if command is None:
+                command = self.commands[event.command_name] = {"count": 0, "failures": 0, "seconds": 0.0}
+            command["count"] += 1
+            command["failures"] += failed
+            command["seconds"] += seconds
+            if request is not None:
+                request.calls += 1
+                request.seconds += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(command) for name, command in self.commands.items()}
+
+
+command_metrics = CommandMetrics()
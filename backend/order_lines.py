@@ -0,0 +1,33 @@
+from typing import List
+
+from catalog_cache import get_products
+from models import OrderLine
+
+
+def compact_line(item: dict) -> OrderLine:
+    """Order line from an enriched cart item or a legacy order item with an embedded product"""
+    product = item["product"]
+    return OrderLine(
+        product_id=item["product_id"],
+        name=product["name"],
+        price_at_time=item.get("price_at_time", product["price"]),
+        selected_size=item["selected_size"],
+        selected_color=item["selected_color"],
+        quantity=item["quantity"]
+    )
+
+
+async def rehydrate_orders(orders: List[dict]) -> List[dict]:
+    """
+    Attach product details to the lines of already loaded orders, with one
+    batched lookup for all of them.
+
+    The attached product is the current catalog version; the line keeps its own
+    name and price_at_time. Deleted products are attached as None, legacy lines
+    that still embed their product are left alone.
+    """
+    lines = [line for order in orders for line in order["items"] if "product" not in line]
+    products = await get_products(line["product_id"] for line in lines)
+    for line in lines:
+        line["product"] = products.get(line["product_id"])
+    return orders
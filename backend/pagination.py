@@ -0,0 +1,107 @@
+import base64
+from typing import List, Optional, Tuple
+
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING
+
+SORTABLE_FIELDS = ("price", "name", "created_at")
+SORT_PATTERN = r"^-?(price|name|created_at)$"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[str, int]:
+    """Turn "price" / "-price" into (field, direction); default is id order"""
+    if not sort:
+        return "id", ASCENDING
+    if sort.startswith("-"):
+        return sort[1:], DESCENDING
+    return sort, ASCENDING
+
+
+def encode_cursor(sort_field: str, direction: int, last_document: dict) -> str:
+    """Opaque token that points just behind last_document"""
+    payload = [sort_field, direction, last_document.get(sort_field), last_document["id"]]
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode()).decode()
+
+
+def decode_cursor(token: str, sort_field: str, direction: int) -> Tuple[object, str]:
+    """Return (sort_value, last_id) for a token created with the same sort"""
+    try:
+        field, token_direction, value, last_id = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if field != sort_field or token_direction != direction:
+        raise InvalidCursor("Cursor was created with a different sort order")
+    return value, last_id
+
+
+def seek_filter(sort_field: str, direction: int, value, last_id: str) -> dict:
+    """Filter matching documents strictly after (value, last_id) in (sort_field, id) order"""
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if sort_field == "id":
+        return {"id": {op: last_id}}
+    return {
+        "$or": [
+            {sort_field: {op: value}},
+            {sort_field: value, "id": {op: last_id}},
+        ]
+    }
+
+
+def page_plan(
+    query: dict,
+    limit: int,
+    offset: int = 0,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[dict, List[Tuple[str, int]], int, int]:
+    """(filter, sort order, skip, limit) that fetch one page; keyset pages fetch one extra document"""
+    sort_field, direction = parse_sort(sort)
+
+    if cursor is None:
+        order = [(sort_field, direction), ("id", direction)] if sort else []
+        return query, order, offset, limit
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_field, direction)
+        seek = seek_filter(sort_field, direction, value, last_id)
+        query = {"$and": [query, seek]} if query else seek
+
+    order = [("id", direction)] if sort_field == "id" else [(sort_field, direction), ("id", direction)]
+    return query, order, 0, limit + 1
+
+
+def page_result(documents: List[dict], limit: int, sort: Optional[str] = None, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """Trim a page fetched with page_plan and build the token for the next one"""
+    if cursor is None or len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    sort_field, direction = parse_sort(sort)
+    return documents, encode_cursor(sort_field, direction, documents[-1])
+
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: int,
+    offset: int = 0,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page of documents.
+
+    Without a cursor this pages with skip/limit. With a cursor (an empty string
+    starts at the first page) it seeks on (sort key, id) and returns the token
+    for the next page, or None on the last page.
+    """
+    query, order, skip, fetch_limit = page_plan(query, limit, offset, sort, cursor)
+    find = collection.find(query, projection)
+    if order:
+        find = find.sort(order)
+    documents = await find.skip(skip).limit(fetch_limit).to_list(length=fetch_limit)
+    return page_result(documents, limit, sort, cursor)
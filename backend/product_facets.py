@@ -0,0 +1,116 @@
+"""
+Faceted product listing: the page, the total and the filter facets
+(categories, on-sale count, sizes, colors, price histogram) from one $facet
+aggregation. Facets are cached per filter until the next product write, so
+paging through a filtered listing only fetches the page.
+"""
+import os
+from typing import List, Optional, Tuple
+
+from bson import json_util
+
+from cache_backend import hashed_key
+from catalog_cache import facet_cache
+from database import products_collection
+from pagination import fetch_page, page_plan, page_result
+
+# Lower bounds of the price histogram buckets (at least two); the last bucket is open ended
+PRICE_FACET_BOUNDARIES = [float(bound) for bound in os.environ.get('PRICE_FACET_BOUNDARIES', '0,25,50,100,150,200').split(',')]
+_ABOVE_LAST_BOUNDARY = "above"
+
+
+def _counts(field: str, unwind: bool = False) -> List[dict]:
+    stages = [{"$unwind": f"${field}"}] if unwind else []
+    return stages + [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+    ]
+
+
+FACET_STAGES = {
+    "total": [{"$count": "count"}],
+    "categories": _counts("category"),
+    "on_sale": [{"$match": {"is_on_sale": True}}, {"$count": "count"}],
+    "sizes": _counts("sizes", unwind=True),
+    "colors": _counts("colors", unwind=True),
+    "price": [{"$bucket": {
+        "groupBy": "$price",
+        "boundaries": PRICE_FACET_BOUNDARIES,
+        "default": _ABOVE_LAST_BOUNDARY,
+        "output": {"count": {"$sum": 1}},
+    }}],
+}
+
+
+def _single_count(rows: List[dict]) -> int:
+    return rows[0]["count"] if rows else 0
+
+
+def _price_histogram(rows: List[dict]) -> List[dict]:
+    # $bucket leaves out empty buckets and puts prices from the last boundary up into the default one
+    counts = {row["_id"]: row["count"] for row in rows}
+    histogram = [
+        {"min": low, "max": high, "count": counts.get(low, 0)}
+        for low, high in zip(PRICE_FACET_BOUNDARIES, PRICE_FACET_BOUNDARIES[1:])
+    ]
+    histogram.append({"min": PRICE_FACET_BOUNDARIES[-1], "max": None, "count": counts.get(_ABOVE_LAST_BOUNDARY, 0)})
+    return histogram
+
+
+def _facets(result: dict) -> Tuple[int, dict]:
+    """(total, facets) from the facet branches of an aggregation result"""
+    return _single_count(result["total"]), {
+        "categories": [{"value": row["_id"], "count": row["count"]} for row in result["categories"]],
+        "on_sale": _single_count(result["on_sale"]),
+        "sizes": [{"value": row["_id"], "count": row["count"]} for row in result["sizes"]],
+        "colors": [{"value": row["_id"], "count": row["count"]} for row in result["colors"]],
+        "price": _price_histogram(result["price"]),
+    }
+
+
+def _pipeline(
+    query: dict,
+    limit: int,
+    offset: int,
+    sort: Optional[str],
+    cursor: Optional[str],
+    projection: Optional[dict],
+) -> List[dict]:
+    page_query, order, skip, fetch_limit = page_plan(query, limit, offset, sort, cursor)
+    pipeline = [{"$match": query}]
+    if order:
+        # Ahead of $facet, where $match and $sort can run as one index scan; inside it the
+        # page branch would sort every match in memory. The count branches ignore the order.
+        pipeline.append({"$sort": dict(order)})
+
+    page = [{"$match": page_query}] if page_query is not query else []
+    if skip:
+        page.append({"$skip": skip})
+    page += [{"$limit": fetch_limit}, {"$project": projection or {"_id": 0}}]
+    pipeline.append({"$facet": {"products": page, **FACET_STAGES}})
+    return pipeline
+
+
+async def faceted_page(
+    query: dict,
+    limit: int,
+    offset: int = 0,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> Tuple[List[dict], Optional[str], int, dict]:
+    """(products, next_cursor, total, facets) for one page of a filtered listing"""
+    key = hashed_key(json_util.dumps(query, sort_keys=True))
+    cached = await facet_cache.get(key)
+    if cached is not None:
+        products, next_cursor = await fetch_page(products_collection, query, limit, offset, sort, cursor, projection)
+        total, facets = cached
+        return products, next_cursor, total, facets
+
+    pipeline = _pipeline(query, limit, offset, sort, cursor, projection)
+    result = (await products_collection.aggregate(pipeline).to_list(length=1))[0]
+
+    total, facets = _facets(result)
+    await facet_cache.set(key, (total, facets))
+    products, next_cursor = page_result(result["products"], limit, sort, cursor)
+    return products, next_cursor, total, facets
@@ -0,0 +1,180 @@
+import csv
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from pydantic import BaseModel, ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import products_collection
+from models import ProductCreate
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+MAX_REPORTED_ERRORS = 1000
+
+# CSV cells for list fields are "|" separated, the same as the export writes them
+LIST_FIELDS = ("sizes", "colors")
+
+# (row number, parsed row or None, parse error or None)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+
+class ImportReport(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    duplicates: int = 0  # Rows superseded by a later row with the same key in the same chunk
+    failed: int = 0
+    errors: List[dict] = []
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+    @property
+    def written(self) -> bool:
+        """Whether any product was inserted or updated"""
+        return bool(self.inserted or self.updated)
+
+    def add_error(self, row: int, error: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": error})
+
+
+async def read_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines without buffering the whole body"""
+    pending = b""
+    first = True
+    async for chunk in chunks:
+        pending += chunk
+        if first and len(pending) >= 3:
+            pending, first = pending.removeprefix(b"\xef\xbb\xbf"), False  # UTF-8 BOM from spreadsheet exports
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+
+def _csv_row(header: List[str], values: List[str]) -> dict:
+    if len(values) != len(header):
+        raise ValueError(f"expected {len(header)} columns, got {len(values)}")
+    row = {}
+    for column, value in zip(header, values):
+        if value == "":
+            continue  # Empty cells fall back to the model defaults
+        row[column] = value.split("|") if column in LIST_FIELDS else value
+    return row
+
+
+async def parse_rows(lines: AsyncIterable[str], import_format: str) -> AsyncIterator[ParsedRow]:
+    """
+    Parse NDJSON objects or CSV records (one per line, header first) into dicts.
+    Rows are numbered from 1, not counting blank lines or the CSV header.
+    """
+    header = None
+    number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        if import_format == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+
+        number += 1
+        try:
+            if import_format == "csv":
+                row = _csv_row(header, next(csv.reader([line])))
+            else:
+                row = orjson.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+        except (ValueError, csv.Error) as e:
+            yield number, None, str(e)
+            continue
+        yield number, row, None
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors())
+
+
+async def _write_chunk(chunk: Dict[str, Tuple[int, dict]], key: str, report: ImportReport) -> None:
+    now = datetime.utcnow()
+    numbers = []
+    operations = []
+    for key_value, (number, product) in chunk.items():
+        on_insert = {"created_at": now}
+        if key == "name":
+            on_insert["id"] = str(uuid.uuid4())
+        operations.append(UpdateOne(
+            {key: key_value},
+            {"$set": {**product, "updated_at": now}, "$setOnInsert": on_insert},
+            upsert=True
+        ))
+        numbers.append(number)
+
+    try:
+        result = (await products_collection.bulk_write(operations, ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        for write_error in result["writeErrors"]:
+            report.add_error(numbers[write_error["index"]], write_error["errmsg"])
+
+    report.inserted += result["nUpserted"]
+    report.updated += result["nMatched"]  # updated_at is always set, so every match is a modification
+
+
+async def import_products(
+    rows: AsyncIterable[ParsedRow],
+    key: str = "id",
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    report: Optional[ImportReport] = None,
+) -> ImportReport:
+    """
+    Validate rows against ProductCreate and upsert them keyed on id or name,
+    one unordered bulk_write per chunk_size rows.
+
+    Importing by id requires an id column; importing by name gives new products
+    a fresh id. Invalid rows are reported and skipped. Counts go to report, so
+    a caller that passes one still sees what was written when reading the
+    input or a write fails part way. Callers invalidate the catalog caches once
+    afterwards whenever report.written is set, failed or not.
+    """
+    started = time.perf_counter()
+    report = report if report is not None else ImportReport()
+    chunk: Dict[str, Tuple[int, dict]] = {}
+
+    try:
+        async for number, row, error in rows:
+            report.received += 1
+            if error:
+                report.add_error(number, error)
+                continue
+            try:
+                product = ProductCreate.model_validate(row).dict()
+            except ValidationError as e:
+                report.add_error(number, _describe(e))
+                continue
+            if key == "id":
+                if not isinstance(row.get("id"), str) or not row["id"]:
+                    report.add_error(number, "id: required when importing by id")
+                    continue
+                product["id"] = row["id"]
+
+            if product[key] in chunk:
+                report.duplicates += 1
+            chunk[product[key]] = (number, product)
+            if len(chunk) >= chunk_size:
+                await _write_chunk(chunk, key, report)
+                chunk = {}
+
+        if chunk:
+            await _write_chunk(chunk, key, report)
+    finally:
+        report.elapsed_seconds = round(time.perf_counter() - started, 3)
+        report.rows_per_second = round(report.received / report.elapsed_seconds, 1) if report.elapsed_seconds else 0.0
+    return report
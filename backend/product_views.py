@@ -0,0 +1,50 @@
+from typing import Iterable, Optional, Tuple
+
+from models import Product
+
+PRODUCT_FIELDS = tuple(Product.model_fields)
+
+# Named field sets; "full" returns the whole document
+VIEWS = {
+    "card": ("id", "name", "price", "original_price", "image", "is_on_sale"),
+    "full": PRODUCT_FIELDS,
+}
+VIEW_PATTERN = r"^(card|full)$"
+
+
+class InvalidFields(ValueError):
+    pass
+
+
+def view_fields(view: str = "full", fields: Optional[str] = None, required: Iterable[str] = ()) -> Optional[Tuple[str, ...]]:
+    """
+    Resolve a view name or a comma separated field list to the fields to return.
+
+    An explicit field list wins over the view. "id" and the required fields
+    (e.g. the sort key a cursor is built from) are always included. Returns
+    None for the full document.
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in PRODUCT_FIELDS]
+        if unknown:
+            raise InvalidFields(f"Unknown product fields: {', '.join(unknown)}")
+    elif view == "full":
+        return None
+    else:
+        requested = VIEWS[view]
+    return tuple(dict.fromkeys(("id", *requested, *required)))
+
+
+def projection(fields: Optional[Tuple[str, ...]]) -> dict:
+    """Mongo projection for the fields, never including _id"""
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, **{field: 1 for field in fields}}
+
+
+def project(product: dict, fields: Optional[Tuple[str, ...]]) -> dict:
+    """Apply the same field selection to an already loaded document"""
+    if fields is None:
+        return product
+    return {field: product[field] for field in fields if field in product}
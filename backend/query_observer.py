@@ -0,0 +1,237 @@
+"""
+Slow-query detection with sampled explain plans.
+
+Every Mongo command slower than SLOW_QUERY_MS is counted per route,
+collection, command and query shape (the filter with its values blanked
+out). A sample of them, at most one per shape every EXPLAIN_MIN_INTERVAL
+seconds, is explained with executionStats on the event loop. The plan
+summary records COLLSCAN vs IXSCAN, the index used and the documents
+examined per document returned.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bson import json_util
+from pymongo import monitoring
+
+from cache import TTLCache
+from monitoring import current_request_mongo
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+EXPLAIN_SAMPLE_RATE = float(os.environ.get('EXPLAIN_SAMPLE_RATE', '0.1'))
+EXPLAIN_MIN_INTERVAL = float(os.environ.get('EXPLAIN_MIN_INTERVAL', '60'))
+SLOW_QUERY_SHAPES = 500
+
+# Commands whose filter can be explained, and the field that holds it
+EXPLAINABLE = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Session, transaction and routing fields that explain does not accept
+_UNEXPLAINABLE_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+
+def query_shape(value):
+    """The query with every value replaced by a placeholder, operators and field names kept"""
+    if isinstance(value, dict):
+        return {key: query_shape(entry) for key, entry in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(entry) for entry in value[:1]]
+    return "?"
+
+
+def _shape_key(command_name: str, command: dict) -> str:
+    field = EXPLAINABLE[command_name]
+    target = command.get(field)
+    if command_name in ("update", "delete") and target:
+        # Write commands carry a batch of statements; the first one stands for the shape
+        target = target[0].get("q")
+    return json_util.dumps(query_shape(target or {}), sort_keys=True)
+
+
+def _stages(plan: dict) -> List[dict]:
+    stages = [plan]
+    for child in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(child), dict):
+            stages += _stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += _stages(child)
+    return stages
+
+
+def _find(document, key: str):
+    """First value stored under key anywhere in a nested explain document"""
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(explain: dict) -> dict:
+    """COLLSCAN/IXSCAN, indexes and examined vs returned counts from an explain result"""
+    winning = _find(_find(explain, "queryPlanner") or {}, "winningPlan") or {}
+    stages = _stages(winning)
+    execution = _find(explain, "executionStats") or {}
+    returned = execution.get("nReturned", 0)
+    examined = execution.get("totalDocsExamined", 0)
+    return {
+        "stages": [stage.get("stage") for stage in stages if stage.get("stage")],
+        "collscan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+        "indexes": sorted({stage["indexName"] for stage in stages if stage.get("indexName")}),
+        "docs_examined": examined,
+        "keys_examined": execution.get("totalKeysExamined", 0),
+        "returned": returned,
+        "examined_per_returned": round(examined / returned, 1) if returned else float(examined),
+        "execution_ms": execution.get("executionTimeMillis"),
+    }
+
+
+class SlowQueryObserver(monitoring.CommandListener):
+    """Command listener flagging slow commands; explains run on the event loop given to start()"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, sample_rate: float = EXPLAIN_SAMPLE_RATE):
+        self.threshold = threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple, tuple] = {}
+        self._explained_at: Dict[Tuple, float] = {}
+        self._explains = set()
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.slow_queries = TTLCache(maxsize=SLOW_QUERY_SHAPES, ttl=24 * 3600)
+
+    def start(self, client, loop: asyncio.AbstractEventLoop) -> None:
+        """Enable explains through client; without it slow queries are only counted"""
+        self._client = client
+        self._loop = loop
+
+    def started(self, event):
+        if event.command_name in EXPLAINABLE:
+            request = current_request_mongo.get()
+            with self._lock:
+                self._pending[(event.connection_id, event.request_id)] = (
+                    event.database_name, event.command, request.route if request else "background"
+                )
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold * 1_000_000:
+            return
+
+        database, command, route = pending
+        collection = command.get(event.command_name)
+        shape = _shape_key(event.command_name, command)
+        key = (route, collection, event.command_name, shape)
+        duration_ms = event.duration_micros / 1000
+
+        with self._lock:
+            record = self.slow_queries.get(key)
+            if record is None:
+                record = {
+                    "route": route, "collection": collection, "command": event.command_name, "shape": shape,
+                    "count": 0, "total_ms": 0.0, "max_ms": 0.0, "plan": None,
+                }
+            record["count"] += 1
+            record["total_ms"] += duration_ms
+            record["max_ms"] = max(record["max_ms"], duration_ms)
+            record["last_seen"] = time.time()
+            self.slow_queries.set(key, record)
+
+            now = time.monotonic()
+            explain = (
+                self._loop is not None
+                and random.random() < self.sample_rate
+                and now - self._explained_at.get(key[1:], float("-inf")) >= EXPLAIN_MIN_INTERVAL
+            )
+            if explain:
+                self._explained_at[key[1:]] = now
+
+        logger.warning(f"Slow {event.command_name} on {collection} ({duration_ms:.1f}ms) for {route}: {shape}")
+        if explain:
+            self._loop.call_soon_threadsafe(self._schedule_explain, key, database, command)
+
+    def _schedule_explain(self, key: Tuple, database: str, command: dict) -> None:
+        task = self._loop.create_task(self._explain(key, database, command))
+        self._explains.add(task)
+        task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, key: Tuple, database: str, command: dict) -> None:
+        explainable = {name: value for name, value in command.items()
+                       if not name.startswith("$") and name not in _UNEXPLAINABLE_FIELDS}
+        try:
+            result = await self._client[database].command({"explain": explainable, "verbosity": "executionStats"})
+        except Exception as e:
+            logger.error(f"Explain failed for {key[2]} on {key[1]}: {e}")
+            return
+
+        plan = summarize_plan(result)
+        with self._lock:
+            record = self.slow_queries.get(key)
+            if record is not None:
+                record["plan"] = plan
+        if plan["collscan"] or plan["examined_per_returned"] > 100:
+            logger.warning(
+                f"Inefficient plan for {key[2]} on {key[1]} ({key[0]}): {' <- '.join(plan['stages'])}, "
+                f"{plan['docs_examined']} docs examined for {plan['returned']} returned, shape {key[3]}"
+            )
+
+    def snapshot(self) -> List[dict]:
+        with self._lock:
+            records = [dict(record) for _, record in self.slow_queries.items()]
+        return sorted(records, key=lambda record: record["total_ms"], reverse=True)
+
+
+slow_query_observer = SlowQueryObserver()
+
+
+# The request paths' hottest queries, explained on demand by `cli.py audit-queries`
+HOT_QUERIES = [
+    ("cart lines by session", {"find": "cart_items", "filter": {"session_id": "audit"}}),
+    ("orders by session", {"find": "orders", "filter": {"session_id": "audit"}, "sort": {"created_at": -1}}),
+    # /api/search matches names in search_index and loads only the hits from Mongo
+    ("search results by id", {"find": "products", "filter": {"id": {"$in": ["audit-1", "audit-2"]}}}),
+    ("category listing", {"find": "products", "filter": {"category": "audit"}, "sort": {"price": 1, "id": 1}, "limit": 50}),
+]
+
+
+async def audit_queries(db) -> List[dict]:
+    """Explain every HOT_QUERIES entry against db and summarize its plan"""
+    results = []
+    for name, command in HOT_QUERIES:
+        explain = await db.command({"explain": command, "verbosity": "executionStats"})
+        results.append({
+            "name": name,
+            "collection": command["find"],
+            "shape": _shape_key("find", command),
+            "plan": summarize_plan(explain),
+        })
+    return results
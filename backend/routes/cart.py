@@ -5,7 +5,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import CartItem, CartItemCreate, CartItemUpdate, APIResponse
-from database import cart_items_collection, products_collection
+from api_responses import api_response
+from cart_store import CartFull, cart_store
+from catalog_cache import get_product
+from cart_summary import (
+    cart_cleared, cart_lock, get_cart_summary, line_quantity_changed, line_removed, line_saved
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,48 +21,26 @@ async def add_to_cart(cart_item_data: CartItemCreate):
     """Add item to cart"""
     try:
         # Verify product exists
-        product = await products_collection.find_one({"id": cart_item_data.product_id})
+        product = await get_product(cart_item_data.product_id)
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        # Check if item already exists in cart
-        existing_item = await cart_items_collection.find_one({
-            "session_id": cart_item_data.session_id,
-            "product_id": cart_item_data.product_id,
-            "selected_size": cart_item_data.selected_size,
-            "selected_color": cart_item_data.selected_color
-        })
+        # Merge into the existing cart line or create it, atomically on the line key
+        cart_item = CartItem(**cart_item_data.dict())
+        async with cart_lock(cart_item.session_id):
+            updated_item = await cart_store.add(cart_item)
+            await line_saved(cart_item.session_id, updated_item, product)
         
-        if existing_item:
-            # Update quantity of existing item
-            new_quantity = existing_item["quantity"] + cart_item_data.quantity
-            await cart_items_collection.update_one(
-                {"id": existing_item["id"]},
-                {"$set": {"quantity": new_quantity}}
-            )
-            
-            updated_item = await cart_items_collection.find_one({"id": existing_item["id"]})
-            if "_id" in updated_item:
-                del updated_item["_id"]
-                
-            return APIResponse(
-                success=True,
-                data={"cart_item": updated_item},
-                message="Cart item quantity updated"
-            )
-        else:
-            # Create new cart item
-            cart_item = CartItem(**cart_item_data.dict())
-            result = await cart_items_collection.insert_one(cart_item.dict())
-            
-            return APIResponse(
-                success=True,
-                data={"cart_item": cart_item.dict()},
-                message="Item added to cart successfully"
-            )
+        return api_response(
+            success=True,
+            data={"cart_item": updated_item},
+            message="Item added to cart successfully" if updated_item["id"] == cart_item.id else "Cart item quantity updated"
+        )
             
     except HTTPException:
         raise
+    except CartFull as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error adding to cart: {e}")
         raise HTTPException(status_code=500, detail="Error adding item to cart")
@@ -66,38 +49,13 @@ async def add_to_cart(cart_item_data: CartItemCreate):
 async def get_cart(session_id: str):
     """Get cart items for a session"""
     try:
-        # Get cart items
-        cursor = cart_items_collection.find({"session_id": session_id})
-        cart_items = await cursor.to_list(length=100)
-        
-        # Enrich cart items with product details
-        enriched_items = []
-        for item in cart_items:
-            if "_id" in item:
-                del item["_id"]
-            
-            # Get product details
-            product = await products_collection.find_one({"id": item["product_id"]})
-            if product:
-                if "_id" in product:
-                    del product["_id"]
-                item["product"] = product
-                enriched_items.append(item)
-        
-        # Calculate totals
-        subtotal = sum(item["product"]["price"] * item["quantity"] for item in enriched_items)
-        shipping = 0 if subtotal > 50 else 4.99
-        total = subtotal + shipping
+        # Items with product details and totals, kept up to date by the cart mutations
+        summary = await get_cart_summary(session_id)
         
-        return APIResponse(
+        return api_response(
             success=True,
-            data={
-                "cart_items": enriched_items,
-                "subtotal": round(subtotal, 2),
-                "shipping": shipping,
-                "total": round(total, 2)
-            },
-            total=len(enriched_items)
+            data=summary,
+            total=len(summary["cart_items"])
         )
         
     except Exception as e:
@@ -108,38 +66,28 @@ async def get_cart(session_id: str):
 async def update_cart_item(session_id: str, item_id: str, update_data: CartItemUpdate):
     """Update cart item quantity"""
     try:
-        # Verify item belongs to session
-        item = await cart_items_collection.find_one({
-            "id": item_id,
-            "session_id": session_id
-        })
-        
-        if not item:
-            raise HTTPException(status_code=404, detail="Cart item not found")
-        
-        if update_data.quantity <= 0:
-            # Remove item if quantity is 0 or less
-            await cart_items_collection.delete_one({"id": item_id})
-            return APIResponse(
-                success=True,
-                message="Item removed from cart"
-            )
-        else:
-            # Update quantity
-            await cart_items_collection.update_one(
-                {"id": item_id},
-                {"$set": {"quantity": update_data.quantity}}
-            )
+        async with cart_lock(session_id):
+            if update_data.quantity <= 0:
+                # Remove item if quantity is 0 or less
+                if not await cart_store.remove(session_id, item_id):
+                    raise HTTPException(status_code=404, detail="Cart item not found")
+                await line_removed(session_id, item_id)
+                return api_response(
+                    success=True,
+                    message="Item removed from cart"
+                )
             
-            updated_item = await cart_items_collection.find_one({"id": item_id})
-            if "_id" in updated_item:
-                del updated_item["_id"]
-                
-            return APIResponse(
-                success=True,
-                data={"cart_item": updated_item},
-                message="Cart item updated successfully"
-            )
+            # Update quantity; only matches an item of this session
+            updated_item = await cart_store.set_quantity(session_id, item_id, update_data.quantity)
+            if not updated_item:
+                raise HTTPException(status_code=404, detail="Cart item not found")
+            await line_quantity_changed(session_id, item_id, update_data.quantity)
+        
+        return api_response(
+            success=True,
+            data={"cart_item": updated_item},
+            message="Cart item updated successfully"
+        )
             
     except HTTPException:
         raise
@@ -151,15 +99,14 @@ async def update_cart_item(session_id: str, item_id: str, update_data: CartItemU
 async def remove_cart_item(session_id: str, item_id: str):
     """Remove item from cart"""
     try:
-        result = await cart_items_collection.delete_one({
-            "id": item_id,
-            "session_id": session_id
-        })
+        async with cart_lock(session_id):
+            removed = await cart_store.remove(session_id, item_id)
+            await line_removed(session_id, item_id)
         
-        if result.deleted_count == 0:
+        if not removed:
             raise HTTPException(status_code=404, detail="Cart item not found")
         
-        return APIResponse(
+        return api_response(
             success=True,
             message="Item removed from cart successfully"
         )
@@ -174,11 +121,13 @@ async def remove_cart_item(session_id: str, item_id: str):
 async def clear_cart(session_id: str):
     """Clear all items from cart"""
     try:
-        result = await cart_items_collection.delete_many({"session_id": session_id})
+        async with cart_lock(session_id):
+            deleted_count = await cart_store.clear(session_id)
+            await cart_cleared(session_id)
         
-        return APIResponse(
+        return api_response(
             success=True,
-            message=f"Removed {result.deleted_count} items from cart"
+            message=f"Removed {deleted_count} items from cart"
         )
         
     except Exception as e:
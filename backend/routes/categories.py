@@ -4,7 +4,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import APIResponse
-from database import categories_collection
+from api_responses import api_response
+from catalog_cache import get_categories as get_cached_categories
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,15 +15,9 @@ router = APIRouter(prefix="/categories", tags=["categories"])
 async def get_categories():
     """Get all categories"""
     try:
-        cursor = categories_collection.find({})
-        categories = await cursor.to_list(length=100)
+        categories = await get_cached_categories()
         
-        # Remove MongoDB ObjectId from each category
-        for category in categories:
-            if "_id" in category:
-                del category["_id"]
-        
-        return APIResponse(
+        return api_response(
             success=True,
             data={"categories": categories},
             total=len(categories)
@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+from datetime import datetime
+import csv
+import io
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from admin_auth import require_admin
+from models import OrderLine, Product
+from database import orders_collection, products_collection
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/export", tags=["export"])
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '500'))
+FORMAT_PATTERN = "^(ndjson|csv)$"
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+PRODUCT_COLUMNS = list(Product.model_fields)
+ORDER_COLUMNS = [
+    "order_id", "created_at", "status", "session_id", "customer_name", "customer_email",
+    "total_amount", "shipping_cost", *OrderLine.model_fields
+]
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return "|".join(str(entry) for entry in value)
+    return value
+
+
+def _product_rows(product: dict) -> Iterable[list]:
+    yield [_cell(product.get(column)) for column in PRODUCT_COLUMNS]
+
+
+def _order_rows(order: dict) -> Iterable[list]:
+    """One row per order line, the order columns repeated on each"""
+    customer = order.get("customer_info") or {}
+    head = [
+        order.get("id"), _cell(order.get("created_at")), order.get("status"), order.get("session_id"),
+        customer.get("name", ""), customer.get("email", ""), order.get("total_amount"), order.get("shipping_cost")
+    ]
+    for line in order.get("items", []):
+        # Orders not yet compacted keep the name on the embedded product
+        line = {"name": (line.get("product") or {}).get("name"), **line}
+        yield head + [_cell(line.get(column)) for column in OrderLine.model_fields]
+
+
+def _date_range(field: str, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        bounds["$lt"] = end
+    return {field: bounds} if bounds else {}
+
+
+async def _stream(
+    cursor, export_format: str, columns: List[str], rows: Callable[[dict], Iterable[list]], batch_size: int
+) -> AsyncIterator[bytes]:
+    """Encode documents as they arrive from the cursor, yielding one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    chunks: List[bytes] = []
+    if export_format == "csv":
+        writer.writerow(columns)
+
+    def take() -> bytes:
+        if export_format == "csv":
+            data = buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            return data
+        data = b"".join(chunks)
+        chunks.clear()
+        return data
+
+    pending = 0
+    try:
+        async for document in cursor:
+            if export_format == "csv":
+                writer.writerows(rows(document))
+            else:
+                chunks.append(orjson.dumps(document, option=orjson.OPT_NON_STR_KEYS) + b"\n")
+            pending += 1
+            if pending >= batch_size:
+                pending = 0
+                yield take()
+        yield take()
+    except Exception as e:
+        # Headers are already sent, so the client sees a truncated body instead of a 500
+        logger.error(f"Export aborted: {e}")
+        raise
+
+
+def _export_response(stream: AsyncIterator[bytes], name: str, export_format: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get("/products")
+async def export_products(
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN, description="ndjson or csv"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after"),
+    created_to: Optional[datetime] = Query(None, description="Created before"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000, description="Documents per cursor batch and response chunk")
+):
+    """Stream all matching products (Admin function)"""
+    try:
+        query = _date_range("created_at", created_from, created_to)
+        if category:
+            query["category"] = category
+
+        cursor = products_collection.find(query, {"_id": 0}, batch_size=batch_size).sort("id", 1)
+        return _export_response(_stream(cursor, format, PRODUCT_COLUMNS, _product_rows, batch_size), "products", format)
+
+    except Exception as e:
+        logger.error(f"Error exporting products: {e}")
+        raise HTTPException(status_code=500, detail="Error exporting products")
+
+
+# Orders carry customer names, emails and addresses
+@router.get("/orders", dependencies=[Depends(require_admin)])
+async def export_orders(
+    format: str = Query("ndjson", pattern=FORMAT_PATTERN, description="ndjson, or csv with one row per order line"),
+    created_from: Optional[datetime] = Query(None, description="Created at or after"),
+    created_to: Optional[datetime] = Query(None, description="Created before"),
+    status: Optional[str] = Query(None, description="Filter by order status"),
+    session_id: Optional[str] = Query(None, description="Filter by session"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000, description="Documents per cursor batch and response chunk")
+):
+    """Stream all matching orders (Admin function, needs X-Admin-Token)"""
+    try:
+        query = _date_range("created_at", created_from, created_to)
+        if status:
+            query["status"] = status
+        if session_id:
+            query["session_id"] = session_id
+
+        cursor = orders_collection.find(query, {"_id": 0}, batch_size=batch_size).sort("created_at", 1)
+        return _export_response(_stream(cursor, format, ORDER_COLUMNS, _order_rows, batch_size), "orders", format)
+
+    except Exception as e:
+        logger.error(f"Error exporting orders: {e}")
+        raise HTTPException(status_code=500, detail="Error exporting orders")
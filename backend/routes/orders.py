@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models import Order, OrderCreate, APIResponse
-from database import orders_collection, cart_items_collection, products_collection
+from models import OrderCreate, APIResponse
+from api_responses import api_response
+from database import orders_collection
+from checkout import EmptyCart, OutOfStock, place_order
+from order_lines import rehydrate_orders
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,76 +18,39 @@ router = APIRouter(prefix="/orders", tags=["orders"])
 async def create_order(order_data: OrderCreate):
     """Create a new order from cart items"""
     try:
-        # Get cart items for the session
-        cursor = cart_items_collection.find({"session_id": order_data.session_id})
-        cart_items = await cursor.to_list(length=100)
+        # Reserve stock, save the order and clear the cart in one transaction
+        order = await place_order(order_data)
         
-        if not cart_items:
-            raise HTTPException(status_code=400, detail="No items in cart")
-        
-        # Enrich cart items with product details and calculate total
-        enriched_items = []
-        subtotal = 0
-        
-        for item in cart_items:
-            if "_id" in item:
-                del item["_id"]
-            
-            # Get product details
-            product = await products_collection.find_one({"id": item["product_id"]})
-            if product:
-                if "_id" in product:
-                    del product["_id"]
-                
-                item["product"] = product
-                item["price_at_time"] = product["price"]  # Store price at time of order
-                enriched_items.append(item)
-                subtotal += product["price"] * item["quantity"]
-        
-        # Calculate shipping
-        shipping_cost = 0 if subtotal > 50 else 4.99
-        total_amount = subtotal + shipping_cost
-        
-        # Create order
-        order = Order(
-            session_id=order_data.session_id,
-            items=enriched_items,
-            total_amount=round(total_amount, 2),
-            shipping_cost=shipping_cost,
-            customer_info=order_data.customer_info
-        )
-        
-        # Save order
-        result = await orders_collection.insert_one(order.dict())
-        
-        # Clear cart after successful order
-        await cart_items_collection.delete_many({"session_id": order_data.session_id})
-        
-        return APIResponse(
+        return api_response(
             success=True,
             data={"order": order.dict()},
             message="Order created successfully"
         )
         
-    except HTTPException:
-        raise
+    except EmptyCart:
+        raise HTTPException(status_code=400, detail="No items in cart")
+    except OutOfStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error creating order: {e}")
         raise HTTPException(status_code=500, detail="Error creating order")
 
 @router.get("/{order_id}", response_model=APIResponse)
-async def get_order(order_id: str):
+async def get_order(
+    order_id: str,
+    expand: Optional[str] = Query(None, pattern="^product$", description="product attaches current product details to each line")
+):
     """Get order by ID"""
     try:
-        order = await orders_collection.find_one({"id": order_id})
+        order = await orders_collection.find_one({"id": order_id}, {"_id": 0})
         
         if not order:
             raise HTTPException(status_code=404, detail="Order not found")
         
-        if "_id" in order:
-            del order["_id"]
+        if expand:
+            await rehydrate_orders([order])
             
-        return APIResponse(
+        return api_response(
             success=True,
             data={"order": order}
         )
@@ -95,18 +62,19 @@ async def get_order(order_id: str):
         raise HTTPException(status_code=500, detail="Error retrieving order")
 
 @router.get("/session/{session_id}", response_model=APIResponse)
-async def get_orders_by_session(session_id: str):
+async def get_orders_by_session(
+    session_id: str,
+    expand: Optional[str] = Query(None, pattern="^product$", description="product attaches current product details to each line")
+):
     """Get all orders for a session"""
     try:
-        cursor = orders_collection.find({"session_id": session_id}).sort("created_at", -1)
+        cursor = orders_collection.find({"session_id": session_id}, {"_id": 0}).sort("created_at", -1)
         orders = await cursor.to_list(length=100)
         
-        # Remove MongoDB ObjectId
-        for order in orders:
-            if "_id" in order:
-                del order["_id"]
+        if expand:
+            await rehydrate_orders(orders)
         
-        return APIResponse(
+        return api_response(
             success=True,
             data={"orders": orders},
             total=len(orders)
@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import List, Optional
 from datetime import datetime
+import asyncio
+import re
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import Product, ProductCreate, APIResponse
+from admin_auth import require_admin
+from api_responses import api_response
 from database import products_collection
+from catalog_cache import get_product as get_cached_product, product_changed, count_products
+from pagination import SORT_PATTERN, InvalidCursor, fetch_page, parse_sort
+from product_facets import faceted_page
+from product_views import VIEW_PATTERN, InvalidFields, projection, view_fields
+from product_import import IMPORT_CHUNK_SIZE, ImportReport, import_products as bulk_import_products, parse_rows, read_lines
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,10 +27,20 @@ async def get_products(
     sale: Optional[bool] = Query(None, description="Filter sale items only"),
     limit: int = Query(50, ge=1, le=100, description="Number of products to return"),
     offset: int = Query(0, ge=0, description="Number of products to skip"),
-    search: Optional[str] = Query(None, description="Search products by name")
+    search: Optional[str] = Query(None, description="Search products by name"),
+    sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="Sort by price, name or created_at; prefix with - for descending"),
+    cursor: Optional[str] = Query(None, description="Keyset pagination token; pass an empty value for the first page"),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$", description="How to compute total"),
+    view: str = Query("full", pattern=VIEW_PATTERN, description="card for grid fields only, full for the whole product"),
+    fields: Optional[str] = Query(None, description="Comma separated product fields to return, overrides view"),
+    facets: bool = Query(False, description="Also return category, sale, size, color and price counts; total is always exact")
 ):
     """Get all products with optional filtering"""
     try:
+        # Cursors are built from the sort key, so it has to be part of the projection
+        required = (parse_sort(sort)[0],) if cursor is not None else ()
+        selected = view_fields(view, fields, required)
+        
         # Build query
         query = {}
         
@@ -32,26 +51,36 @@ async def get_products(
             query["is_on_sale"] = True
             
         if search:
-            query["name"] = {"$regex": search, "$options": "i"}
+            query["name"] = {"$regex": re.escape(search), "$options": "i"}
+        
+        if facets:
+            # Page, total and facets from a single aggregation
+            products, next_cursor, total, facet_counts = await faceted_page(
+                query, limit, offset=offset, sort=sort, cursor=cursor, projection=projection(selected)
+            )
+            return api_response(
+                success=True,
+                data={"products": products, "next_cursor": next_cursor, "facets": facet_counts},
+                total=total
+            )
         
         # Get total count for pagination
-        total = await products_collection.count_documents(query)
+        total = await count_products(query, count)
         
         # Get products with pagination
-        cursor = products_collection.find(query).skip(offset).limit(limit)
-        products = await cursor.to_list(length=limit)
-        
-        # Convert ObjectId to string for each product
-        for product in products:
-            if "_id" in product:
-                del product["_id"]
+        products, next_cursor = await fetch_page(
+            products_collection, query, limit, offset=offset, sort=sort, cursor=cursor,
+            projection=projection(selected)
+        )
         
-        return APIResponse(
+        return api_response(
             success=True,
-            data={"products": products},
+            data={"products": products, "next_cursor": next_cursor},
             total=total
         )
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting products: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving products")
@@ -60,16 +89,12 @@ async def get_products(
 async def get_product(product_id: str):
     """Get a single product by ID"""
     try:
-        product = await products_collection.find_one({"id": product_id})
+        product = await get_cached_product(product_id)
         
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        # Remove MongoDB ObjectId
-        if "_id" in product:
-            del product["_id"]
             
-        return APIResponse(
+        return api_response(
             success=True,
             data={"product": product}
         )
@@ -92,8 +117,9 @@ async def create_product(product_data: ProductCreate):
             raise HTTPException(status_code=400, detail="Product with this name already exists")
         
         result = await products_collection.insert_one(product.dict())
+        await product_changed(product.id, product.dict())
         
-        return APIResponse(
+        return api_response(
             success=True,
             data={"product": product.dict()},
             message="Product created successfully"
@@ -105,6 +131,36 @@ async def create_product(product_data: ProductCreate):
         logger.error(f"Error creating product: {e}")
         raise HTTPException(status_code=500, detail="Error creating product")
 
+@router.post("/import", response_model=APIResponse, dependencies=[Depends(require_admin)])
+async def import_products(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Body format: NDJSON objects or CSV with a header row"),
+    key: str = Query("id", pattern="^(id|name)$", description="Field that identifies existing products"),
+    chunk_size: int = Query(IMPORT_CHUNK_SIZE, ge=1, le=10000, description="Rows per bulk write")
+):
+    """Bulk upsert products from the request body (Admin function)"""
+    report = ImportReport()
+    try:
+        rows = parse_rows(read_lines(request.stream()), format)
+        await bulk_import_products(rows, key=key, chunk_size=chunk_size, report=report)
+        
+        return api_response(
+            success=True,
+            data={"report": report.dict()},
+            message=f"Imported {report.inserted + report.updated} products, {report.failed} rows failed"
+        )
+        
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail={"error": "Import body must be UTF-8", "report": report.dict()})
+    except Exception as e:
+        logger.error(f"Error importing products: {e}")
+        raise HTTPException(status_code=500, detail={"error": "Error importing products", "report": report.dict()})
+    finally:
+        # One invalidation for the whole import instead of one per product, also
+        # when it stopped part way; shielded so a client disconnect cannot skip it
+        if report.written:
+            await asyncio.shield(product_changed(None))
+
 @router.put("/{product_id}", response_model=APIResponse)
 async def update_product(product_id: str, product_data: ProductCreate):
     """Update an existing product (Admin function)"""
@@ -127,8 +183,9 @@ async def update_product(product_id: str, product_data: ProductCreate):
         updated_product = await products_collection.find_one({"id": product_id})
         if "_id" in updated_product:
             del updated_product["_id"]
+        await product_changed(product_id, updated_product)
         
-        return APIResponse(
+        return api_response(
             success=True,
             data={"product": updated_product},
             message="Product updated successfully"
@@ -149,7 +206,9 @@ async def delete_product(product_id: str):
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        return APIResponse(
+        await product_changed(product_id)
+        
+        return api_response(
             success=True,
             message="Product deleted successfully"
         )
@@ -5,7 +5,13 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import APIResponse
-from database import products_collection
+from api_responses import api_response
+from catalog_cache import get_products
+from pagination import SORT_PATTERN, InvalidCursor, decode_cursor, encode_cursor, parse_sort
+from product_views import VIEW_PATTERN, InvalidFields, project, view_fields
+from search_index import search_index
+from suggestion_index import suggestion_index
+from pymongo import DESCENDING
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,56 +24,44 @@ async def search_products(
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter"),
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter"),
     limit: int = Query(20, ge=1, le=100, description="Number of results to return"),
-    offset: int = Query(0, ge=0, description="Number of results to skip")
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+    sort: Optional[str] = Query(None, pattern=SORT_PATTERN, description="Sort by price, name or created_at; prefix with - for descending"),
+    cursor: Optional[str] = Query(None, description="Keyset pagination token; pass an empty value for the first page"),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$", description="How to compute total"),
+    view: str = Query("full", pattern=VIEW_PATTERN, description="card for grid fields only, full for the whole product"),
+    fields: Optional[str] = Query(None, description="Comma separated product fields to return, overrides view")
 ):
     """Search products by name, description, and other criteria"""
     try:
-        # Build search query
-        search_conditions = []
+        # Relevance order unless an explicit sort is requested
+        sort_field, direction = parse_sort(sort) if sort else ("score", DESCENDING)
+        selected = view_fields(view, fields)
         
-        # Text search in name and description
-        text_search = {
-            "$or": [
-                {"name": {"$regex": q, "$options": "i"}},
-                {"description": {"$regex": q, "$options": "i"}},
-                {"colors": {"$elemMatch": {"$regex": q, "$options": "i"}}},
-                {"category": {"$regex": q, "$options": "i"}}
-            ]
-        }
-        search_conditions.append(text_search)
-        
-        # Category filter
-        if category:
-            search_conditions.append({"category": category})
-        
-        # Price filters
-        if min_price is not None or max_price is not None:
-            price_filter = {}
-            if min_price is not None:
-                price_filter["$gte"] = min_price
-            if max_price is not None:
-                price_filter["$lte"] = max_price
-            search_conditions.append({"price": price_filter})
-        
-        # Combine all conditions
-        final_query = {"$and": search_conditions} if len(search_conditions) > 1 else search_conditions[0]
-        
-        # Get total count
-        total = await products_collection.count_documents(final_query)
+        # Match, filter and rank against the in-process index
+        after = decode_cursor(cursor, sort_field, direction) if cursor else None
+        await search_index.ensure_built()
+        page, total, has_more = search_index.search(
+            q, category, min_price, max_price, sort_field, direction,
+            limit=limit, offset=0 if cursor is not None else offset, after=after
+        )
+        if count == "none":
+            total = None
         
-        # Execute search with pagination
-        cursor = products_collection.find(final_query).skip(offset).limit(limit)
-        products = await cursor.to_list(length=limit)
+        next_cursor = None
+        if cursor is not None and has_more:
+            value, last_id = page[-1]
+            next_cursor = encode_cursor(sort_field, direction, {sort_field: value, "id": last_id})
         
-        # Remove MongoDB ObjectId
-        for product in products:
-            if "_id" in product:
-                del product["_id"]
+        # Load the matching products in ranked order; they come from the catalog
+        # cache as whole documents, so the field selection is applied here
+        products_by_id = await get_products(product_id for _, product_id in page)
+        products = [project(products_by_id[product_id], selected) for _, product_id in page if product_id in products_by_id]
         
-        return APIResponse(
+        return api_response(
             success=True,
             data={
                 "products": products,
+                "next_cursor": next_cursor,
                 "query": q,
                 "filters": {
                     "category": category,
@@ -78,6 +72,8 @@ async def search_products(
             total=total
         )
         
+    except (InvalidCursor, InvalidFields) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching products with query '{q}': {e}")
         raise HTTPException(status_code=500, detail="Error performing search")
@@ -89,35 +85,11 @@ async def get_search_suggestions(
 ):
     """Get search suggestions based on partial query"""
     try:
-        # Search for product names that start with or contain the query
-        query = {
-            "$or": [
-                {"name": {"$regex": f"^{q}", "$options": "i"}},
-                {"name": {"$regex": q, "$options": "i"}},
-                {"category": {"$regex": q, "$options": "i"}}
-            ]
-        }
-        
-        # Get unique product names and categories
-        cursor = products_collection.find(query, {"name": 1, "category": 1}).limit(limit * 2)
-        results = await cursor.to_list(length=limit * 2)
-        
-        suggestions = []
-        seen = set()
-        
-        for item in results:
-            if item["name"] not in seen:
-                suggestions.append({
-                    "text": item["name"],
-                    "type": "product",
-                    "category": item["category"]
-                })
-                seen.add(item["name"])
-                
-            if len(suggestions) >= limit:
-                break
+        # Served from the in-memory prefix index, no database round trip
+        await suggestion_index.ensure_built()
+        suggestions = suggestion_index.suggest(q, limit)
         
-        return APIResponse(
+        return api_response(
             success=True,
             data={"suggestions": suggestions},
             total=len(suggestions)
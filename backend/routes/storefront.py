@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import APIResponse
+from api_responses import api_response
+from storefront import storefront
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/storefront", tags=["storefront"])
+
+@router.get("/", response_model=APIResponse)
+async def get_storefront():
+    """Homepage lists and category counts, precomputed"""
+    try:
+        return api_response(
+            success=True,
+            data=await storefront.snapshot()
+        )
+        
+    except Exception as e:
+        logger.error(f"Error getting storefront: {e}")
+        raise HTTPException(status_code=500, detail="Error retrieving storefront")
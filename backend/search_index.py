@@ -0,0 +1,375 @@
+import bisect
+import logging
+import math
+import re
+import unicodedata
+from array import array
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ASCENDING
+
+from catalog_cache import add_product_listener
+from database import products_collection
+from derived_index import DerivedIndex
+
+logger = logging.getLogger(__name__)
+
+# Term weight per product field
+FIELD_WEIGHTS = {"name": 10.0, "category": 5.0, "colors": 4.0, "description": 1.0}
+# Weight multiplier for a match inside a compound word ("kleid" in "sommerkleid")
+COMPOUND_WEIGHT = 0.5
+MIN_COMPOUND_PART = 4
+# Upper bound on vocabulary terms a partial query token is expanded to
+MAX_PREFIX_EXPANSION = 50
+# Share of replaced or deleted entries after which the index is rebuilt from Mongo
+MAX_DEAD_RATIO = 0.25
+
+_INDEXED_FIELDS = {field: 1 for field in ("id", "name", "description", "colors", "category", "price", "created_at")}
+_INDEXED_FIELDS["_id"] = 0
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_UMLAUTS = str.maketrans({"ä": "a", "ö": "o", "ü": "u", "ß": "ss"})
+_EPOCH = datetime(1970, 1, 1)
+
+
+def fold(text: str) -> str:
+    """Lowercase and fold umlauts, ß and other diacritics to plain ASCII letters"""
+    text = text.lower().translate(_UMLAUTS)
+    if text.isascii():
+        return text
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=100000)
+def stem(token: str) -> str:
+    """Light German suffix stripper in the spirit of CISTEM"""
+    while len(token) > 3:
+        if len(token) > 5 and token[-2:] in ("em", "er", "nd"):
+            token = token[:-2]
+        elif token[-1] in "esn":
+            token = token[:-1]
+        else:
+            break
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(token) for token in _TOKEN_RE.findall(fold(text))]
+
+
+def _timestamp(value) -> float:
+    return (value - _EPOCH).total_seconds() if isinstance(value, datetime) else math.nan
+
+
+def _dense_key(sorted_values: list, value) -> float:
+    """Position of value among sorted_values; values that are not present fall between neighbours"""
+    position = bisect.bisect_left(sorted_values, value)
+    if position < len(sorted_values) and sorted_values[position] == value:
+        return float(position)
+    return position - 0.5
+
+
+def _intersect(docs: np.ndarray, term_docs: np.ndarray, term_weights: np.ndarray, doc_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Positions in docs that are also in term_docs (both sorted), with the term weights of those documents"""
+    if len(docs) * 16 < len(term_docs):
+        positions = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+        keep = np.flatnonzero(term_docs[positions] == docs)
+        return keep, term_weights[positions[keep]]
+    # Scattering the weights over all documents beats a binary search per candidate; weights are never 0
+    dense = np.zeros(doc_count)
+    dense[term_docs] = term_weights
+    weights = dense[docs]
+    keep = np.flatnonzero(weights)
+    return keep, weights[keep]
+
+
+def _smallest(primary: np.ndarray, secondary: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k smallest (primary, secondary) pairs in order, in linear time for small k"""
+    if len(primary) > k:
+        kth = np.partition(primary, k - 1)[k - 1]
+        better = np.flatnonzero(primary < kth)
+        ties = np.flatnonzero(primary == kth)
+        needed = k - len(better)
+        if len(ties) > needed:
+            ties = ties[np.argpartition(secondary[ties], needed - 1)[:needed]]
+        candidates = np.concatenate([better, ties])
+    else:
+        candidates = np.arange(len(primary))
+    return candidates[np.lexsort((secondary[candidates], primary[candidates]))]
+
+
+class SearchIndex(DerivedIndex):
+    """
+    In-process inverted index over the product catalog.
+
+    Every indexed product version gets an increasing document number, so posting
+    lists stay sorted and can be intersected and scored with numpy. Updates
+    append a new document and retire the old one; the index is rebuilt once too
+    many retired documents have accumulated.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_numbers: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._alive = bytearray()
+        self._categories: Dict[str, int] = {}
+        self._category_codes = array("i")
+        self._prices = array("d")
+        self._created = array("d")
+        self._names: List[str] = []
+        self._created_values: list = []
+        self._vocabulary: List[str] = []
+        self._arrays: Optional[dict] = None
+        self._vocabulary_dirty = False
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    async def _load(self) -> "SearchIndex":
+        fresh = SearchIndex()
+        async for product in products_collection.find({}, _INDEXED_FIELDS):
+            fresh.add(product)
+        return fresh
+
+    def _apply(self, product_id: str, product: Optional[dict]) -> None:
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.add(product)
+
+    def _swap(self, fresh: "SearchIndex") -> None:
+        for attribute in (
+            "_postings", "_compiled", "_doc_numbers", "_ids", "_alive", "_categories", "_category_codes",
+            "_prices", "_created", "_names", "_created_values",
+        ):
+            setattr(self, attribute, getattr(fresh, attribute))
+        self._arrays = None
+        self._vocabulary_dirty = True
+        self._doc_arrays()
+        logger.info(f"Search index built with {len(self)} products and {len(self._postings)} terms")
+
+    def add(self, product: dict) -> None:
+        """Index a product, replacing any previous version of it"""
+        product_id = product["id"]
+        self.remove(product_id)
+
+        doc = len(self._ids)
+        self._doc_numbers[product_id] = doc
+        self._ids.append(product_id)
+        self._alive.append(1)
+        category = product.get("category")
+        self._category_codes.append(self._categories.setdefault(category, len(self._categories)))
+        price = product.get("price")
+        self._prices.append(math.nan if price is None else float(price))
+        self._created.append(_timestamp(product.get("created_at")))
+        self._names.append(product.get("name") or "")
+        self._created_values.append(product.get("created_at"))
+
+        for term, weight in self._terms(product).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("i"), array("f"))
+                self._vocabulary_dirty = True
+            postings[0].append(doc)
+            postings[1].append(weight)
+            self._compiled.pop(term, None)
+
+        self._arrays = None
+
+    def remove(self, product_id: str) -> None:
+        doc = self._doc_numbers.pop(product_id, None)
+        if doc is None:
+            return
+        self._alive[doc] = 0
+        self._arrays = None
+        if self.ready and len(self._ids) - len(self) > MAX_DEAD_RATIO * max(len(self._ids), 1000):
+            self._schedule_rebuild()
+
+    def _terms(self, product: dict) -> Dict[str, float]:
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field) or ""
+            for text in value if isinstance(value, list) else [value]:
+                for token in tokenize(text):
+                    if terms.get(token, 0) < weight:
+                        terms[token] = weight
+                    if field != "name":
+                        continue
+                    compound_weight = weight * COMPOUND_WEIGHT
+                    for start in range(1, len(token) - MIN_COMPOUND_PART + 1):
+                        part = token[start:]
+                        if terms.get(part, 0) < compound_weight:
+                            terms[part] = compound_weight
+        return terms
+
+    def _compile(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            docs, weights = self._postings[term]
+            compiled = self._compiled[term] = (np.array(docs, dtype=np.int64), np.array(weights, dtype=np.float64))
+        return compiled
+
+    def _postings_for(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Postings for a term, or the merged postings of the terms it is a prefix of"""
+        if token in self._postings:
+            return self._compile(token)
+
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+
+        start = bisect.bisect_left(self._vocabulary, token)
+        expansions = []
+        for term in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(token):
+                break
+            expansions.append(self._compile(term))
+        if not expansions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if len(expansions) == 1:
+            return expansions[0]
+
+        # Keep the best weight per document
+        docs = np.concatenate([docs for docs, _ in expansions])
+        weights = np.concatenate([weights for _, weights in expansions])
+        order = np.lexsort((-weights, docs))
+        docs, weights = docs[order], weights[order]
+        first = np.concatenate(([True], docs[1:] != docs[:-1]))
+        return docs[first], weights[first]
+
+    def _doc_arrays(self) -> dict:
+        """numpy views of the per-document columns, rebuilt lazily after writes"""
+        if self._arrays is None:
+            alive_ids = sorted(self._doc_numbers)
+            id_keys = np.full(len(self._ids), np.nan)
+            for position, product_id in enumerate(alive_ids):
+                id_keys[self._doc_numbers[product_id]] = position
+            self._arrays = {
+                "alive": np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool),
+                "category": np.array(self._category_codes, dtype=np.int64),
+                "price": np.array(self._prices, dtype=np.float64),
+                "created_at": np.array(self._created, dtype=np.float64),
+                "id": id_keys,
+                "sorted_ids": alive_ids,
+            }
+        return self._arrays
+
+    def _name_keys(self, arrays: dict) -> Tuple[np.ndarray, list]:
+        if "name" not in arrays:
+            sorted_names = sorted(set(self._names))
+            positions = {name: position for position, name in enumerate(sorted_names)}
+            arrays["name"] = np.array([positions[name] for name in self._names], dtype=np.float64)
+            arrays["sorted_names"] = sorted_names
+        return arrays["name"], arrays["sorted_names"]
+
+    def match(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Document numbers and relevance scores of live documents matching every query term"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        term_postings = sorted((self._postings_for(token) for token in tokens), key=lambda p: len(p[0]))
+        document_count = max(len(self), 1)
+        docs = scores = None
+        for term_docs, term_weights in term_postings:
+            if not len(term_docs):
+                return term_docs, term_weights
+            idf = math.log(1 + document_count / len(term_docs))
+            if docs is None:
+                docs, scores = term_docs, term_weights * idf
+                continue
+            keep, weights = _intersect(docs, term_docs, term_weights, len(self._ids))
+            docs = docs[keep]
+            scores = scores[keep] + weights * idf
+
+        # Integer takes of the kept positions are much faster than boolean indexing
+        alive = np.flatnonzero(self._doc_arrays()["alive"][docs])
+        return docs[alive], scores[alive]
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_field: str = "score",
+        direction: int = -1,
+        limit: int = 20,
+        offset: int = 0,
+        after: Optional[Tuple[object, str]] = None,
+    ) -> Tuple[List[Tuple[object, str]], int, bool]:
+        """
+        Rank matching products by (sort field, id) in the given direction.
+
+        Returns the requested page as (sort value, product id) pairs, the total
+        number of matches and whether more results follow the page. after is the
+        (sort value, product id) of the last result of the previous page.
+        """
+        docs, scores = self.match(query)
+        arrays = self._doc_arrays()
+
+        mask = np.ones(len(docs), dtype=bool)
+        if category:
+            code = self._categories.get(category)
+            if code is None:
+                mask[:] = False
+            else:
+                mask &= arrays["category"][docs] == code
+        if min_price is not None:
+            mask &= arrays["price"][docs] >= min_price
+        if max_price is not None:
+            mask &= arrays["price"][docs] <= max_price
+        keep = np.flatnonzero(mask)
+        docs, scores = docs[keep], scores[keep]
+        total = len(docs)
+
+        if sort_field == "score":
+            primary = scores
+        elif sort_field == "name":
+            primary = self._name_keys(arrays)[0][docs]
+        else:
+            primary = arrays[sort_field][docs]
+        secondary = arrays["id"][docs]
+
+        sign = 1.0 if direction == ASCENDING else -1.0
+        primary, secondary = primary * sign, secondary * sign
+        if after is not None:
+            after_value, after_id = after
+            if sort_field == "name":
+                after_primary = _dense_key(self._name_keys(arrays)[1], after_value)
+            elif sort_field == "created_at":
+                after_primary = _timestamp(after_value)
+            else:
+                after_primary = float(after_value)
+            after_primary *= sign
+            after_secondary = _dense_key(arrays["sorted_ids"], after_id) * sign
+            following = np.flatnonzero((primary > after_primary) | ((primary == after_primary) & (secondary > after_secondary)))
+            docs, scores, primary, secondary = docs[following], scores[following], primary[following], secondary[following]
+
+        wanted = offset + limit + 1
+        order = _smallest(primary, secondary, wanted)[offset:]
+        has_more = len(order) > limit
+        page = []
+        for index in order[:limit]:
+            doc = int(docs[index])
+            if sort_field == "score":
+                value = float(scores[index])
+            elif sort_field == "price":
+                value = self._prices[doc]
+            elif sort_field == "name":
+                value = self._names[doc]
+            else:
+                value = self._created_values[doc]
+            page.append((value, self._ids[doc]))
+        return page, total, has_more
+
+
+search_index = SearchIndex()
+add_product_listener(search_index.on_product_changed)
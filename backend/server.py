@@ -1,7 +1,8 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+import asyncio
 import os
 import logging
 from pathlib import Path
@@ -12,18 +13,28 @@ from routes.categories import router as categories_router
 from routes.cart import router as cart_router
 from routes.orders import router as orders_router
 from routes.search import router as search_router
+from routes.export import router as export_router
+from routes.storefront import router as storefront_router
 
 # Import database initialization
-from database import initialize_database
+from database import initialize_database, client, db
+from monitoring import pool_metrics
+from cache_backend import CACHE_BACKEND, listen_for_invalidations, redis_client
+from catalog_cache import apply_remote_invalidation, cache_stats, watch_catalog_changes
+from http_cache import CatalogCacheMiddleware
+from compression import CompressionMiddleware, compressed_snapshots
+from cart_summary import cart_summaries
+from metrics import MetricsMiddleware, render_metrics, slow_request_profiler
+from query_observer import slow_query_observer
+from search_index import search_index
+from suggestion_index import suggestion_index
+from storefront import storefront
+from cart_compaction import CART_COMPACTION_INTERVAL, run_cart_compaction
+from cart_store import CART_STORAGE
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # Create the main app without a prefix
 app = FastAPI(title="StyleHub API", version="1.0.0")
 
@@ -53,16 +64,64 @@ async def health_check():
             "message": f"Database error: {str(e)}"
         }
 
+# Connection pool utilization
+@api_router.get("/health/pool")
+async def pool_health():
+    return {"status": "ok", "pool": pool_metrics.snapshot()}
+
+def all_cache_stats() -> dict:
+    return {
+        **cache_stats(),
+        "compressed_snapshots": compressed_snapshots.stats(),
+        "cart_summaries": cart_summaries.stats(),
+    }
+
+# Cache statistics
+@api_router.get("/health/cache")
+async def cache_health():
+    return {"status": "ok", "caches": all_cache_stats()}
+
+# Request, Mongo, pool and cache metrics for Prometheus
+@api_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(all_cache_stats()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Profiles of the most recent slow requests (SLOW_REQUEST_PROFILE_MS)
+@api_router.get("/metrics/slow-requests")
+async def slow_requests():
+    return {
+        "enabled": slow_request_profiler.enabled,
+        "threshold_ms": slow_request_profiler.threshold * 1000,
+        "profiles": list(slow_request_profiler.profiles),
+    }
+
+# Mongo commands over SLOW_QUERY_MS by route and query shape, with sampled explain plans
+@api_router.get("/metrics/slow-queries")
+async def slow_queries():
+    return {
+        "threshold_ms": slow_query_observer.threshold * 1000,
+        "explain_sample_rate": slow_query_observer.sample_rate,
+        "queries": slow_query_observer.snapshot(),
+    }
+
 # Include all route modules
 api_router.include_router(products_router)
 api_router.include_router(categories_router)
 api_router.include_router(cart_router)
 api_router.include_router(orders_router)
 api_router.include_router(search_router)
+api_router.include_router(export_router)
+api_router.include_router(storefront_router)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# ETag / 304 handling for catalog reads
+app.add_middleware(CatalogCacheMiddleware)
+
+# Response compression, outside the ETag layer so snapshots are keyed by its tags
+app.add_middleware(CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -72,6 +131,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware, routes=app.router.routes)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -79,12 +141,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+background_tasks = []
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize database with sample data on startup"""
     logger.info("🚀 Starting StyleHub API...")
     try:
         await initialize_database()
+        await asyncio.gather(search_index.rebuild(), suggestion_index.rebuild(), storefront.rebuild())
+        slow_query_observer.start(client, asyncio.get_running_loop())
+        if slow_request_profiler.enabled:
+            background_tasks.append(asyncio.create_task(slow_request_profiler.run()))
+        # Embedded cart lines are merged on write and cannot be duplicated
+        if CART_COMPACTION_INTERVAL > 0 and CART_STORAGE == "lines":
+            background_tasks.append(asyncio.create_task(run_cart_compaction()))
+        if os.environ.get('CATALOG_CHANGE_STREAM', 'false').lower() == 'true':
+            background_tasks.append(asyncio.create_task(watch_catalog_changes()))
+        if CACHE_BACKEND == "redis":
+            background_tasks.append(asyncio.create_task(listen_for_invalidations(apply_remote_invalidation)))
         logger.info("✅ StyleHub API started successfully")
     except Exception as e:
         logger.error(f"❌ Error during startup: {e}")
@@ -93,5 +168,9 @@ async def startup_event():
 async def shutdown_db_client():
     """Close database connection on shutdown"""
     logger.info("📴 Shutting down StyleHub API...")
+    for task in background_tasks:
+        task.cancel()
+    if CACHE_BACKEND == "redis":
+        redis_client().close()
     client.close()
     logger.info("✅ Database connection closed")
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Materialized storefront: the homepage lists ("newest", "on sale", the newest
+products of every category) and product counts per category, kept as an
+in-process snapshot.
+
+The snapshot is built from one scan of the products collection and then kept
+current from the product write listeners: a write re-sorts only the lists the
+product was or is now part of and rebuilds just those. Reads return the
+prebuilt document without touching Mongo.
+"""
+import bisect
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from catalog_cache import add_product_listener, current_catalog_version, get_categories
+from database import products_collection
+from derived_index import DerivedIndex
+from product_views import VIEWS, project
+
+logger = logging.getLogger(__name__)
+
+STOREFRONT_LIST_SIZE = int(os.environ.get('STOREFRONT_LIST_SIZE', '12'))
+
+CARD_FIELDS = VIEWS["card"]
+_INDEXED_FIELDS = {field: 1 for field in (*CARD_FIELDS, "category", "created_at")}
+_INDEXED_FIELDS["_id"] = 0
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Position of a product in a list: (primary sort value, id)
+SortKey = Tuple[float, str]
+
+
+def _newest_key(product: dict) -> SortKey:
+    created_at = product.get("created_at")
+    return (-(created_at - _EPOCH).total_seconds() if isinstance(created_at, datetime) else 0.0, product["id"])
+
+
+def _discount_key(product: dict) -> Optional[SortKey]:
+    """Biggest discount first; None for products that are not on sale"""
+    if not product.get("is_on_sale"):
+        return None
+    original, price = product.get("original_price"), product.get("price") or 0
+    discount = 1 - price / original if original else 0.0
+    return (-discount, product["id"])
+
+
+def _list_keys(product: dict) -> Dict[str, SortKey]:
+    keys = {"newest": _newest_key(product), f"category:{product.get('category')}": _newest_key(product)}
+    on_sale = _discount_key(product)
+    if on_sale is not None:
+        keys["on_sale"] = on_sale
+    return keys
+
+
+class Storefront(DerivedIndex):
+    """Sorted membership of every storefront list plus the snapshot built from their heads"""
+
+    def __init__(self, list_size: int = STOREFRONT_LIST_SIZE):
+        self.list_size = list_size
+        self._cards: Dict[str, dict] = {}
+        self._keys: Dict[str, Dict[str, SortKey]] = {}
+        self._lists: Dict[str, List[SortKey]] = {}
+        self._heads: Dict[str, List[dict]] = {}
+        # Catalog version the snapshot was assembled at; category writes bump it too
+        self._snapshot_version: Optional[int] = None
+        self._snapshot: Optional[dict] = None
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    async def _load(self) -> "Storefront":
+        fresh = Storefront(self.list_size)
+        async for product in products_collection.find({}, _INDEXED_FIELDS):
+            fresh._insert(product)
+        for sorted_keys in fresh._lists.values():
+            sorted_keys.sort()
+        fresh._heads = {name: fresh._head(name) for name in fresh._lists}
+        return fresh
+
+    def _swap(self, fresh: "Storefront") -> None:
+        self._cards, self._keys, self._lists, self._heads = fresh._cards, fresh._keys, fresh._lists, fresh._heads
+        self._snapshot = None
+        logger.info(f"Storefront built from {len(self._cards)} products")
+
+    def _insert(self, product: dict) -> None:
+        # Appends unsorted; _load() sorts every list once at the end
+        keys = _list_keys(product)
+        self._cards[product["id"]] = project(product, CARD_FIELDS)
+        self._keys[product["id"]] = keys
+        for name, key in keys.items():
+            self._lists.setdefault(name, []).append(key)
+
+    def _head(self, name: str) -> List[dict]:
+        return [self._cards[product_id] for _, product_id in self._lists.get(name, [])[:self.list_size]]
+
+    def _apply(self, product_id: str, product: Optional[dict]) -> None:
+        """Move one written (or deleted, product None) product between the lists"""
+        old_keys = self._keys.pop(product_id, {})
+        self._cards.pop(product_id, None)
+        new_keys = _list_keys(product) if product is not None else {}
+
+        for name, key in old_keys.items():
+            sorted_keys = self._lists[name]
+            del sorted_keys[bisect.bisect_left(sorted_keys, key)]
+            if not sorted_keys:
+                del self._lists[name]
+        if product is not None:
+            self._cards[product_id] = project(product, CARD_FIELDS)
+            self._keys[product_id] = new_keys
+            for name, key in new_keys.items():
+                bisect.insort(self._lists.setdefault(name, []), key)
+
+        # Replace the heads of the touched lists; snapshots already handed out stay unchanged
+        heads = dict(self._heads)
+        for name in old_keys.keys() | new_keys.keys():
+            if name in self._lists:
+                heads[name] = self._head(name)
+            else:
+                heads.pop(name, None)
+        self._heads = heads
+        self._snapshot = None
+
+    async def snapshot(self) -> dict:
+        """The homepage document: categories with product counts and the prebuilt lists"""
+        await self.ensure_built()
+        version = await current_catalog_version()
+        if self._snapshot is None or version != self._snapshot_version:
+            # Assembled once per product or category write, then served as is
+            categories = await get_categories()
+            heads = self._heads
+            self._snapshot = {
+                "categories": [
+                    {**category, "product_count": len(self._lists.get(f"category:{category['slug']}", []))}
+                    for category in categories
+                ],
+                "newest": heads.get("newest", []),
+                "on_sale": heads.get("on_sale", []),
+                "by_category": {
+                    category["slug"]: heads.get(f"category:{category['slug']}", []) for category in categories
+                },
+            }
+            self._snapshot_version = version
+        return self._snapshot
+
+storefront = Storefront()
+add_product_listener(storefront.on_product_changed)
@@ -0,0 +1,141 @@
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from catalog_cache import add_product_listener
+from database import products_collection
+from derived_index import DerivedIndex
+from search_index import fold
+
+logger = logging.getLogger(__name__)
+
+# Entries scanned per prefix before ranking; bounds the cost of one or two letter prefixes
+MAX_SCAN = 500
+
+_INDEXED_FIELDS = {"_id": 0, "id": 1, "name": 1, "category": 1, "colors": 1, "stock": 1}
+
+
+class SuggestionIndex(DerivedIndex):
+    """
+    Sorted-array prefix index over product names, categories and colors.
+
+    Every name is indexed from each word start, so "hemd" suggests "Herren
+    Business Hemd". Matches are ranked by whole-text prefix first and then by
+    stock, summed over all products for categories and colors.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[str, str, str]] = []
+        self._products: Dict[str, dict] = {}
+        self._terms: Dict[Tuple[str, str], List[int]] = {}
+        super().__init__()
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    async def _load(self) -> "SuggestionIndex":
+        fresh = SuggestionIndex()
+        async for product in products_collection.find({}, _INDEXED_FIELDS):
+            fresh._keys.extend(fresh._add_entries(product))
+        fresh._keys.sort()
+        return fresh
+
+    def _apply(self, product_id: str, product: Optional[dict]) -> None:
+        if product is None:
+            self.remove(product_id)
+        else:
+            self.add(product)
+
+    def _swap(self, fresh: "SuggestionIndex") -> None:
+        self._keys, self._products, self._terms = fresh._keys, fresh._products, fresh._terms
+        logger.info(f"Suggestion index built with {len(self._keys)} keys")
+
+    def add(self, product: dict) -> None:
+        """Index a product, replacing any previous version of it"""
+        self.remove(product["id"])
+        for key in self._add_entries(product):
+            bisect.insort(self._keys, key)
+
+    def remove(self, product_id: str) -> None:
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return
+        for key in self._product_keys(product):
+            self._discard(key)
+        for term in self._product_terms(product):
+            counter = self._terms[term]
+            counter[0] -= product["stock"]
+            counter[1] -= 1
+            if counter[1] == 0:
+                del self._terms[term]
+                self._discard((fold(term[1]), term[0], term[1]))
+
+    def _discard(self, key: Tuple[str, str, str]) -> None:
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+    @staticmethod
+    def _product_keys(product: dict) -> List[Tuple[str, str, str]]:
+        words = product["key"].split()
+        return [(" ".join(words[start:]), "product", product["id"]) for start in range(len(words))]
+
+    @staticmethod
+    def _product_terms(product: dict) -> List[Tuple[str, str]]:
+        terms = [("color", color) for color in dict.fromkeys(product["colors"])]
+        if product["category"]:
+            terms.append(("category", product["category"]))
+        return terms
+
+    def _add_entries(self, product: dict) -> List[Tuple[str, str, str]]:
+        """Record a product and return the sorted-array keys that are new"""
+        name = product.get("name") or ""
+        product = {
+            "id": product["id"],
+            "name": name,
+            "key": " ".join(fold(name).split()),
+            "category": product.get("category"),
+            "colors": product.get("colors") or [],
+            "stock": product.get("stock") or 0,
+        }
+        self._products[product["id"]] = product
+
+        keys = self._product_keys(product)
+        for term in self._product_terms(product):
+            counter = self._terms.get(term)
+            if counter is None:
+                counter = self._terms[term] = [0, 0]
+                keys.append((fold(term[1]), term[0], term[1]))
+            counter[0] += product["stock"]
+            counter[1] += 1
+        return keys
+
+    def suggest(self, query: str, limit: int = 5) -> List[dict]:
+        """Ranked suggestions whose name, category or color starts with query"""
+        prefix = " ".join(fold(query).split())
+        if not prefix:
+            return []
+
+        candidates = {}
+        start = bisect.bisect_left(self._keys, (prefix,))
+        for key, kind, ref in self._keys[start:start + MAX_SCAN]:
+            if not key.startswith(prefix):
+                break
+            if kind == "product":
+                product = self._products[ref]
+                text, category, stock = product["name"], product["category"], product["stock"]
+                whole = key == product["key"]
+            else:
+                text, stock = ref, self._terms[(kind, ref)][0]
+                category = ref if kind == "category" else None
+                whole = True
+            rank = (whole, stock)
+            if text not in candidates or candidates[text][0] < rank:
+                candidates[text] = (rank, {"text": text, "type": kind, "category": category})
+
+        ranked = sorted(candidates.values(), key=lambda candidate: candidate[0], reverse=True)
+        return [suggestion for _, suggestion in ranked[:limit]]
+
+
+suggestion_index = SuggestionIndex()
+add_product_listener(suggestion_index.on_product_changed)
@@ -0,0 +1,90 @@
+"""
+Unit tests run against the backend modules with the in-memory mongomock-motor
+stand-in, so they need neither MongoDB nor a running server.
+"""
+import asyncio
+import contextlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import common  # noqa: E402
+
+common.use_mongomock()
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    return asyncio.run
+
+
+@pytest.fixture
+def db(run, monkeypatch):
+    """The application database, emptied and without indexes before each test, with the process caches reset to match"""
+    import catalog_cache
+    from cart_summary import cart_summaries
+    from database import db
+
+    async def reset():
+        for name in await db.list_collection_names():
+            await db[name].delete_many({})
+            await db[name].drop_indexes()
+        for cache in (catalog_cache.product_cache, catalog_cache.category_cache, catalog_cache.count_cache,
+                      catalog_cache.facet_cache, cart_summaries):
+            await cache.clear()
+
+    run(reset())
+    monkeypatch.setattr(catalog_cache, "_seen_versions", {"version": None, "stock": None})
+    monkeypatch.setattr(catalog_cache, "_version_checked_at", 0.0)
+    return db
+
+
+@pytest.fixture
+def fake_redis():
+    """Async context manager running a fake_redis.FakeRedisServer; yields its URL"""
+    from fake_redis import FakeRedisServer
+
+    @contextlib.asynccontextmanager
+    async def serve():
+        server = FakeRedisServer()
+        port = await server.start()
+        try:
+            yield f"redis://127.0.0.1:{port}/0"
+        finally:
+            await server.stop()
+
+    return serve
+
+
+@pytest.fixture
+def write_during_scan():
+    """Wraps a collection so that find() awaits write() after yielding the first document"""
+
+    class WriteDuringScan:
+        def __init__(self, collection, write):
+            self.collection = collection
+            self.write = write
+            self.scans = 0
+
+        def find(self, *args):
+            return self._scan(*args)
+
+        async def _scan(self, *args):
+            self.scans += 1
+            first = True
+            async for document in self.collection.find(*args):
+                yield document
+                if first:
+                    first = False
+                    await self.write()
+
+    return WriteDuringScan
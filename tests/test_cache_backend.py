@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import orjson
+
+import cache_backend
+from cache_backend import INVALIDATION_CHANNEL, LocalNamespace, RedisClient, SharedNamespace, cache_namespace
+
+# Runs in its own process, so it has its own WORKER_ID like another API worker
+_PUBLISHER = """
+import asyncio
+from cache_backend import publish_invalidation
+asyncio.run(publish_invalidation("product_changed", "p1", 7))
+"""
+
+
+def test_shared_get_set_and_expire(run, fake_redis):
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            products = SharedNamespace("product", ttl=60, client=client)
+            product = {"id": "p1", "price": 9.5, "created_at": datetime(2024, 1, 1)}
+            await products.set("p1", product)
+            await products.set("p2", {"id": "p2"}, ttl=0.05)
+            found = await products.get("p1"), await products.get("p2")
+            await asyncio.sleep(0.1)
+            expired = await products.get("p2")
+            await products.delete("p1")
+            deleted = await products.get("p1")
+            client.close()
+            return product, found, expired, deleted, products.stats()
+
+    product, (found, short_lived), expired, deleted, stats = run(scenario())
+    assert found == product
+    assert short_lived == {"id": "p2"}
+    assert expired is None and deleted is None
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+def test_shared_get_many_and_set_many(run, fake_redis):
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            products = SharedNamespace("product", ttl=60, client=client)
+            await products.set_many({"p1": {"id": "p1"}, "p2": {"id": "p2"}})
+            found = await products.get_many(["p1", "p2", "p3"])
+            client.close()
+            return found
+
+    assert run(scenario()) == {"p1": {"id": "p1"}, "p2": {"id": "p2"}}
+
+
+def test_namespaces_are_isolated(run, fake_redis):
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            products = SharedNamespace("product", ttl=60, client=client)
+            carts = SharedNamespace("cart", ttl=60, client=client)
+            await products.set("s1", "product")
+            await carts.set("s1", "cart")
+            values = await products.get("s1"), await carts.get("s1")
+            await products.clear()
+            after_clear = await products.get("s1"), await carts.get("s1")
+            client.close()
+            return values, after_clear
+
+    values, after_clear = run(scenario())
+    assert values == ("product", "cart")
+    assert after_clear == (None, "cart")
+
+
+def test_unreachable_server_counts_as_a_miss(run):
+    async def scenario():
+        products = SharedNamespace("product", ttl=60, client=RedisClient("redis://127.0.0.1:1/0", timeout=0.2))
+        await products.set("p1", {"id": "p1"})
+        return await products.get("p1"), products.stats()
+
+    value, stats = run(scenario())
+    assert value is None
+    assert (stats["misses"], stats["errors"]) == (1, 2)
+
+
+def test_namespaces_stay_local_without_the_redis_backend(monkeypatch):
+    monkeypatch.setattr(cache_backend, "CACHE_BACKEND", "local")
+    assert isinstance(cache_namespace("product", maxsize=10, ttl=60, shared=True), LocalNamespace)
+    assert isinstance(cache_namespace("count", maxsize=10, ttl=60), LocalNamespace)
+    monkeypatch.setattr(cache_backend, "CACHE_BACKEND", "redis")
+    assert isinstance(cache_namespace("product", maxsize=10, ttl=60, shared=True), SharedNamespace)
+    assert isinstance(cache_namespace("count", maxsize=10, ttl=60), LocalNamespace)
+
+
+def test_invalidation_from_another_worker_is_received(run, monkeypatch, fake_redis):
+    received = []
+
+    async def handler(event, key, version):
+        received.append((event, key, version))
+
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            monkeypatch.setattr(cache_backend, "_client", client)
+            listener = asyncio.ensure_future(cache_backend.listen_for_invalidations(handler))
+
+            # This worker's own messages are skipped; the count of receivers shows the subscription is up
+            own = orjson.dumps({"origin": cache_backend.WORKER_ID, "event": "product_changed", "key": "p0", "version": 1})
+            while not await client.execute("PUBLISH", INVALIDATION_CHANNEL, own):
+                await asyncio.sleep(0.01)
+
+            publisher = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", _PUBLISHER, cwd=Path(cache_backend.__file__).parent,
+                env={**os.environ, "CACHE_BACKEND": "redis", "CACHE_URL": url},
+            )
+            assert await publisher.wait() == 0
+            for _ in range(100):
+                if received:
+                    break
+                await asyncio.sleep(0.01)
+
+            listener.cancel()
+            client.close()
+
+    run(scenario())
+    assert received == [("product_changed", "p1", 7)]
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from cart_compaction import compact_cart_items, has_unique_line_index
+from database import ensure_indexes
+
+
+def _line(line_id, quantity, day):
+    return {
+        "id": line_id, "session_id": "s1", "product_id": "p1", "selected_size": "M", "selected_color": "Rot",
+        "quantity": quantity, "added_at": datetime.utcnow() - timedelta(days=day),
+    }
+
+
+def test_merges_duplicate_lines_and_creates_the_unique_index(run, db):
+    async def scenario():
+        await db.cart_items.insert_many([_line("a", 1, 1), _line("b", 2, 2)])
+        report = await compact_cart_items()
+        return report, await db.cart_items.find({}, {"_id": 0}).to_list(length=None), await has_unique_line_index()
+
+    report, lines, indexed = run(scenario())
+    assert (report.groups, report.rows_removed, report.unique_index) == (1, 1, False)
+    assert [(line["id"], line["quantity"]) for line in lines] == [("b", 3)]
+    assert indexed
+
+
+def test_skips_the_scan_when_the_unique_index_exists(run, db):
+    async def scenario():
+        await ensure_indexes()
+        await db.cart_items.insert_one(_line("a", 1, 1))
+        return await compact_cart_items(dry_run=True)
+
+    report = run(scenario())
+    assert report.unique_index
+    assert report.groups == 0
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import cart_store
+from cart_store import CartFull, DocumentCartStore
+from database import ensure_indexes
+from migrations.cart_documents import migrate
+from models import CartItem
+
+
+def _item(product_id="p1", size="M", quantity=1, session_id="s1"):
+    return CartItem(session_id=session_id, product_id=product_id, selected_size=size, selected_color="Rot", quantity=quantity)
+
+
+def test_adding_the_same_line_adds_to_its_quantity(run, db):
+    store = DocumentCartStore()
+
+    async def scenario():
+        await ensure_indexes()
+        first = await store.add(_item())
+        again = await store.add(_item(quantity=2))
+        other = await store.add(_item(size="L"))
+        return first, again, other, await store.lines("s1")
+
+    first, again, other, lines = run(scenario())
+    assert again["id"] == first["id"] and again["quantity"] == 3
+    assert other["id"] != first["id"]
+    assert [(line["selected_size"], line["quantity"], line["session_id"]) for line in lines] == [("M", 3, "s1"), ("L", 1, "s1")]
+
+
+def test_full_cart_rejects_new_lines_but_not_more_of_a_line(run, db, monkeypatch):
+    monkeypatch.setattr(cart_store, "MAX_CART_LINES", 2)
+    store = DocumentCartStore()
+
+    async def scenario():
+        await ensure_indexes()
+        await store.add(_item("p1"))
+        await store.add(_item("p2"))
+        with pytest.raises(CartFull):
+            await store.add(_item("p3"))
+        await store.add(_item("p1"))
+        return await store.lines("s1")
+
+    lines = run(scenario())
+    assert [(line["product_id"], line["quantity"]) for line in lines] == [("p1", 2), ("p2", 1)]
+
+
+def test_set_quantity_remove_and_clear(run, db):
+    store = DocumentCartStore()
+
+    async def scenario():
+        await ensure_indexes()
+        first = await store.add(_item("p1"))
+        second = await store.add(_item("p2"))
+        zero = await store.set_quantity("s1", first["id"], 0)
+        missing = await store.set_quantity("s1", "unknown", 2)
+        removed = await store.remove("s1", second["id"]), await store.remove("s1", second["id"])
+        after_remove = await store.lines("s1")
+        await store.add(_item("p3"))
+        cleared = await store.clear("s1"), await store.clear("s1")
+        return zero, missing, removed, after_remove, cleared, await store.lines("s1"), await db.carts.count_documents({})
+
+    zero, missing, removed, after_remove, cleared, lines, carts = run(scenario())
+    assert (zero["product_id"], zero["quantity"]) == ("p1", 0)
+    assert missing is None
+    assert removed == (True, False)
+    assert [line["product_id"] for line in after_remove] == ["p1"]
+    assert cleared == (2, 0)
+    assert lines == [] and carts == 0
+
+
+def _line(line_id, session_id, product_id, quantity, minutes_ago, size="M"):
+    return {
+        "id": line_id, "session_id": session_id, "product_id": product_id, "selected_size": size,
+        "selected_color": "Rot", "quantity": quantity, "added_at": datetime.utcnow() - timedelta(minutes=minutes_ago),
+    }
+
+
+def test_migration_merges_lines_into_one_document_per_session(run, db, monkeypatch):
+    monkeypatch.setattr("migrations.cart_documents.MAX_CART_LINES", 2)
+
+    async def scenario():
+        await db.cart_items.insert_many([
+            _line("a", "s1", "p1", 1, 30),
+            _line("b", "s1", "p1", 2, 20),
+            _line("c", "s1", "p2", 1, 10),
+            _line("d", "s1", "p3", 1, 5),
+            _line("e", "s2", "p1", 1, 1),
+        ])
+        # s2 was migrated before, so a second run leaves it alone
+        await db.carts.insert_one({"session_id": "s2", "lines": [], "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()})
+        dry = await migrate(batch_size=1, dry_run=True, delete_lines=False)
+        dry_carts = await db.carts.count_documents({})
+        stats = await migrate(batch_size=1, dry_run=False, delete_lines=True)
+        carts = {cart["session_id"]: cart async for cart in db.carts.find({}, {"_id": 0})}
+        left = [line["id"] async for line in db.cart_items.find({}, {"_id": 0, "id": 1})]
+        return dry, dry_carts, stats, carts, left
+
+    dry, dry_carts, stats, carts, left = run(scenario())
+    assert (dry["sessions"], dry["carts_written"], dry_carts) == (2, 0, 1)
+    assert (stats["sessions"], stats["lines"], stats["merged_lines"], stats["truncated_lines"]) == (2, 5, 1, 1)
+    assert (stats["carts_written"], stats["already_migrated"]) == (1, 1)
+    cart = carts["s1"]
+    assert [(line["id"], line["product_id"], line["quantity"]) for line in cart["lines"]] == [("a", "p1", 3), ("c", "p2", 1)]
+    assert "session_id" not in cart["lines"][0] and "_id" not in cart["lines"][0]
+    assert cart["created_at"] == cart["lines"][0]["added_at"]
+    assert cart["updated_at"] == cart["lines"][1]["added_at"]
+    assert carts["s2"]["lines"] == []
+    assert left == ["e"]
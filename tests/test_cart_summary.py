@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+
+import cart_summary
+from cache_backend import RedisClient, SharedNamespace
+from cart_store import cart_store
+from models import CartItem
+
+
+async def _add(db, session_id="s1"):
+    await db.products.insert_one({"id": "p1", "name": "Kleid", "price": 30.0, "stock": 5})
+    return await cart_store.add(CartItem(session_id=session_id, product_id="p1", selected_size="M", selected_color="Rot"))
+
+
+def test_summaries_are_not_cached_by_default_with_the_local_backend(run, db):
+    assert cart_summary.CART_SUMMARY_CACHE is False
+
+    async def scenario():
+        await _add(db)
+        summary = await cart_summary.get_cart_summary("s1")
+        return summary, await cart_summary.cart_summaries.get("s1")
+
+    summary, cached = run(scenario())
+    assert summary["subtotal"] == 30.0
+    assert cached is None
+
+
+def test_local_cache_is_patched_by_mutations(run, db, monkeypatch):
+    monkeypatch.setattr(cart_summary, "CART_SUMMARY_CACHE", True)
+
+    async def scenario():
+        line = await _add(db)
+        first = await cart_summary.get_cart_summary("s1")
+        await cart_store.set_quantity("s1", line["id"], 3)
+        await cart_summary.line_quantity_changed("s1", line["id"], 3)
+        second = await cart_summary.get_cart_summary("s1")
+        await cart_summary.cart_cleared("s1")
+        return first, second, await cart_summary.cart_summaries.get("s1")
+
+    first, second, cleared = run(scenario())
+    assert (first["subtotal"], second["subtotal"]) == (30.0, 90.0)
+    assert cleared["cart_items"] == []
+
+
+def _share(monkeypatch, client):
+    monkeypatch.setattr(cart_summary, "cart_summaries", SharedNamespace("cart", ttl=60, client=client))
+    monkeypatch.setattr(cart_summary, "cart_leases", SharedNamespace("cartlock", ttl=5, client=client))
+
+
+def test_shared_cache_is_patched_under_the_cart_lock(run, db, monkeypatch, fake_redis):
+    monkeypatch.setattr(cart_summary, "CART_SUMMARY_CACHE", True)
+
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            _share(monkeypatch, client)
+            line = await _add(db)
+            await cart_summary.get_cart_summary("s1")
+            async with cart_summary.cart_lock("s1"):
+                leased = await cart_summary.cart_leases.get("s1")
+                await cart_store.set_quantity("s1", line["id"], 3)
+                await cart_summary.line_quantity_changed("s1", line["id"], 3)
+            released = await cart_summary.cart_leases.get("s1")
+            after_change = await cart_summary.cart_summaries.get("s1")
+            async with cart_summary.cart_lock("s1"):
+                await cart_store.clear("s1")
+                await cart_summary.cart_cleared("s1")
+            after_clear = await cart_summary.cart_summaries.get("s1")
+            client.close()
+            return leased, released, after_change, after_clear
+
+    leased, released, after_change, after_clear = run(scenario())
+    assert leased is not None and released is None
+    assert after_change["subtotal"] == 90.0
+    assert after_clear is None
+
+
+def test_shared_cache_is_deleted_without_the_lease(run, db, monkeypatch, fake_redis):
+    monkeypatch.setattr(cart_summary, "CART_SUMMARY_CACHE", True)
+    monkeypatch.setattr(cart_summary, "CART_LOCK_WAIT", 0.05)
+
+    async def scenario():
+        async with fake_redis() as url:
+            client = RedisClient(url)
+            _share(monkeypatch, client)
+            line = await _add(db)
+            await cart_summary.get_cart_summary("s1")
+            cached = await cart_summary.cart_summaries.get("s1")
+            # Another worker holds the session
+            await cart_summary.cart_leases.set("s1", "other-worker")
+            async with cart_summary.cart_lock("s1"):
+                await cart_store.set_quantity("s1", line["id"], 3)
+                await cart_summary.line_quantity_changed("s1", line["id"], 3)
+            after_change = await cart_summary.cart_summaries.get("s1")
+            summary = await cart_summary.get_cart_summary("s1")
+            after_read = await cart_summary.cart_summaries.get("s1")
+            lease = await cart_summary.cart_leases.get("s1")
+            client.close()
+            return cached, after_change, summary, after_read, lease
+
+    cached, after_change, summary, after_read, lease = run(scenario())
+    assert cached["subtotal"] == 30.0
+    assert after_change is None
+    assert summary["subtotal"] == 90.0 and after_read is None
+    assert lease == "other-worker"
+
+
+def test_summary_expires_with_its_oldest_line(monkeypatch):
+    monkeypatch.setattr(cart_summary, "CART_RETENTION_DAYS", 1)
+    now = datetime.utcnow()
+    assert cart_summary._summary_ttl([]) == cart_summary.CART_SUMMARY_TTL
+    assert cart_summary._summary_ttl([{"added_at": now}]) == cart_summary.CART_SUMMARY_TTL
+    expiring = [{"added_at": now}, {"added_at": now - timedelta(days=1) + timedelta(seconds=10)}]
+    assert 0 < cart_summary._summary_ttl(expiring) <= 10
+    assert cart_summary._summary_ttl([{"added_at": now - timedelta(days=2)}]) < 0
@@ -0,0 +1,47 @@
+import catalog_cache
+
+
+def test_remote_product_change_reaches_listeners_and_adopts_the_version(run, db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 3600)
+    monkeypatch.setattr(catalog_cache, "_product_listeners", [])
+    changes = []
+    catalog_cache.add_product_listener(lambda product_id, product: changes.append((product_id, product)))
+
+    async def scenario():
+        await db.products.insert_one({"id": "p1", "name": "Hemd", "price": 10.0})
+        assert await catalog_cache.current_catalog_version() == 0
+        await catalog_cache.apply_remote_invalidation("product_changed", "p1", 1)
+        adopted = catalog_cache.catalog_version()
+        # Version 2 was never seen here, so 3 is not adopted and the next read goes to Mongo
+        await catalog_cache.apply_remote_invalidation("product_changed", "p1", 3)
+        return adopted, catalog_cache.catalog_version()
+
+    adopted, after_gap = run(scenario())
+    assert changes[0] == ("p1", {"id": "p1", "name": "Hemd", "price": 10.0})
+    assert (adopted, after_gap) == (1, 1)
+    assert catalog_cache._version_checked_at == 0.0
+
+
+def test_get_products_reads_through_the_cache(run, db):
+    async def scenario():
+        await db.products.insert_many([{"id": "p1", "name": "Hemd"}, {"id": "p2", "name": "Hose"}])
+        first = await catalog_cache.get_products(["p1", "p2", "p3"])
+        await db.products.update_one({"id": "p1"}, {"$set": {"name": "Neu"}})
+        return first, await catalog_cache.get_products(["p1"])
+
+    first, cached = run(scenario())
+    assert sorted(first) == ["p1", "p2"]
+    assert cached["p1"]["name"] == "Hemd"
+
+
+def test_seeding_categories_drops_the_cached_list(run, db):
+    from database import init_categories
+
+    async def scenario():
+        before = await catalog_cache.get_categories()
+        await init_categories()
+        return before, await catalog_cache.get_categories()
+
+    before, after = run(scenario())
+    assert before == []
+    assert [category["slug"] for category in after] == ["damen", "herren", "accessoires", "schuhe"]
@@ -0,0 +1,102 @@
+import asyncio
+
+import catalog_cache
+import checkout
+from checkout import OutOfStock, place_order
+from http_cache import catalog_etag
+from models import CartItem, CustomerInfo, OrderCreate
+
+
+async def _fill_cart(db, session_id="s1"):
+    from cart_store import cart_store
+
+    await db.products.insert_many([
+        {"id": "p1", "name": "Kleid", "price": 50.0, "stock": 5, "category": "damen"},
+        {"id": "p2", "name": "Hemd", "price": 20.0, "stock": 5, "category": "herren"},
+    ])
+    for product_id, quantity in (("p1", 1), ("p2", 2)):
+        await cart_store.add(CartItem(
+            session_id=session_id, product_id=product_id, selected_size="M", selected_color="Rot", quantity=quantity
+        ))
+
+
+def _order(session_id="s1"):
+    return OrderCreate(session_id=session_id, customer_info=CustomerInfo(name="A", email="a@example.com", address="X"))
+
+
+def test_order_changes_stock_version_only(run, db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 0)
+
+    async def scenario():
+        await _fill_cart(db)
+        await catalog_cache.count_products({"category": "damen"}, mode="estimated")
+        assert (await catalog_cache.get_product("p1"))["stock"] == 5
+        tags = [await catalog_etag(path, b"") for path in ("/api/products/", "/api/categories/", "/api/storefront")]
+        version = await catalog_cache.current_catalog_version()
+
+        await place_order(_order())
+
+        after = [await catalog_etag(path, b"") for path in ("/api/products/", "/api/categories/", "/api/storefront")]
+        return tags, after, version, await catalog_cache.current_catalog_version(), await catalog_cache.get_product("p1")
+
+    tags, after, version, version_after, product = run(scenario())
+    assert version_after == version
+    assert after[0] != tags[0]
+    assert after[1:] == tags[1:]
+    assert product["stock"] == 4
+    assert catalog_cache.count_cache.stats()["size"] == 1
+
+
+def test_order_is_priced_from_the_database_not_the_cache(run, db):
+    async def scenario():
+        await _fill_cart(db)
+        # Warm the catalog cache, then change the price behind its back
+        await catalog_cache.get_products(["p1", "p2"])
+        await db.products.update_one({"id": "p1"}, {"$set": {"price": 70.0, "name": "Kleid Neu"}})
+        return await place_order(_order())
+
+    order = run(scenario())
+    line = next(line for line in order.items if line.product_id == "p1")
+    assert (line.price_at_time, line.name) == (70.0, "Kleid Neu")
+    assert order.total_amount == 110.0
+
+
+def test_lines_of_deleted_products_are_dropped(run, db):
+    async def scenario():
+        await _fill_cart(db)
+        await db.products.delete_one({"id": "p2"})
+        order = await place_order(_order())
+        return order, await db.products.find_one({"id": "p1"})
+
+    order, product = run(scenario())
+    assert [line.product_id for line in order.items] == ["p1"]
+    assert product["stock"] == 4
+
+
+def test_concurrent_checkouts_do_not_oversell_without_transactions(run, db, monkeypatch):
+    from cart_store import cart_store
+
+    monkeypatch.setattr(checkout, "CHECKOUT_TRANSACTIONS", "false")
+    monkeypatch.setattr(checkout, "_transactions_supported", None)
+    buyers = [f"s{i}" for i in range(20)]
+
+    async def scenario():
+        await db.products.insert_many([
+            {"id": "plenty", "name": "Socken", "price": 5.0, "stock": 100, "category": "herren"},
+            {"id": "scarce", "name": "Mantel", "price": 200.0, "stock": 3, "category": "herren"},
+        ])
+        # The plentiful product is reserved first, so a buyer who misses the scarce one has stock to give back
+        for session_id in buyers:
+            for product_id in ("plenty", "scarce"):
+                await cart_store.add(CartItem(
+                    session_id=session_id, product_id=product_id, selected_size="M", selected_color="Rot"
+                ))
+        results = await asyncio.gather(*(place_order(_order(session_id)) for session_id in buyers), return_exceptions=True)
+        stock = {product["id"]: product["stock"] async for product in db.products.find({}, {"_id": 0, "id": 1, "stock": 1})}
+        return results, stock, await db.orders.count_documents({})
+
+    results, stock, orders = run(scenario())
+    assert sum(not isinstance(result, Exception) for result in results) == 3
+    assert all(isinstance(result, OutOfStock) for result in results if isinstance(result, Exception))
+    assert orders == 3
+    assert stock == {"scarce": 0, "plenty": 97}
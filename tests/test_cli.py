@@ -0,0 +1,21 @@
+import json
+
+import catalog_cache
+import cli
+
+
+def test_direct_import_bumps_the_shared_catalog_version(run, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 0)
+    before = run(catalog_cache.current_catalog_version())
+    path = tmp_path / "products.ndjson"
+    product = {
+        "id": "p1", "name": "Kleid", "price": 10.0, "category": "damen", "description": "d", "image": "i",
+        "sizes": ["M"], "colors": ["Rot"],
+    }
+    path.write_text(json.dumps(product) + "\n")
+
+    report = cli._import_direct(path, "ndjson", "id", 100)
+
+    assert report["inserted"] == 1
+    meta = run(db.catalog_meta.find_one({"_id": "catalog"}))
+    assert meta["version"] == before + 1
@@ -0,0 +1,63 @@
+import gzip
+
+import compression
+from compression import CompressionMiddleware, compressed_snapshots
+from http_cache import catalog_etag
+
+
+def _app(body: bytes, calls: list):
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        etag = await catalog_etag(scope["path"], scope["query_string"])
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"etag", etag.encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+async def _get(app, path: str) -> bytes:
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    await app(scope, None, send)
+    return gzip.decompress(b"".join(message.get("body", b"") for message in messages[1:]))
+
+
+def test_only_listing_paths_are_snapshotted(run, db):
+    compressed_snapshots.clear()
+    body = b'{"products": [' + b'{"name": "Kleid"},' * 200 + b'{}]}'
+    calls = []
+    app = CompressionMiddleware(_app(body, calls), snapshot_paths=compression.SNAPSHOT_PATHS)
+
+    async def scenario():
+        for path in ("/api/products/", "/api/products/", "/api/products/p1", "/api/products/p1", "/api/search/"):
+            assert await _get(app, path) == body
+
+    run(scenario())
+    assert calls == ["/api/products/", "/api/products/p1", "/api/products/p1", "/api/search/"]
+    assert len(compressed_snapshots) == 1
+
+
+def test_large_bodies_are_not_kept(run, db, monkeypatch):
+    compressed_snapshots.clear()
+    monkeypatch.setattr(compression, "COMPRESSED_SNAPSHOT_MAX_BODY", 1024)
+    body = b'{"products": "' + b"x" * 4096 + b'"}'
+    calls = []
+    app = CompressionMiddleware(_app(body, calls))
+
+    async def scenario():
+        for _ in range(2):
+            assert await _get(app, "/api/storefront") == body
+
+    run(scenario())
+    assert len(calls) == 2
+    assert len(compressed_snapshots) == 0
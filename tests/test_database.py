@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+import database
+from database import unused_indexes
+
+
+def _stat(name, ops, days_counted):
+    return {"name": name, "accesses": {"ops": ops, "since": datetime(2024, 3, 1) - timedelta(days=days_counted)}}
+
+
+def test_indexes_are_unused_only_after_the_minimum_counting_window(monkeypatch):
+    monkeypatch.setattr(database, "INDEX_USAGE_MIN_DAYS", 7)
+    stats = [
+        _stat("_id_", 0, 30),
+        _stat("price", 0, 30),
+        _stat("name", 5, 30),
+        # Counters reset by a restart or a rebuild two days ago
+        _stat("category_is_on_sale", 0, 2),
+        {"name": "id_unique", "accesses": {"ops": 0}},
+    ]
+    assert unused_indexes(stats, datetime(2024, 3, 1)) == ["price"]
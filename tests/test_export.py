@@ -0,0 +1,32 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import admin_auth
+from routes.export import router
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    return TestClient(app)
+
+
+def test_order_export_is_disabled_without_admin_token(db, monkeypatch):
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "")
+    assert _client().get("/api/export/orders", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_order_export_needs_the_admin_token(run, db, monkeypatch):
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "geheim")
+    run(db.orders.insert_one({"id": "o1", "customer_info": {"email": "a@example.com"}, "items": []}))
+    client = _client()
+
+    assert client.get("/api/export/orders").status_code == 401
+    assert client.get("/api/export/orders", headers={"X-Admin-Token": "falsch"}).status_code == 401
+    response = client.get("/api/export/orders", headers={"X-Admin-Token": "geheim"})
+    assert response.status_code == 200
+    assert b"a@example.com" in response.content
+
+
+def test_product_export_stays_public(db):
+    assert _client().get("/api/export/products").status_code == 200
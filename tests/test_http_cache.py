@@ -0,0 +1,50 @@
+import catalog_cache
+from http_cache import catalog_etag, etag_matches
+
+
+def test_etag_depends_only_on_url_and_shared_version(run, db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 0)
+
+    async def scenario():
+        first = await catalog_etag("/api/products/", b"limit=2")
+        assert first == await catalog_etag("/api/products/", b"limit=2")
+        assert first != await catalog_etag("/api/products/", b"limit=3")
+        # Another worker or the CLI writes the catalog
+        await db.catalog_meta.update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
+        second = await catalog_etag("/api/products/", b"limit=2")
+        return first, second
+
+    first, second = run(scenario())
+    assert first != second
+    assert not etag_matches(first, second)
+
+
+def test_foreign_version_drops_local_catalog_caches(run, db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 0)
+
+    async def scenario():
+        await db.products.insert_one({"id": "p1", "name": "Alt", "price": 10.0})
+        await catalog_cache.current_catalog_version()
+        assert (await catalog_cache.get_product("p1"))["name"] == "Alt"
+        # Written by another process, which cannot reach this process's cache
+        await db.products.update_one({"id": "p1"}, {"$set": {"name": "Neu"}})
+        await db.catalog_meta.update_one({"_id": "catalog"}, {"$inc": {"version": 1}}, upsert=True)
+        await catalog_cache.current_catalog_version()
+        return await catalog_cache.get_product("p1")
+
+    assert run(scenario())["name"] == "Neu"
+
+
+def test_own_write_advances_version_without_resync(run, db, monkeypatch):
+    monkeypatch.setattr(catalog_cache, "CATALOG_VERSION_POLL", 0)
+    resyncs = []
+
+    async def scenario():
+        before = await catalog_cache.current_catalog_version()
+        monkeypatch.setattr(catalog_cache, "_apply_catalog_resync", lambda: resyncs.append(1))
+        await catalog_cache.product_changed("p1")
+        return before, await catalog_cache.current_catalog_version()
+
+    before, after = run(scenario())
+    assert after == before + 1
+    assert resyncs == []
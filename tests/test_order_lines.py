@@ -0,0 +1,51 @@
+from migrations.compact_order_lines import migrate
+from order_lines import compact_line, rehydrate_orders
+
+PRODUCT = {"id": "p1", "name": "Kleid", "price": 50.0, "description": "Lang", "image": "x.jpg", "stock": 5}
+COMPACT = {"product_id": "p1", "name": "Kleid", "price_at_time": 40.0, "selected_size": "M", "selected_color": "Rot", "quantity": 2}
+
+
+def _legacy_line(**extra):
+    return {"product_id": "p1", "product": PRODUCT, "selected_size": "M", "selected_color": "Rot", "quantity": 2, **extra}
+
+
+def test_compact_line_keeps_only_what_the_order_needs():
+    from_cart = compact_line({**_legacy_line(), "id": "line-1", "session_id": "s1"})
+    legacy = compact_line(_legacy_line(price_at_time=40.0))
+
+    assert from_cart.dict() == {**COMPACT, "price_at_time": 50.0}
+    # A legacy line keeps the price it was sold at
+    assert legacy.dict() == COMPACT
+
+
+def test_migration_compacts_legacy_orders_only(run, db):
+    async def scenario():
+        await db.orders.insert_many([
+            {"id": "o1", "items": [_legacy_line(price_at_time=40.0), dict(COMPACT)]},
+            {"id": "o2", "items": [dict(COMPACT)]},
+        ])
+        dry = await migrate(batch_size=1, dry_run=True)
+        untouched = await db.orders.find_one({"id": "o1"}, {"_id": 0})
+        stats = await migrate(batch_size=1, dry_run=False)
+        again = await migrate(batch_size=1, dry_run=False)
+        orders = {order["id"]: order async for order in db.orders.find({}, {"_id": 0})}
+        return dry, untouched, stats, again, orders
+
+    dry, untouched, stats, again, orders = run(scenario())
+    assert dry["orders"] == 1 and "product" in untouched["items"][0]
+    assert stats["orders"] == 1 and stats["bytes_after"] < stats["bytes_before"]
+    assert again["orders"] == 0
+    assert orders["o1"]["items"] == [COMPACT, COMPACT]
+    assert orders["o2"]["items"] == [COMPACT]
+
+
+def test_rehydrate_attaches_current_products(run, db):
+    async def scenario():
+        await db.products.insert_one(dict(PRODUCT))
+        orders = [{"items": [dict(COMPACT), {**COMPACT, "product_id": "gone"}, _legacy_line()]}]
+        return await rehydrate_orders(orders)
+
+    items = run(scenario())[0]["items"]
+    assert items[0]["product"]["price"] == 50.0 and items[0]["price_at_time"] == 40.0
+    assert items[1]["product"] is None
+    assert items[2]["product"] is PRODUCT
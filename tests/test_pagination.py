@@ -0,0 +1,53 @@
+import pytest
+from pymongo import ASCENDING, DESCENDING
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, fetch_page, seek_filter
+
+# Prices tie in groups, so pages must break ties on id
+PRODUCTS = [{"id": f"p{i:02d}", "price": float(10 + i % 3)} for i in range(10)]
+
+
+def _walk(run, db, sort, limit=3):
+    async def scenario():
+        await db.products.insert_many([dict(product) for product in PRODUCTS])
+        pages, cursor = [], ""
+        while cursor is not None:
+            page, cursor = await fetch_page(db.products, {}, limit, sort=sort, cursor=cursor, projection={"_id": 0})
+            pages.append([product["id"] for product in page])
+        return pages
+
+    return run(scenario())
+
+
+def test_seek_filter_breaks_ties_on_id():
+    assert seek_filter("price", ASCENDING, 11.0, "p04") == {
+        "$or": [{"price": {"$gt": 11.0}}, {"price": 11.0, "id": {"$gt": "p04"}}]
+    }
+    assert seek_filter("price", DESCENDING, 11.0, "p04") == {
+        "$or": [{"price": {"$lt": 11.0}}, {"price": 11.0, "id": {"$lt": "p04"}}]
+    }
+    assert seek_filter("id", DESCENDING, None, "p04") == {"id": {"$lt": "p04"}}
+
+
+@pytest.mark.parametrize("sort, reverse", [("price", False), ("-price", True)])
+def test_keyset_pages_visit_every_product_once_in_order(run, db, sort, reverse):
+    expected = [product["id"] for product in sorted(PRODUCTS, key=lambda p: (p["price"], p["id"]), reverse=reverse)]
+
+    pages = _walk(run, db, sort)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    assert [product_id for page in pages for product_id in page] == expected
+
+
+def test_keyset_pages_in_id_order(run, db):
+    pages = _walk(run, db, None, limit=5)
+    assert pages == [[f"p{i:02d}" for i in range(5)], [f"p{i:02d}" for i in range(5, 10)]]
+
+
+def test_cursor_is_bound_to_its_sort_order():
+    token = encode_cursor("price", DESCENDING, {"id": "p04", "price": 11.0})
+    assert decode_cursor(token, "price", DESCENDING) == (11.0, "p04")
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token, "price", ASCENDING)
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not a cursor", "price", DESCENDING)
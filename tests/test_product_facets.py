@@ -0,0 +1,36 @@
+import product_facets
+from product_facets import faceted_page
+
+
+def _product(product_id, price, category="herren", on_sale=False):
+    return {
+        "id": product_id, "name": product_id, "price": price, "category": category, "is_on_sale": on_sale,
+        "sizes": ["M", "L"], "colors": ["Blau"],
+    }
+
+
+def test_page_is_sorted_ahead_of_the_facets():
+    pipeline = product_facets._pipeline({"category": "herren"}, 2, 4, "-price", None, None)
+    assert pipeline[:2] == [{"$match": {"category": "herren"}}, {"$sort": {"price": -1, "id": -1}}]
+    assert pipeline[2]["$facet"]["products"] == [{"$skip": 4}, {"$limit": 2}, {"$project": {"_id": 0}}]
+
+
+def test_keyset_pages_and_facets(run, db):
+    async def scenario():
+        await db.products.insert_many([
+            _product("p1", 30.0), _product("p2", 120.0, on_sale=True), _product("p3", 60.0),
+            _product("p4", 10.0, category="damen"),
+        ])
+        first = await faceted_page({"category": "herren"}, 2, sort="-price", cursor="")
+        second = await faceted_page({"category": "herren"}, 2, sort="-price", cursor=first[1])
+        return first, second
+
+    (products, next_cursor, total, facets), (more, last_cursor, _, _) = run(scenario())
+    assert [product["id"] for product in products] == ["p2", "p3"]
+    assert [product["id"] for product in more] == ["p1"]
+    assert last_cursor is None
+    assert total == 3
+    assert facets["categories"] == [{"value": "herren", "count": 3}]
+    assert facets["on_sale"] == 1
+    assert facets["sizes"] == [{"value": "L", "count": 3}, {"value": "M", "count": 3}]
+    assert [bucket["count"] for bucket in facets["price"] if bucket["count"]] == [1, 1, 1]
@@ -0,0 +1,57 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import admin_auth
+import cli
+from routes.products import router
+
+
+def _row(product_id):
+    return json.dumps({
+        "id": product_id, "name": "Kleid", "price": 10.0, "category": "damen", "description": "d", "image": "i",
+        "sizes": ["M"], "colors": ["Rot"],
+    }).encode() + b"\n"
+
+
+# The first chunk is written before the reader reaches the bytes that are not UTF-8
+_BROKEN_BODY = _row("p1") + _row("p2") + b'{"id": "p3", "name": "Kleid \xff"}\n'
+
+
+def _client():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    return TestClient(app)
+
+
+def _version(run, db):
+    meta = run(db.catalog_meta.find_one({"_id": "catalog"})) or {}
+    return meta.get("version", 0)
+
+
+def test_import_needs_the_admin_token(db, monkeypatch):
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "geheim")
+    response = _client().post("/api/products/import", content=_row("p1"))
+    assert response.status_code == 401
+
+
+def test_failed_api_import_still_invalidates_the_written_chunks(run, db, monkeypatch):
+    monkeypatch.setattr(admin_auth, "ADMIN_TOKEN", "geheim")
+    response = _client().post(
+        "/api/products/import", params={"chunk_size": 2}, content=_BROKEN_BODY, headers={"X-Admin-Token": "geheim"}
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"]["report"]["inserted"] == 2
+    assert _version(run, db) == 1
+
+
+def test_failed_direct_import_reports_and_invalidates_the_written_chunks(run, db, tmp_path):
+    path = tmp_path / "products.ndjson"
+    path.write_bytes(_BROKEN_BODY)
+
+    report = cli._import_direct(path, "ndjson", "id", 2)
+
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert _version(run, db) == 1
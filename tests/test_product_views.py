@@ -0,0 +1,60 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import search_index
+from models import Product
+from routes.products import router as products_router
+from routes.search import router as search_router
+
+CARD = {"id", "name", "price", "original_price", "image", "is_on_sale"}
+
+
+def _client(run, db, monkeypatch):
+    products = [
+        Product(name=name, price=price, description="Baumwolle", image="x.jpg", category="herren", sizes=["M"], colors=["Rot"]).dict()
+        for name, price in (("Leinenhemd", 30.0), ("Leinenhose", 50.0))
+    ]
+    run(db.products.insert_many(products))
+    # The index is process wide; rebuild it from this test's products
+    monkeypatch.setattr(search_index.search_index, "ready", False)
+    app = FastAPI()
+    app.include_router(products_router, prefix="/api")
+    app.include_router(search_router, prefix="/api")
+    return TestClient(app)
+
+
+def _keys(response):
+    assert response.status_code == 200, response.text
+    products = response.json()["data"]["products"]
+    assert len(products) == 2
+    return [set(product) for product in products]
+
+
+def test_product_list_returns_the_requested_fields(run, db, monkeypatch):
+    client = _client(run, db, monkeypatch)
+
+    assert _keys(client.get("/api/products/")) == [set(Product.model_fields)] * 2
+    assert _keys(client.get("/api/products/", params={"view": "card"})) == [CARD] * 2
+    assert _keys(client.get("/api/products/", params={"fields": "name, stock"})) == [{"id", "name", "stock"}] * 2
+    # Keyset pages add the sort key the next cursor is built from
+    keyset = client.get("/api/products/", params={"fields": "name", "sort": "-price", "cursor": ""})
+    assert _keys(keyset) == [{"id", "name", "price"}] * 2
+    faceted = client.get("/api/products/", params={"view": "card", "facets": "true"})
+    assert _keys(faceted) == [CARD] * 2
+
+
+def test_search_returns_the_requested_fields(run, db, monkeypatch):
+    client = _client(run, db, monkeypatch)
+
+    assert _keys(client.get("/api/search/", params={"q": "leinen"})) == [set(Product.model_fields)] * 2
+    assert _keys(client.get("/api/search/", params={"q": "leinen", "view": "card"})) == [CARD] * 2
+    assert _keys(client.get("/api/search/", params={"q": "leinen", "fields": "price"})) == [{"id", "price"}] * 2
+
+
+def test_unknown_fields_are_rejected(run, db, monkeypatch):
+    client = _client(run, db, monkeypatch)
+
+    for path, params in (("/api/products/", {}), ("/api/search/", {"q": "leinen"})):
+        response = client.get(path, params={**params, "fields": "name,password"})
+        assert response.status_code == 400
+        assert "password" in response.json()["detail"]
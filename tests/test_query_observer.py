@@ -0,0 +1,90 @@
+from query_observer import HOT_QUERIES, _shape_key, audit_queries, query_shape, summarize_plan
+
+COLLSCAN_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {"stage": "COLLSCAN", "filter": {"name": {"$regex": "shirt"}}}},
+    "executionStats": {"nReturned": 2, "totalDocsExamined": 1000, "totalKeysExamined": 0, "executionTimeMillis": 12},
+}
+
+IXSCAN_EXPLAIN = {
+    "queryPlanner": {"winningPlan": {
+        "stage": "LIMIT",
+        "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "category_is_on_sale"}},
+    }},
+    "executionStats": {"nReturned": 50, "totalDocsExamined": 50, "totalKeysExamined": 51, "executionTimeMillis": 1},
+}
+
+# Aggregations nest the find plan under the $cursor stage; $or plans have one input per branch
+AGGREGATE_EXPLAIN = {
+    "stages": [
+        {"$cursor": {
+            "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "OR", "inputStages": [
+                {"stage": "IXSCAN", "indexName": "price"},
+                {"stage": "IXSCAN", "indexName": "id_unique"},
+            ]}}},
+            "executionStats": {"nReturned": 0, "totalDocsExamined": 7, "totalKeysExamined": 9},
+        }},
+        {"$group": {}},
+    ],
+}
+
+
+def test_summarize_collscan():
+    plan = summarize_plan(COLLSCAN_EXPLAIN)
+    assert plan["stages"] == ["COLLSCAN"]
+    assert plan["collscan"] and plan["indexes"] == []
+    assert (plan["docs_examined"], plan["returned"], plan["examined_per_returned"]) == (1000, 2, 500.0)
+    assert plan["execution_ms"] == 12
+
+
+def test_summarize_index_scan():
+    plan = summarize_plan(IXSCAN_EXPLAIN)
+    assert plan["stages"] == ["LIMIT", "FETCH", "IXSCAN"]
+    assert not plan["collscan"]
+    assert plan["indexes"] == ["category_is_on_sale"]
+    assert (plan["keys_examined"], plan["examined_per_returned"]) == (51, 1.0)
+
+
+def test_summarize_nested_aggregate_plan():
+    plan = summarize_plan(AGGREGATE_EXPLAIN)
+    assert plan["stages"] == ["FETCH", "OR", "IXSCAN", "IXSCAN"]
+    assert plan["indexes"] == ["id_unique", "price"]
+    # Nothing returned: the ratio falls back to the documents examined
+    assert plan["examined_per_returned"] == 7.0
+    assert plan["execution_ms"] is None
+
+
+def test_query_shape_blanks_values_only():
+    query = {"$or": [{"price": {"$gt": 10}}, {"price": 10, "id": {"$gt": "p4"}}], "category": "damen", "sizes": ["M", "L"]}
+    assert query_shape(query) == {"$or": [{"price": {"$gt": "?"}}], "category": "?", "sizes": ["?"]}
+    assert query_shape(None) == "?"
+
+
+def test_shape_key_uses_the_first_write_statement():
+    update = {"update": "products", "updates": [{"q": {"id": "p1"}, "u": {"$inc": {"stock": -1}}}, {"q": {"name": "x"}}]}
+    assert _shape_key("update", update) == '{"id": "?"}'
+    assert _shape_key("find", {"find": "products", "filter": {"id": "p1", "stock": {"$gte": 2}}}) == '{"id": "?", "stock": {"$gte": "?"}}'
+    assert _shape_key("count", {"count": "products"}) == "{}"
+
+
+def test_audit_explains_every_hot_query(run):
+    class ExplainingDb:
+        def __init__(self):
+            self.commands = []
+
+        async def command(self, command):
+            self.commands.append(command)
+            return IXSCAN_EXPLAIN
+
+    db = ExplainingDb()
+    results = run(audit_queries(db))
+
+    assert [command["explain"] for command in db.commands] == [command for _, command in HOT_QUERIES]
+    assert all(command["verbosity"] == "executionStats" for command in db.commands)
+    assert [result["name"] for result in results] == [name for name, _ in HOT_QUERIES]
+    assert not any(result["plan"]["collscan"] for result in results)
+
+
+def test_hot_queries_can_use_an_index():
+    # An unanchored regex always scans the collection and would fail every audit
+    for _, command in HOT_QUERIES:
+        assert "$regex" not in _shape_key("find", command)
@@ -0,0 +1,100 @@
+import search_index
+from search_index import SearchIndex
+
+
+def _products(names):
+    return [{"id": product_id, "name": name, "category": "herren", "price": 10.0} for product_id, name in names]
+
+
+def _found(index, query):
+    page, _, _ = index.search(query)
+    return [product_id for _, product_id in page]
+
+
+def test_search_finds_products_by_name_prefix(run, db):
+    index = SearchIndex()
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd"), ("p2", "Wollpullover")]))
+        await index.rebuild()
+
+    run(scenario())
+    assert _found(index, "lein") == ["p1"]
+    assert _found(index, "pullover") == ["p2"]
+
+
+def test_rebuild_replays_changes_made_during_the_scan(run, db, monkeypatch, write_during_scan):
+    index = SearchIndex()
+
+    async def rename_and_delete():
+        # p1 was already read with its old name, p2 not yet
+        await db.products.update_one({"id": "p1"}, {"$set": {"name": "Wollpullover"}})
+        index.on_product_changed("p1", await db.products.find_one({"id": "p1"}, {"_id": 0}))
+        await db.products.delete_one({"id": "p2"})
+        index.on_product_changed("p2", None)
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd"), ("p2", "Leinenhose"), ("p3", "Leinenkleid")]))
+        monkeypatch.setattr(search_index, "products_collection", write_during_scan(db.products, rename_and_delete))
+        await index.rebuild()
+
+    run(scenario())
+    assert _found(index, "pullover") == ["p1"]
+    assert _found(index, "lein") == ["p3"]
+
+
+def test_rebuild_starts_over_after_a_full_invalidation_during_the_scan(run, db, monkeypatch, write_during_scan):
+    index = SearchIndex()
+
+    async def invalidate_all():
+        if collection.scans == 1:
+            await db.products.insert_one(_products([("p2", "Leinenhose")])[0])
+            index.on_product_changed(None, None)
+
+    collection = write_during_scan(db.products, invalidate_all)
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd"), ("p3", "Leinenkleid")]))
+        monkeypatch.setattr(search_index, "products_collection", collection)
+        await index.rebuild()
+
+    run(scenario())
+    assert collection.scans == 2
+    assert index.ready
+    assert sorted(_found(index, "lein")) == ["p1", "p2", "p3"]
+
+
+def test_burst_of_full_invalidations_shares_one_rebuild(run, db, monkeypatch, write_during_scan):
+    index = SearchIndex()
+
+    async def nothing():
+        pass
+
+    collection = write_during_scan(db.products, nothing)
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd")]))
+        monkeypatch.setattr(search_index, "products_collection", collection)
+        for _ in range(5):
+            index.on_product_changed(None, None)
+        await index.ensure_built()
+
+    run(scenario())
+    assert collection.scans == 1
+    assert _found(index, "lein") == ["p1"]
+
+
+def test_multi_term_queries_match_every_term(run, db):
+    # Enough "hemd" products that the rare "leinen" postings are looked up by binary search, the others densely
+    names = [(f"h{i:03d}", "Baumwollhemd Blau") for i in range(40)]
+    names += [("p1", "Leinenhemd Blau"), ("p2", "Leinenhose Blau"), ("p3", "Leinenhemd Rot")]
+    index = SearchIndex()
+
+    async def scenario():
+        await db.products.insert_many(_products(names))
+        await index.rebuild()
+
+    run(scenario())
+    assert sorted(_found(index, "leinenhemd blau")) == ["p1"]
+    assert sorted(_found(index, "hemd rot")) == ["p3"]
+    assert len(index.search("hemd blau", limit=100)[0]) == 41
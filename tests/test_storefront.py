@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import storefront
+from storefront import Storefront
+
+
+def _product(product_id, name, day, category="herren"):
+    return {
+        "id": product_id, "name": name, "price": 10.0, "original_price": None, "image": "", "is_on_sale": False,
+        "category": category, "created_at": datetime(2024, 1, day),
+    }
+
+
+def _newest(front):
+    return [card["id"] for card in front._heads.get("newest", [])]
+
+
+def test_rebuild_replays_changes_made_during_the_scan(run, db, monkeypatch, write_during_scan):
+    front = Storefront()
+
+    async def write():
+        # p1 was already read, p2 not yet
+        await db.products.update_one({"id": "p1"}, {"$set": {"created_at": datetime(2024, 1, 9)}})
+        front.on_product_changed("p1", await db.products.find_one({"id": "p1"}, {"_id": 0}))
+        await db.products.delete_one({"id": "p2"})
+        front.on_product_changed("p2", None)
+
+    async def scenario():
+        await db.products.insert_many([_product("p1", "Hemd", 1), _product("p2", "Hose", 2), _product("p3", "Kleid", 3)])
+        monkeypatch.setattr(storefront, "products_collection", write_during_scan(db.products, write))
+        await front.rebuild()
+
+    run(scenario())
+    assert front.ready
+    assert _newest(front) == ["p1", "p3"]
+
+
+def test_snapshot_is_reused_until_the_catalog_changes(run, db):
+    import catalog_cache
+
+    front = Storefront()
+
+    async def scenario():
+        await db.categories.insert_one({"slug": "herren", "name": "Herren"})
+        await db.products.insert_one(_product("p1", "Hemd", 1))
+        first = await front.snapshot()
+        second = await front.snapshot()
+        await db.categories.insert_one({"slug": "damen", "name": "Damen"})
+        await catalog_cache.invalidate_categories()
+        return first, second, await front.snapshot()
+
+    first, second, third = run(scenario())
+    assert second is first
+    assert third is not first
+    assert [category["slug"] for category in third["categories"]] == ["herren", "damen"]
+    assert third["by_category"]["herren"][0]["id"] == "p1"
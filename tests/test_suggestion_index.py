@@ -0,0 +1,65 @@
+import suggestion_index
+from suggestion_index import SuggestionIndex
+
+
+def _products(names):
+    return [
+        {"id": product_id, "name": name, "category": "herren", "colors": ["Blau"], "stock": 3}
+        for product_id, name in names
+    ]
+
+
+def _texts(index, query):
+    return [suggestion["text"] for suggestion in index.suggest(query)]
+
+
+def test_suggests_names_from_any_word_start(run, db):
+    index = SuggestionIndex()
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Herren Business Hemd"), ("p2", "Wollpullover")]))
+        await index.rebuild()
+
+    run(scenario())
+    assert _texts(index, "hemd") == ["Herren Business Hemd"]
+    assert _texts(index, "woll") == ["Wollpullover"]
+
+
+def test_rebuild_replays_changes_made_during_the_scan(run, db, monkeypatch, write_during_scan):
+    index = SuggestionIndex()
+
+    async def rename_and_delete():
+        # p1 was already read with its old name, p2 not yet
+        await db.products.update_one({"id": "p1"}, {"$set": {"name": "Wollpullover"}})
+        index.on_product_changed("p1", await db.products.find_one({"id": "p1"}, {"_id": 0}))
+        await db.products.delete_one({"id": "p2"})
+        index.on_product_changed("p2", None)
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd"), ("p2", "Leinenhose"), ("p3", "Leinenkleid")]))
+        monkeypatch.setattr(suggestion_index, "products_collection", write_during_scan(db.products, rename_and_delete))
+        await index.rebuild()
+
+    run(scenario())
+    assert _texts(index, "woll") == ["Wollpullover"]
+    assert _texts(index, "lein") == ["Leinenkleid"]
+
+
+def test_burst_of_full_invalidations_shares_one_rebuild(run, db, monkeypatch, write_during_scan):
+    index = SuggestionIndex()
+
+    async def nothing():
+        pass
+
+    collection = write_during_scan(db.products, nothing)
+
+    async def scenario():
+        await db.products.insert_many(_products([("p1", "Leinenhemd")]))
+        monkeypatch.setattr(suggestion_index, "products_collection", collection)
+        for _ in range(5):
+            index.on_product_changed(None, None)
+        await index.ensure_built()
+
+    run(scenario())
+    assert collection.scans == 1
+    assert _texts(index, "lein") == ["Leinenhemd"]